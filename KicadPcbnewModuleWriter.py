@@ -2,12 +2,66 @@
 # This module takes lists of raw objects: (fill=True/False, [(x1, y1), (x2, y2), ...]) and generates a .kicad_mod file
 # TODO comments, license
 
+from math import hypot
+from itertools import chain
+
+from rawobjects import CIRCLE
+
 kicadPcbHeaderTemplate = """(module {name} (layer F.Cu)
 """
 # TODO make invisible ref and value, otherwise the defaults get added with visible=True.
 
 
-def makeKicadPolygon(points, fill, layer, lineWidth):
+# fp_poly point lists are wrapped onto lines of this many points by default
+POINTS_PER_LINE = 10
+LINE_WRAP = "\n                "
+
+# How many points are formatted into one string before it is handed to the file
+CHUNK_POINTS = 4096
+
+# Precomputed "(xy %f %f) (xy %f %f) ...\n    " format strings, by points per line
+_lineFormats = {}
+
+
+def _lineFormat(pointsPerLine):
+   fmt = _lineFormats.get(pointsPerLine)
+   if fmt is None:
+      fmt = "(xy %f %f) " * pointsPerLine + LINE_WRAP
+      _lineFormats[pointsPerLine] = fmt
+   return fmt
+
+
+def iterKicadPolygonChunks(points, fill, layer, lineWidth, pointsPerLine=POINTS_PER_LINE):
+   """ Yields the text of one fp_poly in chunks of about CHUNK_POINTS points, without
+       ever building the whole string. See makeKicadPolygon for the arguments.
+       The first point sits on a line of its own, followed by lines of pointsPerLine
+       points each. pointsPerLine=0 keeps all the points on that first line. """
+   flat = list(chain.from_iterable(points))
+   count = len(flat) // 2
+   if count == 0 or pointsPerLine <= 0:
+      yield "  (fp_poly (pts %s\n) (layer %s) (width %f))\n" % ("(xy %f %f) " * count % tuple(flat), layer, lineWidth)
+      return
+
+   yield "  (fp_poly (pts (xy %f %f) %s" % (flat[0], flat[1], LINE_WRAP)
+
+   lineFormat = _lineFormat(pointsPerLine)
+   lineCoords = 2 * pointsPerLine
+   linesPerChunk = max(1, CHUNK_POINTS // pointsPerLine)
+   fullLinesEnd = 2 + (count - 1) // pointsPerLine * lineCoords
+   chunk = []
+   for i in range(2, fullLinesEnd, lineCoords):
+      chunk.append(lineFormat % tuple(flat[i:i + lineCoords]))
+      if len(chunk) >= linesPerChunk:
+         yield "".join(chunk)
+         chunk = []
+   if chunk:
+      yield "".join(chunk)
+
+   remaining = (len(flat) - fullLinesEnd) // 2
+   yield "(xy %f %f) " * remaining % tuple(flat[fullLinesEnd:]) + "\n) (layer %s) (width %f))\n" % (layer, lineWidth)
+
+
+def makeKicadPolygon(points, fill, layer, lineWidth, pointsPerLine=POINTS_PER_LINE):
    # points = [(x1,y1),(x2,y2),...]
    # fill is current ignored (see below)
    # layer is a string, used verbatim
@@ -19,30 +73,35 @@ def makeKicadPolygon(points, fill, layer, lineWidth):
    #  Then it makes a line of width lineWidth from point to point to point.
    #  If you make this line very thin then the line doesn't affect things very much.
    #
-   # TODO what about inverting the Y coordinates?
-   # TODO really long lines seem to mess up the parser
-   #pointList = " ".join( ["(xy %f %f)" % (x, y) for x, y in points] )
-   pointList = ""
-   for ii in range(len(points)):
-      x, y = points[ii]
-      pointList += "(xy %f %f) " % (x, y)
-      if ii % 10 == 0:
-         pointList += "\n                "
-   pointList += "\n"
+   # TODO really long lines seem to mess up the parser, hence pointsPerLine
+   return "".join(iterKicadPolygonChunks(points, fill, layer, lineWidth, pointsPerLine))
+
 
-   return "  (fp_poly (pts %s) (layer %s) (width %f))\n" % (pointList, layer, lineWidth)
+def makeKicadCircle(points, layer, lineWidth):
+   # points = [center, point on the circle, ...], see arcs.circlePoints
+   # An fp_circle is only an outline, so a filled disc is drawn as a circle whose line
+   # is as wide as the disc's radius, grown by half a lineWidth like the polygon outlines.
+   cx, cy = points[0]
+   radius = hypot(points[1][0] - cx, points[1][1] - cy) + lineWidth / 2.0
+   return "  (fp_circle (center %f %f) (end %f %f) (layer %s) (width %f))\n" % (cx, cy, cx + radius / 2.0, cy, layer, radius)
 
 
-def writeRawObjectsToKicadPcbnewModuleFile(filename, rawObjects, name="ConvertedSvgModule", layer="F.SilkS", lineWidth=0.01):
+def writeRawObjectsToKicadPcbnewModuleFile(filename, rawObjects, name="ConvertedSvgModule", layer="F.SilkS", lineWidth=0.01,
+                                           pointsPerLine=POINTS_PER_LINE, bufferSize=1 << 20):
+   """ rawObjects can be any iterable of raw objects, including a generator, and each
+       polygon is streamed out in chunks through a bufferSize byte file buffer. """
 
-   with open(filename, "w") as fid:
+   with open(filename, "w", bufferSize) as fid:
       # Header
       fid.write(kicadPcbHeaderTemplate.format(name=name))
 
       # Body
       for fill, points in rawObjects:
-         fid.write(makeKicadPolygon(points, fill, layer, lineWidth))
+         if fill == CIRCLE:
+            fid.write(makeKicadCircle(points, layer, lineWidth))
+            continue
+         for chunk in iterKicadPolygonChunks(points, fill, layer, lineWidth, pointsPerLine):
+            fid.write(chunk)
 
       # Footer
       fid.write("\n)\n")
-
@@ -1,15 +1,25 @@
 # TODO comments, license
 
-import sys
+import copy
+import array
+from itertools import chain
 from lxml import etree
 
 # Inkscape extension code (GPL2)
 import simpletransform
-import simplestyle
 import simplepath
 import cubicsuperpath
 import cspsubdiv
 
+import batchsubdiv
+import arcs
+import shapes
+import holes
+from rawobjects import RawObjectStore, BoundingBox, transformPoints, CIRCLE
+from lrucache import LRUCache
+from styles import StyleResolver, INITIAL_STYLE
+from instrumentation import Recorder
+
 
 class SvgParser:
    """ This class has nothing to do with any specific output format.
@@ -18,6 +28,32 @@ class SvgParser:
        list of (x, y) coordinate pairs.
        
        Smoothness influences the linearization process.
+       Flattener selects the linearization backend, either FLATTEN_CSPSUBDIV
+       (one path at a time) or FLATTEN_BATCH (every path in the document at
+       once, vectorized with NumPy). FLATTEN_EXTREMES, used by estimateBounds, only
+       keeps the ends of each curve and the points where its x or y is smallest or
+       largest, which is enough to find the bounds.
+       With stream=True the document is not loaded up front; iterRawObjects
+       then reads it incrementally and yields one raw object at a time.
+       A non-zero pathMemoSize keeps up to that many flattened points around, keyed on the
+       path data and the linear part of its transform, so repeated copies of the same path
+       that only differ by a translation are flattened once.
+       Clones (<use> elements) are resolved through an index of the ids in the document,
+       and each referenced subtree is flattened once per linear transform and then
+       translated into place for every instance.
+       Arcs are sampled exactly rather than through beziers, and a path that is a single
+       circle becomes a raw object with fill=CIRCLE, written out as a native circle.
+       The basic shapes (rect, circle, ellipse, line, polyline, polygon) go straight to
+       points, without building any beziers.
+       With bridgeHoles, the subpaths of a filled path are sorted into outlines and holes,
+       and each hole is joined to its outline by a zero width cut, since a KiCad polygon
+       can't have holes. Otherwise the subpaths are simply run together into one polygon.
+       Fill, fill rule, display and visibility come from a StyleResolver, which applies
+       presentation attributes, <style> rules and style attributes, inherited down the tree.
+       A quiet parser prints nothing, not even warnings.
+       stats is a recorder (see instrumentation.py) told about the stages of the work, the
+       element each piece of it was done for and what was counted along the way; by default
+       nothing is recorded.
        
        Some of this code is heavily based on the Egg-Bot Inkscape extension code.
        TODO what is their license?
@@ -30,9 +66,16 @@ class SvgParser:
    ALIGN_LEFT = 3
    ALIGN_RIGHT = 4
 
+   # Flattening backends
+   FLATTEN_CSPSUBDIV = "cspsubdiv"
+   FLATTEN_BATCH = "batch"
+   flatteners = [FLATTEN_CSPSUBDIV, FLATTEN_BATCH]
+   FLATTEN_EXTREMES = "extremes" # for estimateBounds, not for drawing
 
    # How many of a given unit equal one pixel?
    # Not currently used for scaling, but only for detecting valid units
+   XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
    svgUnitsTable = {"px": 1.0,
                     "pt": 1.25,
                     "pc": 15,
@@ -40,40 +83,73 @@ class SvgParser:
                     "cm": 35.43307,
                     "in": 90.0}
 
-   def __init__(self, filename, smoothness=0.1):
+   def __init__(self, filename, smoothness=0.1, flattener=FLATTEN_CSPSUBDIV, stream=False, pathMemoSize=0, bridgeHoles=True, verbose=False,
+                quiet=False, stats=None):
+      if flattener not in self.flatteners and flattener != self.FLATTEN_EXTREMES:
+         raise ValueError("Unknown flattener '%s'" % flattener)
+      if flattener == self.FLATTEN_BATCH and not batchsubdiv.available():
+         raise ImportError("The '%s' flattener requires NumPy" % flattener)
       self.smoothness = smoothness
-      with open(filename, "r") as fid:
-         self.tree = etree.parse(fid)
-      self.svgRoot = self.tree.getroot()
-      self.nsmap = self.svgRoot.nsmap
-      self.rawObjects = [] # An object = (fill=True/False, [(x,y),...])
+      self.flattener = flattener
+      self.filename = filename
+      self.stream = stream
+      self.bridgeHoles = bridgeHoles
+      self.verbose = verbose
+      self.quiet = quiet
+      if stream:
+         # Nothing is loaded here, iterRawObjects reads the file each time it is called
+         self.tree = None
+         self.svgRoot = None
+         self.nsmap = None
+      else:
+         with open(filename, "r") as fid:
+            self.tree = etree.parse(fid)
+         self.svgRoot = self.tree.getroot()
+         self.nsmap = self.svgRoot.nsmap
+      self.styles = StyleResolver()
+      if not stream:
+         for node in self.svgRoot.iter(self.svgQName("style")):
+            self.styles.addStyleSheet(node.text)
+      self.rawObjects = RawObjectStore() # An object = (fill=True/False, [(x,y),...])
+      self.pendingPaths = [] # (fill, evenodd, cubicsuperpath, memo key, offset, memo subpaths, element) waiting for the batch
+                             # flattener, or (fill, None, None, None, offset, coords, element) for an object that is flattened already
+      self.pathMemo = LRUCache(pathMemoSize) if pathMemoSize > 0 else None
+      self.idIndex = None # id -> element, built on the first <use>
+      self.viewportSize = None # (width, height) of the document's viewport in user units, set by documentTransform
+      self.streamReferences = None # (style sheets, id -> copy of the element) read ahead by iterRawObjects
+      self.instanceCache = {} # (id, linear transform, smoothness, style) -> [(fill, coords), ...] of the flattened subtree
+      self.activeInstances = set() # ids of the subtrees being flattened right now, to catch circular references
+      self.useInstances = 0
+      self.pathsVisited = 0
+      self.shapesVisited = 0
+      self.stats = stats if stats is not None else Recorder()
+      self.stats.attach(self)
 
 
    def svgQName(self, foo):
       return etree.QName(self.nsmap["svg"], foo)
 
 
+   def report(self, message):
+      """ Prints message, unless the parser is quiet. """
+      if not self.quiet:
+         print message
+
+
    def findMinCenterMaxOfObjects(self, objects):
       """ Analyses all the raw objects to determine the min, center, and max of all coordinates. """
-      xmin = xmax = ymin = ymax = None
+      if isinstance(objects, RawObjectStore):
+         return objects.boundingBox.minCenterMax()
+
+      box = BoundingBox()
       for fill, points in objects:
-         for x, y in points:
-            #print x, y
-            if not xmin or x < xmin:
-               xmin = x
-            if not xmax or x > xmax:
-               xmax = x
-            if not ymin or y < ymin:
-               ymin = y
-            if not ymax or y > ymax:
-               ymax = y
-      xcenter = (xmax + xmin) / 2
-      ycenter = (ymax + ymin) / 2
-      return xmin, ymin, xcenter, ycenter, xmax, ymax
+         box.addPoints(points)
+      return box.minCenterMax()
 
-   def alignObjects(self, horizAlign=ALIGN_CENTER, vertAlign=ALIGN_CENTER):
-      """ Analyzes all the objects in self.rawObjects, and aligns them based on the input options (LEFT/CENTER/RIGHT and TOP/CENTER/BOTTOM). """
-      xmin, ymin, xcenter, ycenter, xmax, ymax = self.findMinCenterMaxOfObjects(self.rawObjects)
+   def alignmentOffsets(self, stats, horizAlign=ALIGN_CENTER, vertAlign=ALIGN_CENTER):
+      """ Returns the (xsub, ysub) that alignObjects subtracts from every point,
+          given the output of findMinCenterMaxOfObjects. """
+      xmin, ymin, xcenter, ycenter, xmax, ymax = stats
 
       xsub = xcenter
       if horizAlign == self.ALIGN_LEFT:
@@ -87,52 +163,458 @@ class SvgParser:
       elif vertAlign == self.ALIGN_TOP:
          ysub = ymax
 
+      return xsub, ysub
+
+   def alignObjects(self, horizAlign=ALIGN_CENTER, vertAlign=ALIGN_CENTER):
+      """ Analyzes all the objects in self.rawObjects, and aligns them based on the input options (LEFT/CENTER/RIGHT and TOP/CENTER/BOTTOM). """
+      xsub, ysub = self.alignmentOffsets(self.findMinCenterMaxOfObjects(self.rawObjects), horizAlign, vertAlign)
+
       #print "xsub: %f, ysub: %f" % (xsub, ysub)
 
-      # update coordinates of each object
-      newRawObjects = []
-      for fill, points in self.rawObjects:
-         newPoints = [(x - xsub, y - ysub) for x, y in points]
-         newRawObjects.append( (fill, newPoints) )
-      self.rawObjects = newRawObjects
+      # deferred, the store applies it along with any scaling when the points are read
+      self.rawObjects.translate(-xsub, -ysub)
 
 
    def scaleRawObjects(self, scale):
       """ CALL THIS AFTER centerAroundZeroZero SO THAT IT WORKS RIGHT. This multiplies each coordinate by scale. """
-      newRawObjects = []
-      for fill, points in self.rawObjects:
-         newPoints = [(x * scale, y * scale) for x, y in points]
-         newRawObjects.append( (fill, newPoints) )
+      self.rawObjects.scale(scale)
 
-      self.rawObjects = newRawObjects
 
+   def flipObjectsVertically(self):
+      """ Mirrors all the objects about the X axis (y becomes -y). Call this after alignObjects. """
+      self.rawObjects.transformBy([[1.0, 0.0, 0.0], [0.0, -1.0, 0.0]])
 
-   def plotPath(self, node, matTransform):
-      """ Plot the path while applying the transformation defined by the matrix matTransform. """
 
-      filledPath = (simplestyle.parseStyle(node.get("style")).get("fill", "none") != "none")
+   def iterTransformedObjects(self, objects, mat):
+      """ Applies the transformation matrix mat to each point of raw objects that are
+          streamed rather than stored in self.rawObjects. """
+      for fill, points in objects:
+         yield fill, transformPoints(mat, [x for x, y in points], [y for x, y in points])
 
-      # Plan: Turn this path into a cubicsuperpath (list of beziers)...
-      d = node.get("d")
-      if len(simplepath.parsePath(d)) == 0:
-         return
-      p = cubicsuperpath.parsePath(d)
 
-      # ... and apply the transformation to each point.
-      simpletransform.applyTransformToPath(matTransform, p)
+   def pathFill(self, style):
+      """ True if an element with the computed style style (see styles.py) is filled. """
+      return self.styles.isFilled(style)
+
+
+   def pathEvenOdd(self, style):
+      """ True if an element with the computed style style uses the evenodd fill rule rather than the default nonzero. """
+      return self.styles.isEvenOdd(style)
+
 
-      # p is now a list of lists of cubic beziers [cp1, cp2, endp]
+   def parsePathData(self, d, matTransform):
+      """ Parses path data into a cubic super path, applying the transformation matrix matTransform.
+          Returns None if the path is empty. """
+
+      # Plan: Turn this path into a cubicsuperpath (list of beziers), with the arcs already flattened...
+      with self.stats.stage("path parse"):
+         simple = simplepath.parsePath(d)
+      if len(simple) == 0:
+         return None
+      with self.stats.stage("subdivide"):
+         simple = arcs.expandArcs(simple, matTransform, self.smoothness, self.flattener == self.FLATTEN_EXTREMES)
+      with self.stats.stage("path parse"):
+         p = cubicsuperpath.CubicSuperPath(simple)
+
+      # ... and apply the transformation to each point.
+      with self.stats.stage("transform"):
+         simpletransform.applyTransformToPath(matTransform, p)
+      return p
+
+
+   def parsePathNode(self, node, matTransform, style):
+      """ Parses a path node into a cubic super path, applying the transformation matrix matTransform.
+          Returns (fill, cubicsuperpath), or None if the path is empty. """
+      p = self.parsePathData(node.get("d"), matTransform)
+      if p is None:
+         return None
+      return self.pathFill(style), p
+
+
+   def circleObject(self, node, matTransform):
+      """ Returns the raw object (CIRCLE, points) if the path node is a single circle that stays
+          a circle under matTransform, None otherwise. """
+      d = node.get("d", "")
+      if "a" not in d.lower():
+         return None
+      if not arcs.isSimilarity(matTransform):
+         return None
+      circle = arcs.circleFromPath(simplepath.parsePath(d))
+      if circle is None:
+         return None
+      cx, cy, r = circle
+      (x, y), = transformPoints(matTransform, [cx], [cy])
+      return CIRCLE, arcs.circlePoints(x, y, r * arcs.linearScale(matTransform))
+
+
+   def lookupPathMemo(self, node, matTransform):
+      """ Looks the path up in self.pathMemo. The memo holds paths flattened under just the
+          linear part of their transform, and the translation is added back per instance.
+          Returns (key, flattened subpaths or None on a miss, (dx, dy) translation). """
+      d = " ".join(node.get("d", "").replace(",", " ").split())
+      key = (d, matTransform[0][0], matTransform[0][1], matTransform[1][0], matTransform[1][1], self.smoothness)
+      return key, self.pathMemo.get(key), (matTransform[0][2], matTransform[1][2])
+
+
+   def memoLinearTransform(self, matTransform):
+      return [[matTransform[0][0], matTransform[0][1], 0.0], [matTransform[1][0], matTransform[1][1], 0.0]]
+
+
+   def rememberPath(self, key, rings):
+      """ Stores flattened subpaths in the path memo, returning the compact form that was stored. """
+      packed = tuple(array.array("d", chain.from_iterable(points)) for points in rings)
+      self.pathMemo.put(key, packed, sum(len(coords) for coords in packed) // 2)
+      return packed
+
+
+   def translateMemoPoints(self, coords, offset):
+      dx, dy = offset
+      return [(x + dx, y + dy) for x, y in zip(coords[0::2], coords[1::2])]
+
+
+   def pathObjects(self, fill, evenOdd, rings):
+      """ Turns the flattened subpaths of a path into raw objects. The holes of a filled path are
+          bridged into the outlines around them (see holes.py), otherwise all the subpaths are
+          joined into a single polygon. Returns a list, which is empty for an empty path. """
+      if fill and self.bridgeHoles and len(rings) > 1:
+         polygons = holes.bridgeRings(rings, evenOdd)
+         if polygons is not None:
+            return [(fill, points) for points in polygons]
+      points = list(chain.from_iterable(rings))
+      if not points:
+         return []
+      return [(fill, points)]
+
+
+   def flattenPathNode(self, node, matTransform, style):
+      """ Parses and flattens a path node, going through the path memo if there is one.
+          Returns a list of raw objects (fill, points), see pathObjects. """
+      circle = self.circleObject(node, matTransform)
+      if circle is not None:
+         return [circle]
+
+      if self.pathMemo is None:
+         parsed = self.parsePathNode(node, matTransform, style)
+         if parsed is None:
+            return []
+         filledPath, p = parsed
+         return self.pathObjects(filledPath, self.pathEvenOdd(style), self.flattenRings(p))
+
+      key, rings, offset = self.lookupPathMemo(node, matTransform)
+      if rings is None:
+         p = self.parsePathData(node.get("d"), self.memoLinearTransform(matTransform))
+         rings = self.rememberPath(key, self.flattenRings(p) if p is not None else [])
+      rings = [self.translateMemoPoints(coords, offset) for coords in rings]
+      return self.pathObjects(self.pathFill(style), self.pathEvenOdd(style), rings)
+
+
+   def flattenRings(self, p):
+      """ Flattens the cubic super path p with the selected flattener.
+          Returns a list of (x, y) points for each of its subpaths. """
+      with self.stats.stage("subdivide"):
+         self.stats.flattened(p, self.smoothness)
+         if self.flattener == self.FLATTEN_BATCH:
+            return batchsubdiv.flattenSubpaths(p, self.smoothness, self.stats)
+         rings = []
+         if self.flattener == self.FLATTEN_EXTREMES:
+            for sp in p:
+               points = []
+               cspsubdiv.extremesToPoints(sp, points)
+               rings.append(points)
+            return rings
+         tests = 0
+         for sp in p:
+            points = []
+            tests += cspsubdiv.subdivToPoints(sp, self.smoothness, points)
+            rings.append(points)
+         self.stats.count("flatness tests", tests)
+         return rings
+
+
+   def flattenSuperpath(self, p):
+      """ Flattens the cubic super path p with the selected flattener.
+          Returns a single list of (x, y) points covering all of its subpaths. """
+      return list(chain.from_iterable(self.flattenRings(p)))
+
+
+   def plotPath(self, node, matTransform, style):
+      """ Plot the path while applying the transformation defined by the matrix matTransform.
+          style is its computed style. """
+
+      # p is a list of lists of cubic beziers [cp1, cp2, endp]
       # where the start-point is the last point of the previous segment.
       # For some reason the inkscape extensions uses csp[1] as the coordinates of each point,
       # but that makes it seem like they are using control point 2 as line points.
       # Maybe that is a side-effect of the CSP subdivion process? TODO
-      realPoints = []
-      for sp in p:
-         cspsubdiv.subdiv(sp, self.smoothness)
-         for csp in sp:
-            realPoints.append( (csp[1][0], csp[1][1]) )
+      if self.flattener == self.FLATTEN_BATCH:
+         # Flattened later, together with every other path, by flushPendingPaths
+         circle = self.circleObject(node, matTransform)
+         if circle is not None:
+            fill, points = circle
+            self.plotFlattened(node, fill, array.array("d", chain.from_iterable(points)))
+            return
+         if self.pathMemo is None:
+            parsed = self.parsePathNode(node, matTransform, style)
+            if parsed is not None:
+               fill, p = parsed
+               self.pendingPaths.append( (fill, self.pathEvenOdd(style), p, None, None, None, node) )
+            return
+         key, rings, offset = self.lookupPathMemo(node, matTransform)
+         p = None
+         if rings is None:
+            p = self.parsePathData(node.get("d"), self.memoLinearTransform(matTransform))
+            if p is None:
+               self.rememberPath(key, [])
+               return
+         elif not rings:
+            return
+         self.pendingPaths.append( (self.pathFill(style), self.pathEvenOdd(style), p, key, offset, rings, node) )
+         return
 
-      self.rawObjects.append( (filledPath, realPoints) )
+      objects = self.flattenPathNode(node, matTransform, style)
+      self.stats.emitted(objects)
+      self.rawObjects.extend(objects)
+
+
+   def flushPendingPaths(self):
+      """ Flattens all the paths queued up by plotPath for the batch flattener,
+          appending them to self.rawObjects in the order they were plotted.
+          Paths that share a memo key are only flattened once. """
+      if not self.pendingPaths:
+         return
+
+      batch = []
+      batchIndex = {} # memo key -> index into batch
+      slots = []
+      owners = [] # the element of each path in batch
+      for fill, evenOdd, p, key, offset, coords, node in self.pendingPaths:
+         if coords is not None:
+            # Memo hits and already flattened objects
+            slots.append(None)
+         elif key is not None and key in batchIndex:
+            # Looked up before the first copy was flattened, but served from the memo all the same
+            self.pathMemo.countAsHit()
+            slots.append(batchIndex[key])
+         else:
+            if key is not None:
+               batchIndex[key] = len(batch)
+            slots.append(len(batch))
+            batch.append(p)
+            owners.append(node)
+
+      subpaths = [sp for p in batch for sp in p]
+      with self.stats.stage("subdivide"):
+         for node, p in zip(owners, batch):
+            with self.stats.element(node):
+               self.stats.flattened(p, self.smoothness)
+         # One call for every path, whose time is shared out between them by their number of cubics
+         with self.stats.shared(owners, [sum(max(len(sp) - 1, 0) for sp in p) for p in batch]):
+            flattened = batchsubdiv.flattenSubpaths(subpaths, self.smoothness, self.stats)
+      results = []
+      index = 0
+      for p in batch:
+         results.append(flattened[index:index + len(p)])
+         index += len(p)
+
+      memoRings = {}
+      for key, i in batchIndex.items():
+         memoRings[i] = self.rememberPath(key, results[i])
+
+      for (fill, evenOdd, p, key, offset, coords, node), slot in zip(self.pendingPaths, slots):
+         with self.stats.element(node):
+            if evenOdd is None:
+               # A single object, flattened already
+               objects = [(fill, self.translateMemoPoints(coords, offset))]
+            else:
+               if key is None:
+                  rings = results[slot]
+               else:
+                  rings = [self.translateMemoPoints(packed, offset) for packed in (coords or memoRings[slot])]
+               objects = self.pathObjects(fill, evenOdd, rings)
+            self.stats.emitted(objects)
+         self.rawObjects.extend(objects)
+      self.pendingPaths = []
+
+
+   def buildIdIndex(self):
+      self.idIndex = {}
+      for node in self.svgRoot.iter(tag=etree.Element):
+         id = node.get("id")
+         if id is not None and id not in self.idIndex:
+            self.idIndex[id] = node
+
+
+   def flattenInstance(self, target, matLinear, style):
+      """ Flattens the subtree target (the children of a symbol) under the transform matLinear,
+          inheriting the computed style style, and returns [(fill, coords), ...] with the points
+          packed into arrays. """
+      rawObjects, pendingPaths = self.rawObjects, self.pendingPaths
+      self.rawObjects, self.pendingPaths = RawObjectStore(), []
+      try:
+         if target.tag == self.svgQName("symbol"):
+            nodes = list(target)
+            style = self.styles.resolve(target, style)
+         else:
+            nodes = [target]
+         self.recursivelyTraverseSvg(nodes, matLinear, style)
+         self.flushPendingPaths()
+         return [(fill, array.array("d", chain.from_iterable(points))) for fill, points in self.rawObjects]
+      finally:
+         self.rawObjects, self.pendingPaths = rawObjects, pendingPaths
+
+
+   def resolveUse(self, node, matTransform, style):
+      """ Resolves a <use> element, whose computed style is style, into the flattened objects of the subtree it references.
+          Returns ([(fill, coords), ...], (dx, dy) translation of this instance), or None if the
+          reference can't be followed. """
+      href = node.get(self.XLINK_HREF) or node.get("href") or ""
+      id = href[1:] if href.startswith("#") else None
+      if self.idIndex is None:
+         self.buildIdIndex()
+      target = self.idIndex.get(id)
+      if target is None:
+         self.report("Unresolved reference '%s' in <use>" % href)
+         return None
+      if id in self.activeInstances:
+         self.report("Circular reference '%s' in <use>" % href)
+         return None
+
+      # x and y are an extra translation after the transform of the <use> element itself
+      x = self.parseLengthAndUnits(node.get("x", "0"))[0] or 0.0
+      y = self.parseLengthAndUnits(node.get("y", "0"))[0] or 0.0
+      mat = simpletransform.composeTransform(matTransform, [[1.0, 0.0, x], [0.0, 1.0, y]])
+      if target.tag == self.svgQName("symbol"):
+         mat = simpletransform.composeTransform(mat, self.symbolTransform(target, node))
+
+      key = (id, mat[0][0], mat[0][1], mat[1][0], mat[1][1], self.smoothness, style)
+      objects = self.instanceCache.get(key)
+      if objects is None:
+         self.activeInstances.add(id)
+         try:
+            objects = self.flattenInstance(target, self.memoLinearTransform(mat), style)
+         finally:
+            self.activeInstances.discard(id)
+         self.instanceCache[key] = objects
+      self.useInstances += 1
+      return objects, (mat[0][2], mat[1][2])
+
+
+   def symbolTransform(self, symbol, use):
+      """ The transform from the viewBox of a <symbol> to the viewport the <use> element use
+          gives it: its width and height, or else those of the symbol, or else those of the
+          document. The identity for a symbol without a viewBox. Content outside the viewport
+          is drawn all the same, as nothing is clipped. """
+      viewBox = self.parseViewBox(symbol.get("viewBox"))
+      if viewBox is None:
+         return [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+      size = []
+      for name, default in zip(("width", "height"), self.viewportSize):
+         value = None
+         for element in (use, symbol):
+            if element.get(name) is not None:
+               value = self.parseLengthAndUnits(element.get(name))[0]
+               break
+         size.append(value if value is not None else default)
+      return self.viewBoxTransform(viewBox, size[0], size[1], symbol.get("preserveAspectRatio"))
+
+
+   def parseViewBox(self, viewBox):
+      """ Returns (min x, min y, width, height) from a viewBox attribute, or None if there is none
+          or it is malformed or empty. """
+      if not viewBox:
+         return None
+      try:
+         values = [float(v) for v in viewBox.replace(",", " ").split()]
+      except ValueError:
+         return None
+      if len(values) != 4 or values[2] <= 0 or values[3] <= 0:
+         return None
+      return values
+
+
+   def viewBoxTransform(self, viewBox, width, height, preserveAspectRatio=None):
+      """ The transform that fits viewBox (min x, min y, width, height) into a viewport of width x
+          height at the origin, following preserveAspectRatio (xMidYMid meet by default). """
+      vx, vy, vw, vh = viewBox
+      sx = width / vw
+      sy = height / vh
+      words = (preserveAspectRatio or "").split()
+      if words[:1] == ["defer"]:
+         words = words[1:]
+      align = words[0] if words else "xMidYMid"
+      tx, ty = 0.0, 0.0
+      if align != "none":
+         sx = sy = max(sx, sy) if words[1:2] == ["slice"] else min(sx, sy)
+         # The space left over along each axis goes before the viewBox (Min), around it or after it (Max)
+         fractions = {"Min": 0.0, "Mid": 0.5, "Max": 1.0}
+         tx = (width - vw * sx) * fractions.get(align[1:4], 0.5)
+         ty = (height - vh * sy) * fractions.get(align[5:8], 0.5)
+      return [[sx, 0.0, tx - vx * sx], [0.0, sy, ty - vy * sy]]
+
+
+   def plotUse(self, node, matTransform, style):
+      """ Plots every path of the subtree a <use> element references, as one more instance. """
+      resolved = self.resolveUse(node, matTransform, style)
+      if resolved is None:
+         return
+      objects, offset = resolved
+      for fill, coords in objects:
+         self.plotFlattened(node, fill, coords, offset)
+
+
+   def plotFlattened(self, node, fill, coords, offset=(0.0, 0.0)):
+      """ Adds an already flattened raw object drawn by the element node, given as packed coordinates and a translation. """
+      if self.flattener == self.FLATTEN_BATCH:
+         # Keeps the object in document order with the paths waiting to be flattened
+         self.pendingPaths.append( (fill, None, None, None, offset, coords, node) )
+      else:
+         obj = (fill, self.translateMemoPoints(coords, offset))
+         self.stats.emitted([obj])
+         self.rawObjects.append(obj)
+
+
+   def shapeObject(self, node, matTransform, style):
+      """ Turns a basic shape element, whose computed style is style, into a raw object under the transformation matrix matTransform.
+          Circles that stay round become CIRCLE objects, everything else a polygon with any
+          curved corners or sides sampled exactly. Returns None for a disabled or broken shape. """
+      name = etree.QName(node.tag).localname
+      with self.stats.stage("path parse"):
+         path = shapes.shapePath(name, node)
+      if path is None:
+         self.report("Skipping empty or malformed %s" % name)
+         return None
+      fill = self.pathFill(style)
+      if name == "circle" and arcs.isSimilarity(matTransform):
+         cx, cy, r = arcs.circleFromPath(path)
+         (x, y), = transformPoints(matTransform, [cx], [cy])
+         return CIRCLE, arcs.circlePoints(x, y, r * arcs.linearScale(matTransform))
+      with self.stats.stage("subdivide"):
+         points = shapes.linePoints(arcs.expandArcs(path, matTransform, self.smoothness, self.flattener == self.FLATTEN_EXTREMES))
+      with self.stats.stage("transform"):
+         return fill, transformPoints(matTransform, [point[0] for point in points], [point[1] for point in points])
+
+
+   def plotShape(self, node, matTransform, style):
+      obj = self.shapeObject(node, matTransform, style)
+      if obj is not None:
+         fill, points = obj
+         self.plotFlattened(node, fill, array.array("d", chain.from_iterable(points)))
+
+
+
+   def estimateBounds(self):
+      """ Cheap pre-pass that finds the bounds of the drawing before anything is flattened.
+          A separate, quiet parser streams through the file with the FLATTEN_EXTREMES flattener,
+          so no curve is subdivided or sampled and no hole is bridged: each cubic and arc only
+          adds its ends and the points where its x or y is smallest or largest. The result
+          is the exact bounding box of the curves, which the flattened drawing can fall short
+          of by no more than the smoothness on each side. Returns a BoundingBox, and leaves
+          this parser, its path memo, clones and counters alone. """
+      estimator = SvgParser(self.filename, flattener=self.FLATTEN_EXTREMES, stream=True, bridgeHoles=False, quiet=True)
+      box = BoundingBox()
+      for fill, points in estimator.iterRawObjects():
+         box.addPoints(points)
+      return box
 
 
 
@@ -155,61 +637,258 @@ class SvgParser:
 
 
 
-   def recursivelyTraverseSvg(self, nodeList=None, matCurrent=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], parent_visibility='visible' ):
+   def documentTransform(self, root):
+      """ Returns the initial transformation matrix for the document, from the
+          width, height and viewBox of the svg root element. """
+      matCurrent = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+
+      # get svg document width and height
+      width, units_width = self.parseLengthAndUnits(root.get("width"))
+      height, units_height = self.parseLengthAndUnits(root.get("height"))
+      if units_width != units_height:
+         raise ValueError("Weird, units for SVG root document width and height differ: %s and %s" % (
+            root.get("width"), root.get("height")))
+
+      # set initial viewbox from document root
+      viewbox = root.get("viewBox")
+      self.report("Document size: %f x %f (%s)" % (width, height, units_width))
+      # The viewport that symbols fill by default, in user units
+      documentBox = self.parseViewBox(viewbox)
+      self.viewportSize = (documentBox[2], documentBox[3]) if documentBox else (width, height)
+      if viewbox:
+         vinfo = viewbox.strip().replace(',', ' ').split(' ')
+         if (vinfo[2] != 0) and (vinfo[3] != 0):
+            sx = width / float(vinfo[2])
+            sy = height / float(vinfo[3])
+            matCurrent = simpletransform.parseTransform("scale(%f, %f) translate(%f, %f)" % (sx, sy, -float(vinfo[0]), -float(vinfo[1])))
+      return matCurrent
+
+
+
+   def recursivelyTraverseSvg(self, nodeList=None, matCurrent=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], parentStyle=INITIAL_STYLE ):
       """ Based on the Eggbot extension for Inkscape.
       Recursively traverse the svg file to plot out all the paths. Keeps track of the composite transformation that should be applied to each path.
 
-      Handles path, group.
-      Doesn't yet handle line, text, rect, polyline, polygon, circle, ellipse and use (clone) elements.
+      Handles path, group, use (clone), rect, circle, ellipse, line, polyline and polygon elements.
+      Symbols and defs are only drawn through use.
+      Doesn't yet handle text elements.
       Unhandled elements should be converted to paths in Inkscape.
       Probably want to avoid paths with holes inside.
+      Elements with display:none are skipped along with everything inside them, and hidden
+      ones (visibility:hidden or collapse) aren't drawn, though their children can still be.
       """
 
-      if not nodeList:
+      isRoot = nodeList is None
+      if isRoot:
+         self.stats.traversal(self)
          nodeList = self.svgRoot
+         matCurrent = self.documentTransform(nodeList)
+         parentStyle = self.styles.resolve(nodeList, parentStyle)
 
-         # get svg document width and height
-         width, units_width = self.parseLengthAndUnits(nodeList.get("width"))
-         height, units_height = self.parseLengthAndUnits(nodeList.get("height"))
-         if units_width != units_height:
-            print "Weird, units for SVG root document width and height differ..."
-            print nodeList.get("width")
-            print nodelist.get("height")
-            sys.exit(1)
-
-         # set initial viewbox from document root
-         viewbox = nodeList.get("viewBox")
-         print "Document size: %f x %f (%s)" % (width, height, units_width)
-         if viewbox:
-            vinfo = viewbox.strip().replace(',', ' ').split(' ')
-            if (vinfo[2] != 0) and (vinfo[3] != 0):
-               sx = width / float(vinfo[2])
-               sy = height / float(vinfo[3])
-               matCurrent = simpletransform.parseTransform("scale(%f, %f) translate(%f, %f)" % (sx, sy, -float(vinfo[0]), -float(vinfo[1])))
-
-      print "Initial transformation matrix:", matCurrent
+      if self.verbose:
+         print "Initial transformation matrix:", matCurrent
 
 
       for node in nodeList:
 
          # Ignore invisible nodes
-         v = node.get('visibility', parent_visibility)
-         if v == 'inherit':
-            v = parent_visibility
-         if v == 'hidden' or v == 'collapse':
-            pass
+         style = self.styles.resolve(node, parentStyle)
+         if not self.styles.isDisplayed(style):
+            continue
+         visible = self.styles.isVisible(style)
 
          # first apply the current matrix transform to this node's transform
-         matNew = simpletransform.composeTransform( matCurrent, simpletransform.parseTransform(node.get("transform")) )
+         with self.stats.stage("transform"):
+            matNew = simpletransform.composeTransformAttribute( matCurrent, node.get("transform") )
 
          if node.tag in [self.svgQName("g"), "g"]:
-            print "group tag - Might not be handled right!"
-            self.recursivelyTraverseSvg( list(node), matNew, v )
+            if self.verbose:
+               print "group tag - Might not be handled right!"
+            self.recursivelyTraverseSvg( list(node), matNew, style )
 
          elif node.tag in [self.svgQName("path")]:
-            self.plotPath( node, matNew )
+            self.pathsVisited += 1
+            if visible:
+               with self.stats.element(node):
+                  self.plotPath( node, matNew, style )
+
+         elif node.tag in [self.svgQName("use")]:
+            if visible:
+               with self.stats.element(node):
+                  self.plotUse( node, matNew, style )
+
+         elif node.tag in [self.svgQName(name) for name in shapes.SHAPE_TAGS]:
+            self.shapesVisited += 1
+            if visible:
+               with self.stats.element(node):
+                  self.plotShape( node, matNew, style )
+
+         elif node.tag in [self.svgQName("defs"), self.svgQName("symbol"), self.svgQName("style")]:
+            pass
 
-         else:
+         elif self.verbose:
             print "Other tag: '%s'" % node.tag
 
+      if isRoot:
+         self.flushPendingPaths()
+
+
+
+
+   def collectStreamReferences(self):
+      """ Reads ahead for iterRawObjects, so that streaming draws the same as loading the whole
+      document: the text of every <style> element, which applies to elements before it as well,
+      and a copy of each element a <use> refers to, wherever it is in the file.
+      The file is read once to find them, and a second time to copy the referenced elements if
+      there are any. Returns (style sheets, id -> element), and only reads the file the first time.
+      """
+      if self.streamReferences is not None:
+         return self.streamReferences
+      styleSheets = []
+      wanted = set()
+      nsmap = None
+      for event, node in etree.iterparse(self.filename, events=("start", "end")):
+         if nsmap is None:
+            nsmap = self.nsmap = node.nsmap
+         if event == "start":
+            continue
+         if node.tag == self.svgQName("style"):
+            styleSheets.append(node.text)
+         elif node.tag == self.svgQName("use"):
+            href = node.get(self.XLINK_HREF) or node.get("href") or ""
+            if href.startswith("#"):
+               wanted.add(href[1:])
+         self.discardHandled(node)
+
+      references = {}
+      if wanted:
+         claimed = set()
+         kept = [] # per open element: OUTSIDE, INSIDE a referenced element, or the outermost REFERENCED one
+         OUTSIDE, INSIDE, REFERENCED = range(3)
+         for event, node in etree.iterparse(self.filename, events=("start", "end")):
+            if event == "start":
+               # As with buildIdIndex, the first element with an id is the one referred to
+               id = node.get("id")
+               state = INSIDE if kept and kept[-1] != OUTSIDE else OUTSIDE
+               if id in wanted and id not in claimed:
+                  claimed.add(id)
+                  state = state or REFERENCED
+               kept.append(state)
+               continue
+            state = kept.pop()
+            if state == INSIDE:
+               continue
+            if state == REFERENCED:
+               element = copy.deepcopy(node)
+               # Held in empty copies of its ancestors, so it can still be told where it came from
+               holder = element
+               ancestor = node.getparent()
+               while ancestor is not None:
+                  wrapper = etree.Element(ancestor.tag)
+                  wrapper.append(holder)
+                  holder = wrapper
+                  ancestor = ancestor.getparent()
+               for element in element.iter(tag=etree.Element):
+                  id = element.get("id")
+                  if id in claimed and id not in references:
+                     references[id] = element
+            self.discardHandled(node)
+      self.streamReferences = styleSheets, references
+      return self.streamReferences
+
+
+   def discardHandled(self, node):
+      """ Frees an element iterparse has finished with, and its earlier siblings. """
+      node.clear()
+      parent = node.getparent()
+      if parent is not None:
+         while node.getprevious() is not None:
+            del parent[0]
+
+
+   def iterRawObjects(self):
+      """ Streaming version of recursivelyTraverseSvg, for use with stream=True.
+      Reads the file incrementally with iterparse and yields each raw object as soon as its path
+      is flattened, discarding the elements already handled, so memory use is bounded by the
+      largest single path rather than by the document. Every call reads the file again,
+      so a caller can make one pass to find the bounds and a second pass to write.
+      The style sheets and the elements <use> elements refer to are read ahead by
+      collectStreamReferences and kept in memory.
+      """
+      self.stats.traversal(self)
+      styleSheets, references = self.collectStreamReferences()
+      # One entry per open element: (matrix, computed style, are its children drawn?)
+      stack = []
+      self.idIndex = dict(references)
+      self.styles = StyleResolver()
+      for text in styleSheets:
+         self.styles.addStyleSheet(text)
+      for event, node in etree.iterparse(self.filename, events=("start", "end")):
+         if event == "end":
+            stack.pop()
+            # Everything inside this element and before it has been handled
+            self.discardHandled(node)
+            continue
+
+         if not stack:
+            self.nsmap = node.nsmap
+            stack.append( (self.documentTransform(node), self.styles.resolve(node), True) )
+            continue
+
+         matCurrent, parentStyle, descend = stack[-1]
+         if not descend or node.tag in [self.svgQName("defs"), self.svgQName("symbol"), self.svgQName("style")]:
+            stack.append( (matCurrent, parentStyle, False) )
+            continue
+
+         style = self.styles.resolve(node, parentStyle)
+         if not self.styles.isDisplayed(style):
+            stack.append( (matCurrent, style, False) )
+            continue
+         visible = self.styles.isVisible(style)
+
+         with self.stats.stage("transform"):
+            matNew = simpletransform.composeTransformAttribute( matCurrent, node.get("transform") )
+
+         if node.tag in [self.svgQName("g"), "g"]:
+            stack.append( (matNew, style, True) )
+
+         elif node.tag in [self.svgQName("path")]:
+            stack.append( (matNew, style, False) )
+            self.pathsVisited += 1
+            if visible:
+               # The objects are worked out before any of them is yielded, so the time the
+               # caller spends on them isn't charged to the element
+               with self.stats.element(node):
+                  objects = self.flattenPathNode(node, matNew, style)
+                  self.stats.emitted(objects)
+               for obj in objects:
+                  yield obj
+
+         elif node.tag in [self.svgQName("use")]:
+            stack.append( (matNew, style, False) )
+            if visible:
+               with self.stats.element(node):
+                  resolved = self.resolveUse(node, matNew, style)
+                  objects = []
+                  if resolved is not None:
+                     instance, offset = resolved
+                     objects = [(fill, self.translateMemoPoints(coords, offset)) for fill, coords in instance]
+                  self.stats.emitted(objects)
+               for obj in objects:
+                  yield obj
+
+         elif node.tag in [self.svgQName(name) for name in shapes.SHAPE_TAGS]:
+            stack.append( (matNew, style, False) )
+            self.shapesVisited += 1
+            if visible:
+               with self.stats.element(node):
+                  obj = self.shapeObject(node, matNew, style)
+                  objects = [obj] if obj is not None else []
+                  self.stats.emitted(objects)
+               for obj in objects:
+                  yield obj
 
+         else:
+            if self.verbose:
+               print "Other tag: '%s'" % node.tag
+            stack.append( (matNew, style, False) )
@@ -0,0 +1,217 @@
+# Exact handling of SVG elliptical arcs.
+# Arcs are sampled straight from their center parameterization, with just enough
+# segments to stay within the flattening tolerance, instead of being turned into
+# cubic beziers by cubicsuperpath.ArcToPath and then subdivided again.
+# Paths that are a single full circle are recognized so they can be written out
+# as native KiCad circles.
+# TODO comments, license
+
+from math import sin, cos, acos, atan2, sqrt, radians, ceil, pi
+
+
+# Upper limit on the segments of one arc, whatever the tolerance
+MAX_ARC_SEGMENTS = 4096
+
+# Relative slack when comparing radii, centers and sweep angles of circle arcs
+CIRCLE_EPSILON = 1e-6
+
+
+def arcCenterParameters(x1, y1, rx, ry, phi, largeArc, sweep, x2, y2):
+   """ Converts an SVG arc from (x1, y1) to (x2, y2) into its center parameterization,
+       following the SVG implementation notes (F.6.5 and F.6.6, radii scaled up when too small).
+       phi is in degrees. Returns (cx, cy, rx, ry, phi in radians, start angle, sweep angle),
+       or None for an arc that is just a straight line. """
+   rx = abs(rx)
+   ry = abs(ry)
+   if rx == 0 or ry == 0 or (x1 == x2 and y1 == y2):
+      return None
+   phi = radians(phi)
+   cosPhi = cos(phi)
+   sinPhi = sin(phi)
+   dx = (x1 - x2) / 2.0
+   dy = (y1 - y2) / 2.0
+   x1p = cosPhi * dx + sinPhi * dy
+   y1p = -sinPhi * dx + cosPhi * dy
+
+   scale = (x1p * x1p) / (rx * rx) + (y1p * y1p) / (ry * ry)
+   if scale > 1:
+      rx *= sqrt(scale)
+      ry *= sqrt(scale)
+
+   numerator = rx * rx * ry * ry - rx * rx * y1p * y1p - ry * ry * x1p * x1p
+   denominator = rx * rx * y1p * y1p + ry * ry * x1p * x1p
+   coef = sqrt(max(0.0, numerator / denominator))
+   if largeArc == sweep:
+      coef = -coef
+   cxp = coef * rx * y1p / ry
+   cyp = -coef * ry * x1p / rx
+   cx = cosPhi * cxp - sinPhi * cyp + (x1 + x2) / 2.0
+   cy = sinPhi * cxp + cosPhi * cyp + (y1 + y2) / 2.0
+
+   start = atan2((y1p - cyp) / ry, (x1p - cxp) / rx)
+   end = atan2((-y1p - cyp) / ry, (-x1p - cxp) / rx)
+   delta = end - start
+   if sweep and delta < 0:
+      delta += 2 * pi
+   elif not sweep and delta > 0:
+      delta -= 2 * pi
+   return cx, cy, rx, ry, phi, start, delta
+
+
+def linearScale(mat):
+   """ Largest factor by which the transformation matrix mat stretches any vector (its largest singular value). """
+   a, c = mat[0][0], mat[0][1]
+   b, d = mat[1][0], mat[1][1]
+   p = a * a + b * b + c * c + d * d
+   det = a * d - b * c
+   return sqrt((p + sqrt(max(0.0, p * p - 4 * det * det))) / 2.0)
+
+
+def isSimilarity(mat):
+   """ True if the transformation matrix mat only rotates, reflects, scales uniformly and translates,
+       so it maps circles onto circles. """
+   a, c = mat[0][0], mat[0][1]
+   b, d = mat[1][0], mat[1][1]
+   lengthX = a * a + b * b
+   lengthY = c * c + d * d
+   return abs(lengthX - lengthY) <= CIRCLE_EPSILON * lengthX and abs(a * c + b * d) <= CIRCLE_EPSILON * lengthX
+
+
+def arcSegmentCount(radius, sweep, tolerance):
+   """ Number of equal chords that keep an arc of the given radius and sweep angle
+       within tolerance of the true curve. """
+   if tolerance <= 0:
+      return MAX_ARC_SEGMENTS
+   if tolerance >= 2 * radius:
+      step = 2 * pi
+   else:
+      # A chord spanning an angle t strays radius * (1 - cos(t / 2)) from the arc
+      step = 2 * acos(1 - tolerance / radius)
+   return max(1, min(MAX_ARC_SEGMENTS, int(ceil(abs(sweep) / step))))
+
+
+def sampleArc(center, scale, tolerance):
+   """ Returns the points after the first one along an arc given by its center
+       parameterization, with the last one being the exact end of the arc.
+       scale is how much the arc will still be magnified after this, see linearScale. """
+   cx, cy, rx, ry, phi, start, delta = center
+   count = arcSegmentCount(max(rx, ry) * scale, delta, tolerance)
+   cosPhi = cos(phi)
+   sinPhi = sin(phi)
+   points = []
+   for i in range(1, count + 1):
+      t = start + delta * i / count
+      x = rx * cos(t)
+      y = ry * sin(t)
+      points.append( [cx + cosPhi * x - sinPhi * y, cy + sinPhi * x + cosPhi * y] )
+   return points
+
+
+def arcExtremePoints(center, mat):
+   """ Like sampleArc, but returns only the points where x or y of the arc is smallest or
+       largest once it is transformed by mat, in the order the arc passes them, and then
+       the end of the arc, so they have the same bounds as the transformed arc. """
+   cx, cy, rx, ry, phi, start, delta = center
+   cosPhi = cos(phi)
+   sinPhi = sin(phi)
+   fractions = []
+   for a, b in ((mat[0][0], mat[0][1]), (mat[1][0], mat[1][1])):
+      # Along the arc the coordinate is a constant plus u cos(t) + v sin(t), which turns
+      # where t = atan2(v, u) + k pi
+      u = rx * (a * cosPhi + b * sinPhi)
+      v = ry * (b * cosPhi - a * sinPhi)
+      if u == 0 and v == 0:
+         continue
+      turn = atan2(v, u)
+      for k in range(-4, 5):
+         fraction = (turn + k * pi - start) / delta
+         if 0 < fraction < 1:
+            fractions.append(fraction)
+   points = []
+   for fraction in sorted(fractions) + [1.0]:
+      t = start + delta * fraction
+      x = rx * cos(t)
+      y = ry * sin(t)
+      points.append( [cx + cosPhi * x - sinPhi * y, cy + sinPhi * x + cosPhi * y] )
+   return points
+
+
+def expandArcs(simplePath, mat, tolerance, extremesOnly=False):
+   """ Replaces every arc in a simplepath.parsePath command list with line segments,
+       sampled so they are within tolerance once the path is transformed by mat, or with
+       extremesOnly through just the points of arcExtremePoints.
+       Returns simplePath itself when there are no arcs in it. """
+   if not any(command == "A" for command, params in simplePath):
+      return simplePath
+   scale = linearScale(mat)
+   result = []
+   pen = subpathStart = [0.0, 0.0]
+   for command, params in simplePath:
+      if command == "A":
+         rx, ry, phi, largeArc, sweep, x, y = params
+         center = arcCenterParameters(pen[0], pen[1], rx, ry, phi, largeArc, sweep, x, y)
+         if center is None:
+            result.append( ["L", [x, y]] )
+         else:
+            points = arcExtremePoints(center, mat) if extremesOnly else sampleArc(center, scale, tolerance)
+            points[-1] = [x, y]
+            for point in points:
+               result.append( ["L", point] )
+      else:
+         result.append( [command, params] )
+
+      if command == "M":
+         subpathStart = params[-2:]
+      if command == "Z":
+         pen = subpathStart
+      else:
+         pen = params[-2:]
+   return result
+
+
+def circleFromPath(simplePath):
+   """ Recognizes a path that is exactly one full circle made of arcs, like the ones Inkscape writes.
+       Returns (cx, cy, r), or None if the path is anything else. """
+   if len(simplePath) < 2 or simplePath[0][0] != "M":
+      return None
+   commands = simplePath[1:]
+   if commands[-1][0] == "Z":
+      commands = commands[:-1]
+   if not commands:
+      return None
+
+   pen = simplePath[0][1]
+   circle = None
+   total = 0.0
+   for command, params in commands:
+      if command != "A":
+         return None
+      rx, ry, phi, largeArc, sweep, x, y = params
+      center = arcCenterParameters(pen[0], pen[1], rx, ry, phi, largeArc, sweep, x, y)
+      if center is None:
+         return None
+      cx, cy, rx, ry, phi, start, delta = center
+      if abs(rx - ry) > CIRCLE_EPSILON * rx:
+         return None
+      if circle is None:
+         circle = (cx, cy, rx)
+      elif (abs(cx - circle[0]) > CIRCLE_EPSILON * rx or abs(cy - circle[1]) > CIRCLE_EPSILON * rx
+            or abs(rx - circle[2]) > CIRCLE_EPSILON * rx):
+         return None
+      if total != 0 and (delta > 0) != (total > 0):
+         return None
+      total += delta
+      pen = [x, y]
+
+   start = simplePath[0][1]
+   if abs(abs(total) - 2 * pi) > CIRCLE_EPSILON * 2 * pi:
+      return None
+   if abs(pen[0] - start[0]) > CIRCLE_EPSILON * circle[2] or abs(pen[1] - start[1]) > CIRCLE_EPSILON * circle[2]:
+      return None
+   return circle
+
+
+def circlePoints(cx, cy, r):
+   """ The points a circle is kept as in a raw object: its center, then its rightmost,
+       lowest, leftmost and highest points, so the bounds of the points are those of the circle. """
+   return [(cx, cy), (cx + r, cy), (cx, cy + r), (cx - r, cy), (cx, cy - r)]
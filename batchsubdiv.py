@@ -0,0 +1,138 @@
+# Batched cubic bezier flattening using NumPy.
+# Gathers every cubic segment of many cubic super paths into contiguous arrays
+# and subdivides them breadth-first, one vectorized pass per subdivision level.
+# The result is the same list of points that cspsubdiv.subdiv would produce.
+# TODO comments, license
+
+try:
+   import numpy
+except ImportError:
+   numpy = None
+
+
+# Segments still not flat after this many halvings are accepted as they are.
+# This also keeps the t-parameter sort keys exact in a float64.
+MAX_DEPTH = 48
+
+
+def available():
+   """ Returns True if NumPy could be imported and this module is usable. """
+   return numpy is not None
+
+
+def maxdistSquared(segs):
+   """ Vectorized version of fastgeom.bezierMaxDistanceSquared. segs is an (N, 8) array of
+       p0x p0y p1x p1y p2x p2y p3x p3y rows. Returns an array of N squared distances. """
+   p0x = segs[:, 0]
+   p0y = segs[:, 1]
+   p3x = segs[:, 6]
+   p3y = segs[:, 7]
+   dx = p3x - p0x
+   dy = p3y - p0y
+   c2 = dx * dx + dy * dy
+   with numpy.errstate(divide="ignore", invalid="ignore"):
+      result = None
+      for px, py in ((segs[:, 2], segs[:, 3]), (segs[:, 4], segs[:, 5])):
+         c1 = (px - p0x) * dx + (py - p0y) * dy
+         d0 = (p0x - px) * (p0x - px) + (p0y - py) * (p0y - py)
+         d3 = (p3x - px) * (p3x - px) + (p3y - py) * (p3y - py)
+         cross = dx * (p0y - py) - (p0x - px) * dy
+         perp = cross * cross / c2
+         d = numpy.where(c1 <= 0, d0, numpy.where(c2 <= c1, d3, perp))
+         result = d if result is None else numpy.maximum(result, d)
+   return result
+
+
+def splitHalf(segs):
+   """ Vectorized version of fastgeom.bezierSplitHalf. Returns (left, right). """
+   p0 = segs[:, 0:2]
+   p1 = segs[:, 2:4]
+   p2 = segs[:, 4:6]
+   p3 = segs[:, 6:8]
+   m1 = p0 + 0.5 * (p1 - p0)
+   m2 = p1 + 0.5 * (p2 - p1)
+   m3 = p2 + 0.5 * (p3 - p2)
+   m4 = m1 + 0.5 * (m2 - m1)
+   m5 = m2 + 0.5 * (m3 - m2)
+   m = m4 + 0.5 * (m5 - m4)
+   left = numpy.hstack((p0, m1, m4, m))
+   right = numpy.hstack((m, m5, m3, p3))
+   return left, right
+
+
+def flattenSubpaths(subpaths, flat, stats=None):
+   """ Flattens a list of cubic super path subpaths (lists of [cp1, pt, cp2]
+       superpoints, as produced by cubicsuperpath.parsePath) all at once.
+       Returns a list with one list of (x, y) tuples per subpath, identical to
+       running cspsubdiv.subdiv(sp, flat) and then collecting csp[1] of each superpoint.
+       The number of flatness tests made is counted in the recorder stats, if there is one. """
+   if numpy is None:
+      raise ImportError("The batched flattener requires NumPy")
+
+   lengths = [len(sp) for sp in subpaths]
+   total = sum(lengths)
+   if total == 0:
+      return [[] for sp in subpaths]
+
+   # One row per superpoint, [cp1x, cp1y, x, y, cp2x, cp2y]
+   superpoints = numpy.array([c for sp in subpaths for c in sp], dtype=numpy.float64).reshape(total, 6)
+
+   # A segment joins superpoint i to superpoint i+1 when both are in the same subpath
+   ends = numpy.cumsum(lengths)
+   starts = ends - numpy.array(lengths)
+   valid = numpy.ones(total, dtype=bool)
+   valid[ends[numpy.array(lengths) > 0] - 1] = False
+   segIndex = numpy.nonzero(valid)[0]
+
+   segs = numpy.hstack((superpoints[segIndex, 2:6], superpoints[segIndex + 1, 0:4]))
+   tstart = numpy.zeros(len(segIndex))
+   width = 1.0
+   flat2 = flat * flat
+
+   doneIndex = []
+   doneT = []
+   doneXY = []
+   depth = 0
+   tests = 0
+   while len(segs):
+      if depth >= MAX_DEPTH:
+         isFlat = numpy.ones(len(segs), dtype=bool)
+      else:
+         isFlat = maxdistSquared(segs) <= flat2
+         tests += len(segs)
+      doneIndex.append(segIndex[isFlat])
+      doneT.append(tstart[isFlat])
+      doneXY.append(segs[isFlat, 6:8])
+
+      rest = ~isFlat
+      if not rest.any():
+         break
+      left, right = splitHalf(segs[rest])
+      width *= 0.5
+      segs = numpy.vstack((left, right))
+      segIndex = numpy.concatenate((segIndex[rest], segIndex[rest]))
+      tstart = numpy.concatenate((tstart[rest], tstart[rest] + width))
+      depth += 1
+
+   if stats is not None:
+      stats.count("flatness tests", tests)
+
+   # The first point of each subpath sorts ahead of all of its segments
+   heads = starts[numpy.array(lengths) > 0]
+   doneIndex.append(heads)
+   doneT.append(numpy.repeat(-1.0, len(heads)))
+   doneXY.append(superpoints[heads, 2:4])
+
+   allIndex = numpy.concatenate(doneIndex)
+   allXY = numpy.vstack(doneXY)
+   order = numpy.lexsort((numpy.concatenate(doneT), allIndex))
+   allXY = allXY[order]
+   counts = numpy.bincount(numpy.searchsorted(ends, allIndex[order], side="right"), minlength=len(subpaths))
+
+   points = [tuple(p) for p in allXY.tolist()]
+   result = []
+   offset = 0
+   for count in counts.tolist():
+      result.append(points[offset:offset + count])
+      offset += count
+   return result
@@ -0,0 +1,91 @@
+# Latency benchmark for the conversion daemon.
+# Converts the same drawing repeatedly three ways and compares the time each conversion
+# takes, as seen by the caller:
+#    cold       a new python svg2kicadmod.py process every time, as CI scripts do now
+#    client     a new python svg2kicadclient.py process sending it to svg2kicadserver.py
+#    request    a request sent from this process, the daemon's latency alone
+# and checks that all three write the same file.
+# Run as: python benchmarks/bench_daemon.py [runs] [svg file] [svg2kicadmod.py arguments after input and output]
+#         e.g. python benchmarks/bench_daemon.py 20 test.svg F.SilkS 20
+
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY = os.path.join(BENCHMARKS, "..")
+sys.path.insert(0, REPOSITORY)
+
+from svg2kicadclient import sendRequest, convertRequest
+
+
+def startDaemon(socketPath, processes=2):
+   daemon = subprocess.Popen([sys.executable, os.path.join(REPOSITORY, "svg2kicadserver.py"), "--socket", socketPath,
+                              "-j", str(processes)], stdout=open(os.devnull, "w"))
+   for i in range(200):
+      try:
+         sendRequest({"command": "ping"}, socketPath)
+         return daemon
+      except socket.error:
+         time.sleep(0.05)
+   daemon.kill()
+   raise RuntimeError("The daemon didn't start")
+
+
+def timeRuns(run, runs):
+   times = []
+   for i in range(runs):
+      start = time.time()
+      run()
+      times.append(time.time() - start)
+   return sorted(times)
+
+
+def checkedCall(command):
+   with open(os.devnull, "w") as devnull:
+      subprocess.check_call(command, stdout=devnull)
+
+
+if __name__ == "__main__":
+   runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+   svg = os.path.abspath(sys.argv[2] if len(sys.argv) > 2 else os.path.join(REPOSITORY, "test.svg"))
+   extra = sys.argv[3:] or ["F.SilkS", "20"]
+   directory = tempfile.mkdtemp()
+   socketPath = os.path.join(directory, "daemon.sock")
+   outputs = dict((mode, os.path.join(directory, mode + ".kicad_mod")) for mode in ["cold", "client", "request"])
+
+   daemon = startDaemon(socketPath)
+   try:
+      results = []
+      results.append( ("cold", timeRuns(lambda: checkedCall(
+         [sys.executable, os.path.join(REPOSITORY, "svg2kicadmod.py"), svg, outputs["cold"]] + extra), runs)) )
+      results.append( ("client", timeRuns(lambda: checkedCall(
+         [sys.executable, os.path.join(REPOSITORY, "svg2kicadclient.py"), "--socket", socketPath, svg, outputs["client"]] + extra),
+         runs)) )
+
+      def request():
+         response = sendRequest(convertRequest([svg, outputs["request"]] + extra), socketPath)
+         if response["status"] != 0:
+            raise RuntimeError(response["stderr"])
+      results.append( ("request", timeRuns(request, runs)) )
+   finally:
+      sendRequest({"command": "shutdown"}, socketPath)
+      daemon.wait()
+
+   contents = []
+   for mode in sorted(outputs):
+      with open(outputs[mode], "r") as fid:
+         contents.append(fid.read())
+      os.remove(outputs[mode])
+   os.rmdir(directory)
+
+   print "%s, %d runs each" % (os.path.basename(svg), runs)
+   print "%-10s %12s %12s %12s" % ("mode", "median ms", "mean ms", "best ms")
+   for mode, times in results:
+      print "%-10s %12.1f %12.1f %12.1f" % (mode, times[len(times) // 2] * 1e3, sum(times) / len(times) * 1e3, times[0] * 1e3)
+   cold = results[0][1][runs // 2]
+   print "Median speedup over cold invocations: %.1fx with the client command, %.1fx per request, same result: %s" % (
+      cold / results[1][1][runs // 2], cold / results[2][1][runs // 2], all(text == contents[0] for text in contents))
@@ -0,0 +1,76 @@
+# Benchmark for merging overlapping filled polygons.
+# Generates a drawing of chains of overlapping ellipses and rects, like the strokes
+# of converted text, plus badges drawn as a fill with an outline on top, and reports
+# how long the merge takes and how many polygons and vertices it saves.
+# Run as: python benchmarks/bench_merge.py [chains] [smoothness]
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from SvgParser import SvgParser
+from union import PolygonMerger
+
+
+header = """<?xml version="1.0"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:svg="http://www.w3.org/2000/svg" width="1000" height="1000">
+"""
+style = 'style="fill:#000000"'
+
+
+def writeDrawing(count, filename):
+   random.seed(1)
+   lines = [header]
+   for i in range(count):
+      x = (i % 30) * 32.0
+      y = (i // 30) * 32.0
+      # A chain of overlapping blobs
+      for j in range(6):
+         lines.append('<ellipse cx="%f" cy="%f" rx="%f" ry="3" %s/>\n' % (x + 4 + 3 * j, y + 6 + random.uniform(-2, 2),
+                                                                     random.uniform(2, 4), style))
+         lines.append('<rect x="%f" y="%f" width="4" height="2" transform="rotate(%f %f %f)" %s/>\n' %
+                      (x + 3 * j, y + 14, random.uniform(0, 90), x + 3 * j, y + 14, style))
+      # A badge: its fill, then its outline as a ring on top
+      lines.append('<rect x="%f" y="%f" width="20" height="8" rx="2" %s/>\n' % (x + 2, y + 20, style))
+      lines.append('<path d="M %f,%f h 22 v 10 h -22 z M %f,%f v 6 h 18 v -6 z" %s/>\n' %
+                   (x + 1, y + 19, x + 3, y + 21, style))
+   lines.append("</svg>\n")
+   with open(filename, "w") as fid:
+      fid.write("".join(lines))
+
+
+def flatten(filename, smoothness):
+   stdout = sys.stdout
+   sys.stdout = open(os.devnull, "w")
+   try:
+      sd = SvgParser(filename, smoothness=smoothness)
+      sd.recursivelyTraverseSvg()
+   finally:
+      sys.stdout.close()
+      sys.stdout = stdout
+   return list(sd.rawObjects)
+
+
+if __name__ == "__main__":
+   count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+   smoothness = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+   directory = tempfile.mkdtemp()
+   filename = os.path.join(directory, "overlaps.svg")
+   writeDrawing(count, filename)
+   objects = flatten(filename, smoothness)
+   os.remove(filename)
+   os.rmdir(directory)
+
+   merger = PolygonMerger()
+   start = time.time()
+   merged = list(merger.mergeObjects(objects))
+   elapsed = time.time() - start
+
+   print "%d chains, smoothness %f, merged in %.3f seconds" % (count, smoothness, elapsed)
+   print "%-8s %10s %10s" % ("", "polygons", "vertices")
+   print "%-8s %10d %10d" % ("before", merger.polygonsBefore, merger.pointsBefore)
+   print "%-8s %10d %10d" % ("after", merger.polygonsAfter, merger.pointsAfter)
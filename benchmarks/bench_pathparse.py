@@ -0,0 +1,183 @@
+# Benchmark for simplepath.parsePath on large path data.
+# Compares the original three pattern lexer and parser (kept here for reference)
+# with the single pattern version, on machine generated paths of every command
+# kind, absolute and relative, and checks that both give the same command list.
+# Run as: python benchmarks/bench_pathparse.py [segments]
+
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import simplepath
+from simplepath import pathdefs
+
+
+def originalLexPath(d):
+   """ The original simplepath.lexPath. """
+   offset = 0
+   length = len(d)
+   delim = re.compile(r'[ \t\r\n,]+')
+   command = re.compile(r'[MLHVCSQTAZmlhvcsqtaz]')
+   parameter = re.compile(r'(([-+]?[0-9]+(\.[0-9]*)?|[-+]?\.[0-9]+)([eE][-+]?[0-9]+)?)')
+   while 1:
+      m = delim.match(d, offset)
+      if m:
+         offset = m.end()
+      if offset >= length:
+         break
+      m = command.match(d, offset)
+      if m:
+         yield [d[offset:m.end()], True]
+         offset = m.end()
+         continue
+      m = parameter.match(d, offset)
+      if m:
+         yield [d[offset:m.end()], False]
+         offset = m.end()
+         continue
+      raise Exception, 'Invalid path data!'
+
+
+def originalParsePath(d):
+   """ The original simplepath.parsePath. """
+   retval = []
+   lexer = originalLexPath(d)
+
+   pen = (0.0, 0.0)
+   subPathStart = pen
+   lastControl = pen
+   lastCommand = ''
+
+   while 1:
+      try:
+         token, isCommand = lexer.next()
+      except StopIteration:
+         break
+      params = []
+      needParam = True
+      if isCommand:
+         if not lastCommand and token.upper() != 'M':
+            raise Exception, 'Invalid path, must begin with moveto.'
+         else:
+            command = token
+      else:
+         needParam = False
+         if lastCommand:
+            if lastCommand.isupper():
+               command = pathdefs[lastCommand][0]
+            else:
+               command = pathdefs[lastCommand.upper()][0].lower()
+         else:
+            raise Exception, 'Invalid path, no initial command.'
+      numParams = pathdefs[command.upper()][1]
+      while numParams > 0:
+         if needParam:
+            try:
+               token, isCommand = lexer.next()
+               if isCommand:
+                  raise Exception, 'Invalid number of parameters'
+            except StopIteration:
+               raise Exception, 'Unexpected end of path'
+         cast = pathdefs[command.upper()][2][-numParams]
+         param = cast(token)
+         if command.islower():
+            if pathdefs[command.upper()][3][-numParams] == 'x':
+               param += pen[0]
+            elif pathdefs[command.upper()][3][-numParams] == 'y':
+               param += pen[1]
+         params.append(param)
+         needParam = True
+         numParams -= 1
+      outputCommand = command.upper()
+
+      if outputCommand in ('H', 'V'):
+         if outputCommand == 'H':
+            params.append(pen[1])
+         if outputCommand == 'V':
+            params.insert(0, pen[0])
+         outputCommand = 'L'
+      if outputCommand in ('S', 'T'):
+         params.insert(0, pen[1] + (pen[1] - lastControl[1]))
+         params.insert(0, pen[0] + (pen[0] - lastControl[0]))
+         if outputCommand == 'S':
+            outputCommand = 'C'
+         if outputCommand == 'T':
+            outputCommand = 'Q'
+
+      if outputCommand == 'M':
+         subPathStart = tuple(params[0:2])
+         pen = subPathStart
+      if outputCommand == 'Z':
+         pen = subPathStart
+      else:
+         pen = tuple(params[-2:])
+
+      if outputCommand in ('Q', 'C'):
+         lastControl = tuple(params[-4:-2])
+      else:
+         lastControl = pen
+      lastCommand = command
+
+      retval.append([outputCommand, params])
+   return retval
+
+
+def number():
+   """ A random coordinate, written in one of the ways SVG editors and generators write them. """
+   value = random.uniform(-100, 100)
+   style = random.randint(0, 3)
+   if style == 0:
+      return "%.3f" % value
+   if style == 1:
+      return "%d" % value
+   if style == 2:
+      return "%.6e" % value
+   return ("%.2f" % value).replace("0.", ".")
+
+
+def makePathData(segments):
+   """ Path data with segments commands, mixing every command, in both cases, with and without
+       repeated (implicit) commands and with space, comma and no separators. """
+   random.seed(7)
+   parts = ["M %s,%s" % (number(), number())]
+   for i in range(segments):
+      command = random.choice("LHVCSQTAZ")
+      if random.random() < 0.5:
+         command = command.lower()
+      count = pathdefs[command.upper()][1]
+      if command in "Aa":
+         params = [number().lstrip("-"), number().lstrip("-"), number(), str(random.randint(0, 1)),
+                   str(random.randint(0, 1)), number(), number()]
+      else:
+         params = [number() for j in range(count)]
+      separator = random.choice([" ", ",", " , "])
+      parts.append(command + " " + separator.join(params))
+      if command in "Zz":
+         parts.append("M %s %s" % (number(), number()))
+   return "\n".join(parts)
+
+
+def timeParser(parse, d, repeats=3):
+   best = None
+   for i in range(repeats):
+      start = time.time()
+      result = parse(d)
+      elapsed = time.time() - start
+      best = elapsed if best is None else min(best, elapsed)
+   return best, result
+
+
+if __name__ == "__main__":
+   segments = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+   d = makePathData(segments)
+   print "%d commands, %d bytes of path data" % (segments, len(d))
+   original, expected = timeParser(originalParsePath, d)
+   single, result = timeParser(simplepath.parsePath, d)
+   print "%-16s %10s %12s" % ("parser", "seconds", "MB/s")
+   print "%-16s %10.3f %12.2f" % ("original", original, len(d) / original / 1e6)
+   print "%-16s %10.3f %12.2f" % ("single pattern", single, len(d) / single / 1e6)
+   print "Speedup: %.2fx, same result: %s" % (original / single, result == expected)
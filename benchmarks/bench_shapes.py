@@ -0,0 +1,103 @@
+# Benchmark for the native basic shape elements.
+# Generates a drawing made of rects, rounded rects, circles, ellipses, polylines and
+# polygons, plus the same drawing after Inkscape's "object to path", where every
+# curve is a cubic bezier, and compares conversion time and vertex count.
+# Run as: python benchmarks/bench_shapes.py [shapes per kind] [smoothness]
+
+import os
+import sys
+import math
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from SvgParser import SvgParser
+
+
+header = """<?xml version="1.0"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:svg="http://www.w3.org/2000/svg" width="1000" height="1000">
+"""
+
+# Control point distance of a cubic bezier quarter circle, as Inkscape uses
+KAPPA = 0.5522847498
+
+
+def ellipseCubics(cx, cy, rx, ry):
+   kx = KAPPA * rx
+   ky = KAPPA * ry
+   return ("M %f,%f C %f,%f %f,%f %f,%f C %f,%f %f,%f %f,%f C %f,%f %f,%f %f,%f C %f,%f %f,%f %f,%f Z" %
+           (cx + rx, cy,
+            cx + rx, cy + ky, cx + kx, cy + ry, cx, cy + ry,
+            cx - kx, cy + ry, cx - rx, cy + ky, cx - rx, cy,
+            cx - rx, cy - ky, cx - kx, cy - ry, cx, cy - ry,
+            cx + kx, cy - ry, cx + rx, cy - ky, cx + rx, cy))
+
+
+def roundedRectCubics(x, y, w, h, r):
+   k = KAPPA * r
+   return ("M %f,%f L %f,%f C %f,%f %f,%f %f,%f L %f,%f C %f,%f %f,%f %f,%f L %f,%f C %f,%f %f,%f %f,%f "
+           "L %f,%f C %f,%f %f,%f %f,%f Z" %
+           (x + r, y, x + w - r, y,
+            x + w - r + k, y, x + w, y + r - k, x + w, y + r, x + w, y + h - r,
+            x + w, y + h - r + k, x + w - r + k, y + h, x + w - r, y + h, x + r, y + h,
+            x + r - k, y + h, x, y + h - r + k, x, y + h - r, x, y + r,
+            x, y + r - k, x + r - k, y, x + r, y))
+
+
+def writeDrawings(count, nativeName, pathName):
+   native = [header]
+   paths = [header]
+   for i in range(count):
+      x = (i % 40) * 25.0
+      y = (i // 40) * 25.0
+      native.append('<rect x="%f" y="%f" width="10" height="6"/>\n' % (x, y))
+      paths.append('<path d="M %f,%f L %f,%f L %f,%f L %f,%f Z"/>\n' % (x, y, x + 10, y, x + 10, y + 6, x, y + 6))
+      native.append('<rect x="%f" y="%f" width="10" height="6" rx="2"/>\n' % (x, y + 8))
+      paths.append('<path d="%s"/>\n' % roundedRectCubics(x, y + 8, 10, 6, 2))
+      native.append('<circle cx="%f" cy="%f" r="3"/>\n' % (x + 15, y + 3))
+      paths.append('<path d="%s"/>\n' % ellipseCubics(x + 15, y + 3, 3, 3))
+      native.append('<ellipse cx="%f" cy="%f" rx="4" ry="2"/>\n' % (x + 15, y + 12))
+      paths.append('<path d="%s"/>\n' % ellipseCubics(x + 15, y + 12, 4, 2))
+      star = ["%f,%f" % (x + 5 + 4 * math.cos(a * math.pi / 5) * (1 if a % 2 else 0.5),
+                         y + 19 + 4 * math.sin(a * math.pi / 5) * (1 if a % 2 else 0.5)) for a in range(10)]
+      native.append('<polygon points="%s"/>\n' % " ".join(star))
+      paths.append('<path d="M %s Z"/>\n' % " L ".join(star))
+      native.append('<polyline points="%f,%f %f,%f %f,%f"/>\n' % (x + 12, y + 18, x + 16, y + 22, x + 20, y + 18))
+      paths.append('<path d="M %f,%f L %f,%f L %f,%f"/>\n' % (x + 12, y + 18, x + 16, y + 22, x + 20, y + 18))
+   for lines, name in ((native, nativeName), (paths, pathName)):
+      lines.append("</svg>\n")
+      with open(name, "w") as fid:
+         fid.write("".join(lines))
+
+
+def convert(filename, smoothness):
+   stdout = sys.stdout
+   sys.stdout = open(os.devnull, "w")
+   try:
+      start = time.time()
+      sd = SvgParser(filename, smoothness=smoothness)
+      sd.recursivelyTraverseSvg()
+      elapsed = time.time() - start
+   finally:
+      sys.stdout.close()
+      sys.stdout = stdout
+   return elapsed, len(sd.rawObjects), sd.rawObjects.pointCount()
+
+
+if __name__ == "__main__":
+   count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+   smoothness = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+   directory = tempfile.mkdtemp()
+   nativeName = os.path.join(directory, "native.svg")
+   pathName = os.path.join(directory, "paths.svg")
+   writeDrawings(count, nativeName, pathName)
+
+   print "%d shapes of each kind, smoothness %f" % (count, smoothness)
+   print "%-16s %10s %10s %10s" % ("drawing", "seconds", "objects", "vertices")
+   for label, name in (("object to path", pathName), ("native shapes", nativeName)):
+      elapsed, objects, points = convert(name, smoothness)
+      print "%-16s %10.3f %10d %10d" % (label, elapsed, objects, points)
+   os.remove(nativeName)
+   os.remove(pathName)
+   os.rmdir(directory)
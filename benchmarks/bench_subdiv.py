@@ -0,0 +1,148 @@
+# Benchmark for cspsubdiv.subdiv on long subpaths.
+# Compares the original cspsubdiv.subdiv, which spliced into the middle of the subpath
+# and measured flatness with ffgeom's Point and Segment objects (both kept here, as
+# they were, for reference), with the single pass subdiv and subdivToPoints on fastgeom,
+# and with the batch flattener when NumPy is there, for subpaths of increasing length,
+# and counts the points where each of them disagrees with the original.
+# Run as: python benchmarks/bench_subdiv.py [smoothness]
+
+import os
+import sys
+import math
+import time
+import copy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import cspsubdiv
+import batchsubdiv
+from bezmisc import beziersplitatt
+
+
+class OriginalPoint:
+   """ ffgeom.Point before fastgeom: coordinates in a dict. """
+
+   def __init__(self, x, y):
+      self.coordinates = {'x': float(x), 'y': float(y)}
+
+   def __getitem__(self, key):
+      return self.coordinates[key]
+
+
+class OriginalSegment:
+   """ The parts of ffgeom.Segment before fastgeom that distanceToPoint uses. """
+
+   def __init__(self, e0, e1):
+      self.endpoints = [e0, e1]
+
+   def __getitem__(self, key):
+      return self.endpoints[key]
+
+   def delta_x(self):
+      return self[1]['x'] - self[0]['x']
+
+   def delta_y(self):
+      return self[1]['y'] - self[0]['y']
+
+   def length(self):
+      return math.sqrt((self.delta_x() ** 2) + (self.delta_y() ** 2))
+
+   def distanceToPoint(self, p):
+      s2 = OriginalSegment(self[0], p)
+      c1 = originalDot(s2, self)
+      if c1 <= 0:
+         return OriginalSegment(p, self[0]).length()
+      c2 = originalDot(self, self)
+      if c2 <= c1:
+         return OriginalSegment(p, self[1]).length()
+      return self.perpDistanceToPoint(p)
+
+   def perpDistanceToPoint(self, p):
+      len = self.length()
+      if len == 0:
+         return float("nan")
+      return math.fabs(((self[1]['x'] - self[0]['x']) * (self[0]['y'] - p['y'])) -
+                       ((self[0]['x'] - p['x']) * (self[1]['y'] - self[0]['y']))) / len
+
+
+def originalDot(s1, s2):
+   return s1.delta_x() * s2.delta_x() + s1.delta_y() * s2.delta_y()
+
+
+def originalMaxdist(((p0x, p0y), (p1x, p1y), (p2x, p2y), (p3x, p3y))):
+   """ cspsubdiv.maxdist before fastgeom. """
+   p0 = OriginalPoint(p0x, p0y)
+   p1 = OriginalPoint(p1x, p1y)
+   p2 = OriginalPoint(p2x, p2y)
+   p3 = OriginalPoint(p3x, p3y)
+   s1 = OriginalSegment(p0, p3)
+   return max(s1.distanceToPoint(p1), s1.distanceToPoint(p2))
+
+
+def originalSubdiv(sp, flat, i=1):
+   """ The original cspsubdiv.subdiv, which inserts into the middle of sp. """
+   while i < len(sp):
+      p0 = sp[i-1][1]
+      p1 = sp[i-1][2]
+      p2 = sp[i][0]
+      p3 = sp[i][1]
+
+      b = (p0, p1, p2, p3)
+      m = originalMaxdist(b)
+      if m <= flat:
+         i += 1
+      else:
+         one, two = beziersplitatt(b, 0.5)
+         sp[i-1][2] = one[1]
+         sp[i][0] = two[2]
+         p = [one[2], one[3], two[1]]
+         sp[i:1] = [p]
+
+
+def makeWavySubpath(segments):
+   """ Returns a cubic super path subpath of the given number of segments, each one a wiggle. """
+   sp = []
+   for i in range(segments + 1):
+      x = float(i)
+      y = math.sin(i * 0.7)
+      sp.append([[x - 0.4, y - 0.8], [x, y], [x + 0.4, y + 0.8]])
+   return sp
+
+
+def timeIt(func, sp, flat):
+   sp = copy.deepcopy(sp)
+   start = time.time()
+   result = func(sp, flat)
+   return time.time() - start, result if result is not None else sp
+
+
+def differences(a, b):
+   """ How many points of a and b differ, or the difference in length if they aren't as long. """
+   if len(a) != len(b):
+      return abs(len(a) - len(b))
+   return sum(1 for p, q in zip(a, b) if p != q)
+
+
+if __name__ == "__main__":
+   flat = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+   print "Smoothness: %f" % flat
+   print "Times are microseconds per output point, so flat columns mean linear scaling."
+   print "%10s %10s %12s %12s %12s %12s %8s" % ("segments", "points", "original", "subdiv", "toPoints", "batch", "differ")
+   for segments in [2500, 10000, 20000, 40000, 80000]:
+      sp = makeWavySubpath(segments)
+      tOriginal, original = timeIt(originalSubdiv, sp, flat)
+      tSubdiv, subdivided = timeIt(cspsubdiv.subdiv, sp, flat)
+      points = []
+      tPoints, _ = timeIt(lambda s, f: cspsubdiv.subdivToPoints(s, f, points), sp, flat)
+      assert [tuple(c[1]) for c in subdivided] == points
+      # The squared flatness test of fastgeom can round the other way from the original one
+      originalPoints = [tuple(c[1]) for c in original]
+      differ = differences(originalPoints, points)
+      batch = "-"
+      if batchsubdiv.available():
+         tBatch, rings = timeIt(lambda s, f: batchsubdiv.flattenSubpaths([s], f), sp, flat)
+         differ += differences(originalPoints, rings[0])
+         batch = "%12.2f" % (tBatch * 1e6 / len(points))
+      perPoint = 1e6 / len(points)
+      print "%10d %10d %12.2f %12.2f %12.2f %12s %8d" % (segments, len(points), tOriginal * perPoint, tSubdiv * perPoint,
+                                                          tPoints * perPoint, batch, differ)
@@ -0,0 +1,298 @@
+# Benchmark suite for the whole conversion, with per-stage timings.
+# Runs a set of cases, synthetic drawings made by generateSvg plus the test drawings
+# in the repository, through the same steps as svg2kicadmod.convertSvg and times each
+# stage on its own:
+#    parse      loading the XML, and parsing path data and shapes into commands and beziers
+#    transform  composing and applying transform matrices
+#    flatten    subdividing curves and sampling arcs into points
+#    write      centering, scaling and writing the .kicad_mod file (the store applies
+#               the centering and scaling as the points are read, so they land here)
+#    other      the rest of the traversal: styles, clones, hole bridging, bookkeeping
+# A stage's time never includes the stages called from inside it. The times come from
+# the stages SvgParser reports to a ConversionProfile, see STAGE_PARTS.
+# Results can be saved as JSON, and compared against a saved baseline, failing (exit
+# status 1) when a stage is slower than the baseline by more than its threshold.
+# Run as: python benchmarks/bench_suite.py [--save FILE] [--baseline FILE] [--thresholds FILE] ...
+#         see --help for the rest, including the generator settings of a custom case.
+
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import platform
+import tempfile
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY = os.path.join(BENCHMARKS, "..")
+sys.path.insert(0, REPOSITORY)
+
+from SvgParser import SvgParser
+from KicadPcbnewModuleWriter import writeRawObjectsToKicadPcbnewModuleFile
+import svg2kicadmod
+from instrumentation import ConversionProfile
+
+
+STAGES = ["parse", "transform", "flatten", "write", "other"]
+
+RESULTS_VERSION = 1
+
+
+# The ConversionProfile stages each of STAGES is made of
+STAGE_PARTS = {"parse": ["load", "path parse"],
+               "transform": ["transform"],
+               "flatten": ["subdivide"],
+               "write": ["align/scale", "write"],
+               "other": ["traverse"]}
+
+
+def generateSvg(filename, paths=200, segments=20, mix=None, depth=3, transformDensity=0.5, seed=1):
+   """ Writes a synthetic drawing of paths closed paths with segments segments each, split
+       evenly among groups nested depth deep. mix maps the segment kinds "line", "quad",
+       "cubic" and "arc" to their relative weights. transformDensity is the share of groups
+       and paths that get a transform attribute. Half the paths are filled. """
+   mix = mix or {"line": 1, "quad": 1, "cubic": 1, "arc": 1}
+   kinds = sorted(mix)
+   weights = [mix[kind] for kind in kinds]
+   random.seed(seed)
+
+   def choose():
+      value = random.uniform(0, sum(weights))
+      for kind, weight in zip(kinds, weights):
+         value -= weight
+         if value <= 0:
+            return kind
+      return kinds[-1]
+
+   def transform():
+      if random.random() >= transformDensity:
+         return ""
+      choice = random.randint(0, 3)
+      if choice == 0:
+         return ' transform="translate(%.3f,%.3f)"' % (random.uniform(-5, 5), random.uniform(-5, 5))
+      if choice == 1:
+         return ' transform="rotate(%.3f %.3f %.3f)"' % (random.uniform(-30, 30), random.uniform(0, 100), random.uniform(0, 100))
+      if choice == 2:
+         return ' transform="scale(%.3f)"' % random.uniform(0.8, 1.2)
+      return ' transform="matrix(%.4f,%.4f,%.4f,%.4f,%.3f,%.3f)"' % (1, random.uniform(-0.1, 0.1), random.uniform(-0.1, 0.1), 1,
+                                                                   random.uniform(-5, 5), random.uniform(-5, 5))
+
+   def pathData(cx, cy):
+      # A wobbly loop around (cx, cy), one segment per step
+      radius = random.uniform(5, 20)
+      point = lambda angle, r: (cx + r * math.cos(angle), cy + r * math.sin(angle))
+      parts = ["M %.3f,%.3f" % point(0.0, radius)]
+      step = 2 * math.pi / segments
+      for i in range(segments):
+         a0 = i * step
+         a1 = (i + 1) * step
+         r = radius * random.uniform(0.8, 1.2) if i < segments - 1 else radius
+         end = point(a1, r)
+         kind = choose()
+         if kind == "line":
+            parts.append("L %.3f,%.3f" % end)
+         elif kind == "quad":
+            parts.append("Q %.3f,%.3f %.3f,%.3f" % (point((a0 + a1) / 2, r * 1.3) + end))
+         elif kind == "cubic":
+            parts.append("C %.3f,%.3f %.3f,%.3f %.3f,%.3f" % (point(a0 + step / 3, r * 1.3) + point(a1 - step / 3, r * 0.7) + end))
+         else:
+            parts.append("A %.3f,%.3f 0 0 1 %.3f,%.3f" % ((r * 0.6, r * 0.6) + end))
+      parts.append("Z")
+      return " ".join(parts)
+
+   groups = max(1, 2 ** depth - 1)
+   perGroup = [paths // groups + (1 if i < paths % groups else 0) for i in range(groups)]
+   lines = ['<?xml version="1.0"?>\n',
+            '<svg xmlns="http://www.w3.org/2000/svg" xmlns:svg="http://www.w3.org/2000/svg" width="1000" height="1000">\n']
+   counter = [0]
+
+   def group(level):
+      # A binary tree of groups, each holding its share of the paths
+      index = counter[0]
+      counter[0] += 1
+      lines.append("<g%s>\n" % transform())
+      for i in range(perGroup[index]):
+         style = "fill:#000000" if random.random() < 0.5 else "fill:none;stroke:#000000"
+         lines.append('<path style="%s" d="%s"%s/>\n' % (style, pathData(random.uniform(0, 1000), random.uniform(0, 1000)), transform()))
+      if level < depth:
+         group(level + 1)
+         group(level + 1)
+      lines.append("</g>\n")
+
+   if depth > 0:
+      group(1)
+   lines.append("</svg>\n")
+   with open(filename, "w") as fid:
+      fid.write("".join(lines))
+
+
+# Synthetic cases: name -> generateSvg arguments
+SYNTHETIC_CASES = [("lines", {"paths": 400, "segments": 40, "mix": {"line": 1}, "depth": 2, "transformDensity": 0.2}),
+                   ("cubics", {"paths": 200, "segments": 20, "mix": {"cubic": 1}, "depth": 2, "transformDensity": 0.2}),
+                   ("quads", {"paths": 200, "segments": 20, "mix": {"quad": 1}, "depth": 2, "transformDensity": 0.2}),
+                   ("arcs", {"paths": 200, "segments": 20, "mix": {"arc": 1}, "depth": 2, "transformDensity": 0.2}),
+                   ("mixed-nested", {"paths": 300, "segments": 20, "depth": 6, "transformDensity": 0.8})]
+
+# The drawings in the repository, converted at this width in mm
+FILE_CASES = ["test.svg", "test_2.svg", "test_hard.svg"]
+FILE_WIDTH = 20.0
+
+
+def convertCase(filename, width_mm, smoothness, flattener):
+   """ Converts filename like svg2kicadmod.convertSvg does, without printing anything.
+       Returns (seconds per stage, objects written, vertices written). """
+   profile = ConversionProfile()
+   output = tempfile.NamedTemporaryFile(suffix=".kicad_mod", delete=False)
+   output.close()
+   stdout = sys.stdout
+   sys.stdout = open(os.devnull, "w")
+   try:
+      with profile.stage("load"):
+         sd = SvgParser(filename, smoothness=smoothness, flattener=flattener, stats=profile)
+
+      with profile.stage("traverse"):
+         sd.recursivelyTraverseSvg()
+
+      with profile.stage("write"):
+         sd.alignObjects(horizAlign=SvgParser.ALIGN_CENTER, vertAlign=SvgParser.ALIGN_CENTER)
+         scale = svg2kicadmod.computeScale(sd.findMinCenterMaxOfObjects(sd.rawObjects), width_mm, 0.0)
+         if scale != 1.0:
+            sd.scaleRawObjects(scale)
+         writeRawObjectsToKicadPcbnewModuleFile(output.name, sd.rawObjects, layer="F.SilkS")
+   finally:
+      sys.stdout.close()
+      sys.stdout = stdout
+      os.remove(output.name)
+   wall = profile.clock.wall
+   stages = dict((stage, sum(wall[part] for part in STAGE_PARTS[stage])) for stage in STAGES)
+   return stages, len(sd.rawObjects), sd.rawObjects.pointCount()
+
+
+def runCase(filename, width_mm, smoothness, flattener, repeats):
+   """ Converts filename repeats times, keeping the fastest time of each stage. """
+   best = None
+   for i in range(repeats):
+      stages, objects, vertices = convertCase(filename, width_mm, smoothness, flattener)
+      if best is None:
+         best = stages
+      else:
+         best = dict((stage, min(best[stage], stages[stage])) for stage in STAGES)
+   best["total"] = sum(best[stage] for stage in STAGES)
+   return {"stages": best, "objects": objects, "vertices": vertices}
+
+
+def parseMix(text):
+   """ Parses a segment mix like "line:1,cubic:2". """
+   mix = {}
+   for item in text.split(","):
+      kind, colon, weight = item.partition(":")
+      kind = kind.strip()
+      if kind not in ("line", "quad", "cubic", "arc"):
+         raise argparse.ArgumentTypeError("Unknown segment kind '%s'" % kind)
+      mix[kind] = float(weight) if colon else 1.0
+   return mix
+
+
+def compareResults(results, baseline, thresholds):
+   """ Compares each stage time of results with baseline. thresholds has "default", the
+       slowdown ratio allowed for any stage, "stages", ratios for particular stages, and
+       "minimumSeconds", a slowdown smaller than which is never counted, however large the
+       ratio, since such short times are mostly noise.
+       Returns a list of (case, stage, baseline seconds, seconds) for every regression. """
+   regressions = []
+   for case, result in sorted(results["cases"].items()):
+      before = baseline["cases"].get(case)
+      if before is None:
+         continue
+      for stage in STAGES + ["total"]:
+         old = before["stages"].get(stage)
+         new = result["stages"].get(stage)
+         if old is None or new is None:
+            continue
+         ratio = thresholds.get("stages", {}).get(stage, thresholds.get("default", 1.25))
+         if new - old > thresholds.get("minimumSeconds", 0.01) and new > old * ratio:
+            regressions.append( (case, stage, old, new) )
+   return regressions
+
+
+def printResults(results):
+   print "%-16s %8s %9s" % ("case", "objects", "vertices") + "".join(" %9s" % stage for stage in STAGES + ["total"])
+   for case, result in sorted(results["cases"].items()):
+      print "%-16s %8d %9d" % (case, result["objects"], result["vertices"]) + \
+            "".join(" %9.4f" % result["stages"][stage] for stage in STAGES + ["total"])
+
+
+def parseArguments(argv):
+   parser = argparse.ArgumentParser(description="Times each conversion stage on synthetic and sample drawings.")
+   parser.add_argument("--repeats", type=int, default=3, help="Runs per case, the fastest counts (default: %(default)s)")
+   parser.add_argument("--smoothness", type=float, default=0.1, help="Flattening smoothness (default: %(default)s)")
+   parser.add_argument("--flattener", choices=SvgParser.flatteners, default=SvgParser.FLATTEN_CSPSUBDIV,
+                       help="Bezier flattening backend (default: %(default)s)")
+   parser.add_argument("--cases", help="Comma separated names of the cases to run (default: all)")
+   parser.add_argument("--save", metavar="FILE", help="Write the results to FILE as JSON")
+   parser.add_argument("--baseline", metavar="FILE", help="Compare with results saved earlier, failing on regressions")
+   parser.add_argument("--thresholds", metavar="FILE", default=os.path.join(BENCHMARKS, "thresholds.json"),
+                       help="JSON file of allowed slowdowns (default: %(default)s)")
+   custom = parser.add_argument_group("custom case", "Adds a synthetic case named 'custom' made with these settings")
+   custom.add_argument("--paths", type=int, help="Number of paths")
+   custom.add_argument("--segments", type=int, default=20, help="Segments per path (default: %(default)s)")
+   custom.add_argument("--mix", type=parseMix, default=None,
+                       help='Relative weights of the segment kinds, like "line:1,quad:1,cubic:2,arc:1" (default: even)')
+   custom.add_argument("--depth", type=int, default=3, help="Group nesting depth (default: %(default)s)")
+   custom.add_argument("--transform-density", type=float, default=0.5,
+                       help="Share of groups and paths with a transform (default: %(default)s)")
+   return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+   args = parseArguments(sys.argv[1:])
+
+   cases = [(name, options) for name, options in SYNTHETIC_CASES]
+   if args.paths:
+      cases.append( ("custom", {"paths": args.paths, "segments": args.segments, "mix": args.mix, "depth": args.depth,
+                                "transformDensity": args.transform_density}) )
+   cases.extend( (name, None) for name in FILE_CASES )
+   if args.cases:
+      wanted = args.cases.split(",")
+      cases = [(name, options) for name, options in cases if name in wanted]
+
+   results = {"version": RESULTS_VERSION, "python": platform.python_version(), "platform": platform.platform(),
+              "smoothness": args.smoothness, "flattener": args.flattener, "repeats": args.repeats, "cases": {}}
+   directory = tempfile.mkdtemp()
+   try:
+      for name, options in cases:
+         if options is None:
+            filename = os.path.join(REPOSITORY, name)
+            width = FILE_WIDTH
+         else:
+            filename = os.path.join(directory, name + ".svg")
+            generateSvg(filename, **options)
+            width = 0.0
+         result = runCase(filename, width, args.smoothness, args.flattener, args.repeats)
+         if options is not None:
+            result["generator"] = options
+            os.remove(filename)
+         results["cases"][name] = result
+   finally:
+      os.rmdir(directory)
+
+   printResults(results)
+   if args.save:
+      with open(args.save, "w") as fid:
+         json.dump(results, fid, indent=1, sort_keys=True)
+      print "Saved results to %s" % args.save
+
+   if args.baseline:
+      with open(args.baseline) as fid:
+         baseline = json.load(fid)
+      thresholds = {}
+      if args.thresholds and os.path.exists(args.thresholds):
+         with open(args.thresholds) as fid:
+            thresholds = json.load(fid)
+      regressions = compareResults(results, baseline, thresholds)
+      for case, stage, old, new in regressions:
+         print "REGRESSION %s %s: %.4f s, was %.4f s (%.2fx)" % (case, stage, new, old, new / max(old, 1e-9))
+      if regressions:
+         sys.exit(1)
+      print "No regressions against %s" % args.baseline
@@ -0,0 +1,166 @@
+# Benchmark for transform attribute handling during traversal.
+# Generates a deeply nested drawing where most groups and paths carry a transform,
+# some of them identity ones, and converts it with the original uncached, recursive
+# parseTransform (kept here for reference) composed at every node, and with the
+# cached parser that skips missing and identity transforms.
+# Run as: python benchmarks/bench_transforms.py [chains] [depth] [paths per group]
+
+import os
+import re
+import sys
+import math
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import simpletransform
+from simpletransform import composeTransform
+from SvgParser import SvgParser
+from lxml import etree
+
+
+header = """<?xml version="1.0"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:svg="http://www.w3.org/2000/svg" width="1000" height="1000">
+"""
+
+
+def originalParseTransform(transf, mat=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]):
+   """ The original simpletransform.parseTransform. """
+   if transf == "" or transf == None:
+      return mat
+   stransf = transf.strip()
+   result = re.match("(translate|scale|rotate|skewX|skewY|matrix)\s*\(([^)]*)\)\s*,?", stransf)
+   if result.group(1) == "translate":
+      args = result.group(2).replace(',', ' ').split()
+      dx = float(args[0])
+      if len(args) == 1:
+         dy = 0.0
+      else:
+         dy = float(args[1])
+      matrix = [[1, 0, dx], [0, 1, dy]]
+   if result.group(1) == "scale":
+      args = result.group(2).replace(',', ' ').split()
+      sx = float(args[0])
+      if len(args) == 1:
+         sy = sx
+      else:
+         sy = float(args[1])
+      matrix = [[sx, 0, 0], [0, sy, 0]]
+   if result.group(1) == "rotate":
+      args = result.group(2).replace(',', ' ').split()
+      a = float(args[0]) * math.pi / 180
+      if len(args) == 1:
+         cx, cy = (0.0, 0.0)
+      else:
+         cx, cy = map(float, args[1:])
+      matrix = [[math.cos(a), -math.sin(a), cx], [math.sin(a), math.cos(a), cy]]
+      matrix = composeTransform(matrix, [[1, 0, -cx], [0, 1, -cy]])
+   if result.group(1) == "skewX":
+      a = float(result.group(2)) * math.pi / 180
+      matrix = [[1, math.tan(a), 0], [0, 1, 0]]
+   if result.group(1) == "skewY":
+      a = float(result.group(2)) * math.pi / 180
+      matrix = [[1, 0, 0], [math.tan(a), 1, 0]]
+   if result.group(1) == "matrix":
+      a11, a21, a12, a22, v1, v2 = result.group(2).replace(',', ' ').split()
+      matrix = [[float(a11), float(a12), float(v1)], [float(a21), float(a22), float(v2)]]
+
+   matrix = composeTransform(mat, matrix)
+   if result.end() < len(stransf):
+      return originalParseTransform(stransf[result.end():], matrix)
+   else:
+      return matrix
+
+
+def originalComposeTransformAttribute(mat, transf):
+   """ What traversal did for every node before: parse and compose, whatever the transform. """
+   return composeTransform(mat, originalParseTransform(transf))
+
+
+transforms = ["translate(1.5,2)", "rotate(3 10 10)", "scale(1.01)", "translate(0,0)", "matrix(1,0,0,1,0,0)",
+              "translate(-1,0.5) rotate(-2)", "skewX(1)", "matrix(0.99,0.02,-0.02,0.99,0.3,-0.4)", None]
+
+
+def writeDrawing(chains, depth, perGroup, filename):
+   """ Writes chains stacks of groups nested depth deep, with perGroup short paths in each group. """
+   random.seed(3)
+   lines = [header]
+
+   def attribute():
+      transform = random.choice(transforms)
+      return ' transform="%s"' % transform if transform else ""
+
+   def group(level):
+      lines.append("<g%s>\n" % attribute())
+      for i in range(perGroup):
+         x = random.uniform(0, 900)
+         y = random.uniform(0, 900)
+         lines.append('<path d="M %f,%f L %f,%f"%s/>\n' % (x, y, x + 5, y + 5, attribute()))
+      if level < depth:
+         group(level + 1)
+      lines.append("</g>\n")
+
+   for i in range(chains):
+      group(1)
+   lines.append("</svg>\n")
+   with open(filename, "w") as fid:
+      fid.write("".join(lines))
+
+
+def walk(filename, compose, repeats=5):
+   """ Times working out the matrix of every element, and nothing else. """
+   root = etree.parse(filename).getroot()
+   simpletransform.transformCache.clear()
+
+   def visit(node, mat):
+      for child in node:
+         visit(child, compose(mat, child.get("transform")))
+
+   start = time.time()
+   for i in range(repeats):
+      visit(root, simpletransform.identity)
+   return (time.time() - start) / repeats
+
+
+def convert(filename, compose):
+   original = simpletransform.composeTransformAttribute
+   simpletransform.composeTransformAttribute = compose
+   simpletransform.transformCache.clear()
+   stdout = sys.stdout
+   sys.stdout = open(os.devnull, "w")
+   try:
+      start = time.time()
+      sd = SvgParser(filename)
+      sd.recursivelyTraverseSvg()
+      elapsed = time.time() - start
+   finally:
+      sys.stdout.close()
+      sys.stdout = stdout
+      simpletransform.composeTransformAttribute = original
+   return elapsed, [list(points) for fill, points in sd.rawObjects]
+
+
+if __name__ == "__main__":
+   chains = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+   depth = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+   perGroup = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+   directory = tempfile.mkdtemp()
+   filename = os.path.join(directory, "nested.svg")
+   writeDrawing(chains, depth, perGroup, filename)
+
+   walkBefore = walk(filename, originalComposeTransformAttribute)
+   walkAfter = walk(filename, simpletransform.composeTransformAttribute)
+   before, expected = convert(filename, originalComposeTransformAttribute)
+   after, result = convert(filename, simpletransform.composeTransformAttribute)
+   os.remove(filename)
+   os.rmdir(directory)
+
+   same = len(result) == len(expected) and all(
+      max(abs(a - b) for p, q in zip(r, e) for a, b in zip(p, q)) < 1e-9 for r, e in zip(result, expected))
+   print "%d chains of %d nested groups, %d paths per group, %d paths" % (chains, depth, perGroup, len(result))
+   print "%-24s %14s %14s" % ("transforms", "matrices (s)", "conversion (s)")
+   print "%-24s %14.3f %14.3f" % ("parsed at every node", walkBefore, before)
+   print "%-24s %14.3f %14.3f" % ("cached, identity skipped", walkAfter, after)
+   print "Speedup: %.2fx on matrices, %.2fx overall, same result: %s" % (walkBefore / walkAfter, before / after, same)
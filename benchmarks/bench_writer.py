@@ -0,0 +1,77 @@
+# Throughput benchmark for KicadPcbnewModuleWriter.
+# Writes a million points, as one huge polygon and as many small ones, with the
+# original string concatenating makeKicadPolygon (kept here for reference) and
+# with the chunked writer, and checks that both produce the same file.
+# Run as: python benchmarks/bench_writer.py [points]
+
+import os
+import sys
+import math
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import KicadPcbnewModuleWriter
+from KicadPcbnewModuleWriter import writeRawObjectsToKicadPcbnewModuleFile, kicadPcbHeaderTemplate
+
+
+def concatenatingPolygon(points, fill, layer, lineWidth):
+   """ The original makeKicadPolygon. """
+   pointList = ""
+   for ii in range(len(points)):
+      x, y = points[ii]
+      pointList += "(xy %f %f) " % (x, y)
+      if ii % 10 == 0:
+         pointList += "\n                "
+   pointList += "\n"
+
+   return "  (fp_poly (pts %s) (layer %s) (width %f))\n" % (pointList, layer, lineWidth)
+
+
+def concatenatingWriter(filename, rawObjects, name="ConvertedSvgModule", layer="F.SilkS", lineWidth=0.01):
+   with open(filename, "w") as fid:
+      fid.write(kicadPcbHeaderTemplate.format(name=name))
+      for fill, points in rawObjects:
+         fid.write(concatenatingPolygon(points, fill, layer, lineWidth))
+      fid.write("\n)\n")
+
+
+def makePolygons(totalPoints, pointsPerPolygon):
+   polygons = []
+   for start in range(0, totalPoints, pointsPerPolygon):
+      n = min(pointsPerPolygon, totalPoints - start)
+      polygons.append( (True, [(math.cos(i * 0.001) * 25.0, math.sin(i * 0.0013) * 25.0) for i in range(start, start + n)]) )
+   return polygons
+
+
+def timeWriter(writer, filename, polygons):
+   start = time.time()
+   writer(filename, polygons)
+   return time.time() - start
+
+
+if __name__ == "__main__":
+   totalPoints = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+   # Sanity check the formatting on awkward sizes first
+   for n in [0, 1, 2, 10, 11, 12, 21, 22, 101]:
+      points = [(i * 1.5, -i * 0.25) for i in range(n)]
+      assert KicadPcbnewModuleWriter.makeKicadPolygon(points, True, "F.SilkS", 0.01) == concatenatingPolygon(points, True, "F.SilkS", 0.01)
+
+   directory = tempfile.mkdtemp()
+   old = os.path.join(directory, "concatenating.kicad_mod")
+   new = os.path.join(directory, "chunked.kicad_mod")
+   print "%d points per run" % totalPoints
+   print "%14s %14s %14s %14s" % ("points/polygon", "concatenating", "chunked", "MB/s chunked")
+   for pointsPerPolygon in [totalPoints, 100000, 1000, 50]:
+      polygons = makePolygons(totalPoints, pointsPerPolygon)
+      tOld = timeWriter(concatenatingWriter, old, polygons)
+      tNew = timeWriter(writeRawObjectsToKicadPcbnewModuleFile, new, polygons)
+      with open(old) as a, open(new) as b:
+         assert a.read() == b.read()
+      megabytes = os.path.getsize(new) / 1e6
+      print "%14d %13.2fs %13.2fs %14.1f" % (pointsPerPolygon, tOld, tNew, megabytes / tNew)
+      os.remove(old)
+      os.remove(new)
+   os.rmdir(directory)
@@ -243,7 +243,7 @@ def beziertatlength(((bx0,by0),(bx1,by1),(bx2,by2),(bx3,by3)), l = 0.5, toleranc
 bezierlength = bezierlengthSimpson
 
 if __name__ == '__main__':
-    import timing
+    import time
     #print linebezierintersect(((,),(,)),((,),(,),(,),(,)))
     #print linebezierintersect(((0,1),(0,-1)),((-1,0),(-.5,0),(.5,0),(1,0)))
     tol = 0.00000001
@@ -252,21 +252,17 @@ if __name__ == '__main__':
             ((0,0),(0,0),(5,1),(10,0)),
             ((-10,0),(0,0),(10,0),(10,10)),
             ((15,10),(0,0),(10,0),(-5,10))]
-    '''
     for curve in curves:
-        timing.start()
+        start = time.time()
         g = bezierlengthGravesen(curve,tol)
-        timing.finish()
-        gt = timing.micro()
+        gt = (time.time() - start) * 1e6
 
-        timing.start()
+        start = time.time()
         s = bezierlengthSimpson(curve,tol)
-        timing.finish()
-        st = timing.micro()
+        st = (time.time() - start) * 1e6
 
         print g, gt
         print s, st
-    '''
     for curve in curves:
         print beziertatlength(curve,0.5)
 
@@ -0,0 +1,162 @@
+# On-disk cache of finished .kicad_mod files, keyed by a hash of the SVG file
+# contents and every option that changes the output, so unchanged artwork is
+# never parsed or flattened again. Least recently used entries are evicted once
+# the cache grows past its size limit.
+# Run as a script to see the cache stats or to purge it.
+# TODO comments, license
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+
+ENTRY_SUFFIX = ".kicad_mod"
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def defaultCacheDirectory():
+   base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+   return os.path.join(base, "svg2kicadmod")
+
+
+class ConversionCache:
+   """ A directory of <key>.kicad_mod files. An entry's modification time is bumped
+       on every hit, which makes it the access time used for LRU eviction. """
+
+   def __init__(self, directory=None, maxBytes=DEFAULT_MAX_BYTES):
+      self.directory = directory or defaultCacheDirectory()
+      self.maxBytes = maxBytes
+      self.hits = 0
+      self.misses = 0
+
+   def makeKey(self, svgBytes, options, version):
+      """ Hashes the SVG file contents together with the conversion options (a dict of
+          JSON serializable values) and the tool version. """
+      digest = hashlib.sha256()
+      digest.update(json.dumps([version, sorted(options.items())]))
+      digest.update("\0")
+      digest.update(svgBytes)
+      return digest.hexdigest()
+
+   def entryPath(self, key):
+      return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+   def fetch(self, key, output):
+      """ Copies the cached output for key to the file output. Returns False on a miss. """
+      path = self.entryPath(key)
+      try:
+         shutil.copyfile(path, output)
+      except IOError:
+         self.misses += 1
+         return False
+      try:
+         os.utime(path, None)
+      except OSError:
+         pass # evicted by someone else in the meantime, the copy is still good
+      self.hits += 1
+      return True
+
+   def store(self, key, output):
+      """ Adds the finished file output to the cache under key, then evicts old entries if needed. """
+      if not os.path.isdir(self.directory):
+         try:
+            os.makedirs(self.directory)
+         except OSError:
+            if not os.path.isdir(self.directory):
+               raise
+      # Copy to a temporary name first so other processes never see a partial entry
+      fd, temporary = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+      os.close(fd)
+      shutil.copyfile(output, temporary)
+      os.rename(temporary, self.entryPath(key))
+      self.evict()
+
+   def entries(self):
+      """ Returns a list of (access time, size, path) for every entry, oldest first. """
+      result = []
+      if not os.path.isdir(self.directory):
+         return result
+      for name in os.listdir(self.directory):
+         if not name.endswith(ENTRY_SUFFIX):
+            continue
+         path = os.path.join(self.directory, name)
+         try:
+            st = os.stat(path)
+         except OSError:
+            continue
+         result.append( (st.st_mtime, st.st_size, path) )
+      result.sort()
+      return result
+
+   def evict(self):
+      """ Removes least recently used entries until the cache fits in maxBytes. Returns how many were removed. """
+      entries = self.entries()
+      total = sum(size for atime, size, path in entries)
+      removed = 0
+      for atime, size, path in entries:
+         if total <= self.maxBytes:
+            break
+         try:
+            os.remove(path)
+         except OSError:
+            continue
+         total -= size
+         removed += 1
+      return removed
+
+   def purge(self):
+      """ Removes every entry. Returns how many were removed. """
+      removed = 0
+      for atime, size, path in self.entries():
+         try:
+            os.remove(path)
+            removed += 1
+         except OSError:
+            pass
+      return removed
+
+   def stats(self):
+      """ Returns a dict describing the cache contents, plus this process's hits and misses. """
+      entries = self.entries()
+      return {"directory": self.directory,
+              "entries": len(entries),
+              "bytes": sum(size for atime, size, path in entries),
+              "maxBytes": self.maxBytes,
+              "oldest": entries[0][0] if entries else None,
+              "newest": entries[-1][0] if entries else None,
+              "hits": self.hits,
+              "misses": self.misses}
+
+
+def parseArguments(argv):
+   parser = argparse.ArgumentParser(description="Inspect or purge the svg2kicadmod conversion cache.")
+   parser.add_argument("command", choices=["stats", "purge"])
+   parser.add_argument("--cache-dir", default=None, help="Cache directory (default: %s)" % defaultCacheDirectory())
+   parser.add_argument("--cache-size", type=float, default=DEFAULT_MAX_BYTES / 1e6,
+                       help="Size limit in MB to report against (default: %(default)s)")
+   parser.add_argument("--json", action="store_true", help="Print stats as JSON")
+   return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+   args = parseArguments(sys.argv[1:])
+   cache = ConversionCache(args.cache_dir, int(args.cache_size * 1e6))
+
+   if args.command == "purge":
+      print "Removed %d entries from %s" % (cache.purge(), cache.directory)
+   elif args.json:
+      print json.dumps(cache.stats(), indent=2, sort_keys=True)
+   else:
+      stats = cache.stats()
+      print "Cache directory: %s" % stats["directory"]
+      print "Entries: %d" % stats["entries"]
+      print "Size: %.2f MB of %.2f MB" % (stats["bytes"] / 1e6, stats["maxBytes"] / 1e6)
+      if stats["entries"]:
+         print "Least recently used: %s" % time.ctime(stats["oldest"])
+         print "Most recently used: %s" % time.ctime(stats["newest"])
@@ -1,37 +1,139 @@
 #!/usr/bin/env python
 from bezmisc import *
 from ffgeom import *
+from fastgeom import bezierMaxDistanceSquared, bezierSplitHalf
 
 def maxdist(((p0x,p0y),(p1x,p1y),(p2x,p2y),(p3x,p3y))):
-    p0 = Point(p0x,p0y)
-    p1 = Point(p1x,p1y)
-    p2 = Point(p2x,p2y)
-    p3 = Point(p3x,p3y)
-
-    s1 = Segment(p0,p3)
-    return max(s1.distanceToPoint(p1),s1.distanceToPoint(p2))
+    return math.sqrt(bezierMaxDistanceSquared(p0x,p0y,p1x,p1y,p2x,p2y,p3x,p3y))
     
 
 def cspsubdiv(csp,flat):
     for sp in csp:
         subdiv(sp,flat)
 
-def subdiv(sp,flat,i=1):
-    while i < len(sp):
-        p0 = sp[i-1][1]
-        p1 = sp[i-1][2]
-        p2 = sp[i][0]
-        p3 = sp[i][1]
-        
-        b = (p0,p1,p2,p3)
-        m = maxdist(b)
-        if m <= flat:
-            i += 1
+def flattenSegment(p0,p1,p2,p3,flat2):
+    """
+    Split the cubic bezier p0,p1,p2,p3 until every piece has its control
+    points within sqrt(flat2) of its chord.
+    Returns the pieces in order, each a flat tuple of 8 coordinates.
+    """
+    leaves = []
+    stack = [(p0[0],p0[1],p1[0],p1[1],p2[0],p2[1],p3[0],p3[1])]
+    while stack:
+        b = stack.pop()
+        if bezierMaxDistanceSquared(*b) <= flat2:
+            leaves.append(b)
         else:
-            one, two = beziersplitatt(b,0.5)
-            sp[i-1][2] = one[1]
-            sp[i][0] = two[2]
-            p = [one[2],one[3],two[1]]
-            sp[i:1] = [p]
+            one, two = bezierSplitHalf(*b)
+            stack.append(two)
+            stack.append(one)
+    return leaves
+
+def subdiv(sp,flat,i=1):
+    """
+    Subdivide the subpath sp in place until every segment from superpoint
+    i-1 onwards is within flat of its chord.
+    Builds the new superpoint list in a single forward pass, each segment
+    being split with its own work stack, then swaps it into sp.
+    """
+    if i >= len(sp):
+        return
+    flat2 = flat*flat
+    result = sp[:i]
+    for j in range(i, len(sp)):
+        prev = result[-1]
+        cur = sp[j]
+        leaves = flattenSegment(prev[1],prev[2],cur[0],cur[1],flat2)
+        if len(leaves) > 1:
+            prev[2] = [leaves[0][2],leaves[0][3]]
+            for k in range(1, len(leaves)):
+                a = leaves[k-1]
+                b = leaves[k]
+                result.append([[a[4],a[5]],[a[6],a[7]],[b[2],b[3]]])
+            cur[0] = [leaves[-1][4],leaves[-1][5]]
+        result.append(cur)
+    sp[:] = result
+
+def subdivToPoints(sp,flat,out):
+    """
+    Flatten the subpath sp without modifying it, appending the (x, y)
+    on-curve points that subdiv would leave in sp to the list out.
+    Returns the number of flatness tests made. A cubic that isn't flat
+    is tested once here and again by flattenSegment, which then tests
+    every piece it splits off, so it costs 2 * pieces tests in all.
+    """
+    if not sp:
+        return 0
+    flat2 = flat*flat
+    tests = 0
+    out.append((sp[0][1][0],sp[0][1][1]))
+    for j in range(1, len(sp)):
+        p0 = sp[j-1][1]
+        p1 = sp[j-1][2]
+        p2 = sp[j][0]
+        p3 = sp[j][1]
+        tests += 1
+        if bezierMaxDistanceSquared(p0[0],p0[1],p1[0],p1[1],p2[0],p2[1],p3[0],p3[1]) <= flat2:
+            out.append((p3[0],p3[1]))
+            continue
+        leaves = flattenSegment(p0,p1,p2,p3,flat2)
+        tests += 2*len(leaves) - 1
+        for b in leaves:
+            out.append((b[6],b[7]))
+    return tests
+
+def extremeTimes(a0,a1,a2,a3):
+    """
+    The parameters strictly between 0 and 1 where one coordinate of the
+    cubic bezier with that coordinate a0,a1,a2,a3 turns.
+    """
+    c = 3*(a1-a0)
+    b = 3*(a2-a1)-c
+    a = a3-a0-c-b
+    # Roots of d/dt (a t^3 + b t^2 + c t) = A t^2 + B t + c, by the stable
+    # form of the quadratic formula: a cubic made from a quadratic bezier
+    # has an A of next to nothing, where bezmisc.rootWrapper loses most of
+    # its digits
+    A = 3*a
+    B = 2*b
+    if A == 0:
+        roots = [-c/B] if B else []
+    else:
+        disc = B*B-4*A*c
+        if disc < 0:
+            return []
+        q = -0.5*(B+math.copysign(math.sqrt(disc),B))
+        roots = [q/A, c/q] if q else []
+    return [t for t in roots if 0 < t < 1]
+
+def extremesToPoints(sp,out):
+    """
+    Append to the list out the on-curve points of the subpath sp, and the
+    points where a cubic goes further in x or y than all of them, so they
+    have the same bounds as the curve itself. Nothing is subdivided: the
+    extremes are where the derivative of a coordinate is zero.
+    """
+    if not sp:
+        return
+    xs = [p[1][0] for p in sp]
+    ys = [p[1][1] for p in sp]
+    lo = (min(xs),min(ys))
+    hi = (max(xs),max(ys))
+    out.append((sp[0][1][0],sp[0][1][1]))
+    for j in range(1, len(sp)):
+        p0 = sp[j-1][1]
+        p1 = sp[j-1][2]
+        p2 = sp[j][0]
+        p3 = sp[j][1]
+        ts = []
+        for k in (0,1):
+            if lo[k] <= p1[k] <= hi[k] and lo[k] <= p2[k] <= hi[k]:
+                # The cubic stays inside the hull of its control points, so
+                # along this axis it can't go past the on-curve points
+                continue
+            ts.extend(extremeTimes(p0[k],p1[k],p2[k],p3[k]))
+        for t in sorted(ts):
+            out.append(bezierpointatt((p0,p1,p2,p3),t))
+        out.append((p3[0],p3[1]))
 
 # vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,68 @@
+# Compact geometry kernel for the innermost loops of the flattening code.
+# Everything works on plain floats and tuples, compares squared distances and
+# never builds intermediate Point or Segment objects.
+# ffgeom.Point and ffgeom.Segment are thin wrappers around these functions.
+# TODO comments, license
+
+
+def distanceSquared(x0, y0, x1, y1):
+   """ Squared distance between (x0, y0) and (x1, y1). """
+   dx = x1 - x0
+   dy = y1 - y0
+   return dx * dx + dy * dy
+
+
+def segmentDistanceSquared(px, py, x0, y0, x1, y1):
+   """ Squared distance from point (px, py) to the segment (x0, y0)-(x1, y1).
+       Same cases as ffgeom.Segment.distanceToPoint: the nearest endpoint when the
+       point projects outside the segment, the perpendicular distance otherwise. """
+   dx = x1 - x0
+   dy = y1 - y0
+   c1 = (px - x0) * dx + (py - y0) * dy
+   if c1 <= 0:
+      return (x0 - px) * (x0 - px) + (y0 - py) * (y0 - py)
+   c2 = dx * dx + dy * dy
+   if c2 <= c1:
+      return (x1 - px) * (x1 - px) + (y1 - py) * (y1 - py)
+   cross = dx * (y0 - py) - (x0 - px) * dy
+   return cross * cross / c2
+
+
+def segmentPerpDistanceSquared(px, py, x0, y0, x1, y1):
+   """ Squared distance from point (px, py) to the infinite line through (x0, y0)-(x1, y1).
+       Returns None for a zero length segment. """
+   dx = x1 - x0
+   dy = y1 - y0
+   c2 = dx * dx + dy * dy
+   if c2 == 0:
+      return None
+   cross = dx * (y0 - py) - (x0 - px) * dy
+   return cross * cross / c2
+
+
+def bezierMaxDistanceSquared(x0, y0, x1, y1, x2, y2, x3, y3):
+   """ Squared distance of the furthest control point of a cubic bezier from its chord.
+       The curve lies within the control hull, so this bounds its flatness. """
+   d1 = segmentDistanceSquared(x1, y1, x0, y0, x3, y3)
+   d2 = segmentDistanceSquared(x2, y2, x0, y0, x3, y3)
+   if d2 > d1:
+      return d2
+   return d1
+
+
+def bezierSplitHalf(x0, y0, x1, y1, x2, y2, x3, y3):
+   """ Splits a cubic bezier at t=0.5 with de Casteljau's algorithm.
+       Returns (left, right), each a flat tuple of 8 coordinates. """
+   m1x = x0 + 0.5 * (x1 - x0)
+   m1y = y0 + 0.5 * (y1 - y0)
+   m2x = x1 + 0.5 * (x2 - x1)
+   m2y = y1 + 0.5 * (y2 - y1)
+   m3x = x2 + 0.5 * (x3 - x2)
+   m3y = y2 + 0.5 * (y3 - y2)
+   m4x = m1x + 0.5 * (m2x - m1x)
+   m4y = m1y + 0.5 * (m2y - m1y)
+   m5x = m2x + 0.5 * (m3x - m2x)
+   m5y = m2y + 0.5 * (m3y - m2y)
+   mx = m4x + 0.5 * (m5x - m4x)
+   my = m4y + 0.5 * (m5y - m4y)
+   return (x0, y0, m1x, m1y, m4x, m4y, mx, my), (mx, my, m5x, m5y, m3x, m3y, x3, y3)
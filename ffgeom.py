@@ -20,40 +20,56 @@
     Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 import math
+import fastgeom
 try:
     NaN = float('NaN')
 except ValueError:
     PosInf = 1e300000
     NaN = PosInf/PosInf
 
-class Point:
+# Point and Segment keep the original FretFind API on top of the fastgeom
+# kernel. New code on a hot path should call fastgeom directly instead.
+
+class Point(object):
+    __slots__ = ('x', 'y')
     precision = 5
     def __init__(self, x, y):
-        self.__coordinates = {'x' : float(x), 'y' : float(y)}
+        self.x = float(x)
+        self.y = float(y)
     def __getitem__(self, key):
-        return self.__coordinates[key]
+        if key == 'x':
+            return self.x
+        if key == 'y':
+            return self.y
+        raise KeyError(key)
     def __setitem__(self, key, value):
-        self.__coordinates[key] = float(value)
+        if key == 'x':
+            self.x = float(value)
+        elif key == 'y':
+            self.y = float(value)
+        else:
+            raise KeyError(key)
     def __repr__(self):
-        return '(%s, %s)' % (round(self['x'],self.precision),round(self['y'],self.precision))
+        return '(%s, %s)' % (round(self.x,self.precision),round(self.y,self.precision))
     def copy(self):
-        return Point(self['x'],self['y'])
+        return Point(self.x,self.y)
     def translate(self, x, y):
-        self['x'] += x
-        self['y'] += y
+        self.x += x
+        self.y += y
     def move(self, x, y):
-        self['x'] = float(x)
-        self['y'] = float(y)
+        self.x = float(x)
+        self.y = float(y)
 
-class Segment:
+class Segment(object):
+    __slots__ = ('_endpoints',)
     def __init__(self, e0, e1):
-        self.__endpoints = [e0, e1]
+        self._endpoints = [e0, e1]
     def __getitem__(self, key):
-        return self.__endpoints[key]
+        return self._endpoints[key]
     def __setitem__(self, key, value):
-        self.__endpoints[key] = value
+        self._endpoints[key] = value
     def __repr__(self):
-        return repr(self.__endpoints)
+        return repr(self._endpoints)
     def copy(self):
         return Segment(self[0],self[1])
     def translate(self, x, y):
@@ -78,23 +94,18 @@ class Segment:
             return self[1]['y'] - (self[0]['x'] * self.slope())
         return NaN
     def distanceToPoint(self, p):
-        s2 = Segment(self[0],p)
-        c1 = dot(s2,self)
-        if c1 <= 0:
-            return Segment(p,self[0]).length()
-        c2 = dot(self,self)
-        if c2 <= c1:
-            return Segment(p,self[1]).length()
-        return self.perpDistanceToPoint(p)
+        e0, e1 = self._endpoints
+        return math.sqrt(fastgeom.segmentDistanceSquared(p['x'], p['y'], e0['x'], e0['y'], e1['x'], e1['y']))
     def perpDistanceToPoint(self, p):
-        len = self.length()
-        if len == 0: return NaN
-        return math.fabs(((self[1]['x'] - self[0]['x']) * (self[0]['y'] - p['y'])) - \
-            ((self[0]['x'] - p['x']) * (self[1]['y'] - self[0]['y']))) / len
+        e0, e1 = self._endpoints
+        d2 = fastgeom.segmentPerpDistanceSquared(p['x'], p['y'], e0['x'], e0['y'], e1['x'], e1['y'])
+        if d2 is None: return NaN
+        return math.sqrt(d2)
     def angle(self):
         return math.pi * (math.atan2(self.delta_y(), self.delta_x())) / 180
     def length(self):
-        return math.sqrt((self.delta_x() ** 2) + (self.delta_y() ** 2))
+        e0, e1 = self._endpoints
+        return math.sqrt(fastgeom.distanceSquared(e0['x'], e0['y'], e1['x'], e1['y']))
     def pointAtLength(self, len):
         if self.length() == 0: return Point(NaN, NaN)
         ratio = len / self.length()
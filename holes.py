@@ -0,0 +1,206 @@
+# Automatic hole bridging for filled paths.
+# An fp_poly can't have holes, so the flattened subpaths of a filled path are sorted
+# into outer boundaries and holes by containment and winding, and each hole is then
+# spliced into the outer boundary around it through a zero width "keyhole" bridge,
+# which is the cut people used to make by hand.
+# Containment is found with one sweep over the edges of every subpath, sorted by y,
+# instead of testing every subpath against every other one.
+# The bridging follows the hole elimination step of the earcut triangulation library
+# (Mapbox, ISC license).
+# TODO comments, license
+
+import heapq
+
+
+def signedArea(ring):
+   """ Twice the signed area of a ring of (x, y) points, positive when it runs counterclockwise
+       with the Y axis pointing up. """
+   total = 0.0
+   x0, y0 = ring[-1]
+   for x1, y1 in ring:
+      total += x0 * y1 - x1 * y0
+      x0, y0 = x1, y1
+   return total
+
+
+def cleanRing(points):
+   """ Drops consecutive duplicate points and the closing copy of the first point. """
+   ring = []
+   for point in points:
+      if not ring or point != ring[-1]:
+         ring.append(point)
+   while len(ring) > 1 and ring[-1] == ring[0]:
+      ring.pop()
+   return ring
+
+
+def findContainers(rings):
+   """ For each ring, returns the list of indices of the other rings that contain it, assuming the
+       rings don't cross each other. A ring is tested with its leftmost point, by counting the edges
+       of each other ring crossed by a ray going left from it. The edges are swept upwards through a
+       heap, so each ray only looks at the edges that span its y. """
+   edges = []
+   for owner, ring in enumerate(rings):
+      x0, y0 = ring[-1]
+      for x1, y1 in ring:
+         if y0 != y1:
+            edges.append( (min(y0, y1), max(y0, y1), x0, y0, x1, y1, owner) )
+         x0, y0 = x1, y1
+   edges.sort()
+
+   queries = sorted((min(ring)[1], min(ring)[0], owner) for owner, ring in enumerate(rings))
+   active = {} # edge index -> edge, for the edges with ymin <= y < ymax
+   ends = [] # heap of (ymax, edge index) of the active edges
+   nextEdge = 0
+   containers = [None] * len(rings)
+   for qy, qx, owner in queries:
+      while nextEdge < len(edges) and edges[nextEdge][0] <= qy:
+         active[nextEdge] = edges[nextEdge]
+         heapq.heappush(ends, (edges[nextEdge][1], nextEdge))
+         nextEdge += 1
+      while ends and ends[0][0] <= qy:
+         del active[heapq.heappop(ends)[1]]
+
+      odd = {}
+      for ymin, ymax, x0, y0, x1, y1, other in active.itervalues():
+         if other != owner and x0 + (qy - y0) * (x1 - x0) / (y1 - y0) < qx:
+            odd[other] = not odd.get(other, False)
+      containers[owner] = [other for other, isOdd in odd.items() if isOdd]
+   return containers
+
+
+def classifyRings(rings, evenOdd=False):
+   """ Sorts cleaned rings into outer boundaries and holes, following the SVG fill rule
+       (nonzero unless evenOdd). Rings whose inside and outside are both filled, or both
+       empty, don't bound anything and are dropped.
+       Returns a list of (outer ring index, [hole ring indices]). """
+   signs = [1 if signedArea(ring) > 0 else -1 for ring in rings]
+   containers = findContainers(rings)
+   depths = [len(c) for c in containers]
+
+   roles = []
+   for i in range(len(rings)):
+      if evenOdd:
+         insideFilled = depths[i] % 2 == 0
+         outsideFilled = not insideFilled
+      else:
+         winding = signs[i] + sum(signs[c] for c in containers[i])
+         insideFilled = winding != 0
+         outsideFilled = winding - signs[i] != 0
+      if insideFilled and not outsideFilled:
+         roles.append("outer")
+      elif outsideFilled and not insideFilled:
+         roles.append("hole")
+      else:
+         roles.append(None)
+
+   holesOf = dict((i, []) for i in range(len(rings)) if roles[i] == "outer")
+   for i in range(len(rings)):
+      if roles[i] != "hole":
+         continue
+      # The containers of a ring are nested, so the deepest outer among them is the one around it
+      around = [c for c in containers[i] if roles[c] == "outer"]
+      if around:
+         holesOf[max(around, key=lambda c: depths[c])].append(i)
+   return sorted(holesOf.items())
+
+
+def area(p, q, r):
+   return (q[1] - p[1]) * (r[0] - q[0]) - (q[0] - p[0]) * (r[1] - q[1])
+
+
+def pointInTriangle(ax, ay, bx, by, cx, cy, px, py):
+   return ((cx - px) * (ay - py) >= (ax - px) * (cy - py) and
+           (ax - px) * (by - py) >= (bx - px) * (ay - py) and
+           (bx - px) * (cy - py) >= (cx - px) * (by - py))
+
+
+def locallyInside(polygon, i, point):
+   """ True if the diagonal from polygon vertex i to point starts off inside the polygon. """
+   a = polygon[i]
+   prev = polygon[i - 1]
+   next = polygon[(i + 1) % len(polygon)]
+   if area(prev, a, next) < 0:
+      return area(a, point, next) >= 0 and area(a, prev, point) >= 0
+   return area(a, point, prev) < 0 or area(a, next, point) < 0
+
+
+def findHoleBridge(polygon, hole):
+   """ Finds the index of a vertex of polygon that can be joined to the leftmost point of hole
+       without crossing anything, by casting a ray left from the hole (David Eberly's method).
+       Returns None if there isn't one. """
+   hx, hy = hole
+   count = len(polygon)
+   qx = float("-inf")
+   m = None
+   for i in range(count):
+      px, py = polygon[i]
+      nx, ny = polygon[(i + 1) % count]
+      if hy <= py and hy >= ny and ny != py:
+         x = px + (hy - py) * (nx - px) / (ny - py)
+         if x <= hx and x > qx:
+            qx = x
+            m = i if px < nx else (i + 1) % count
+            if x == hx:
+               # The hole touches this edge, so its left end is as good as it gets
+               return m
+   if m is None:
+      return None
+
+   # Any vertex inside the triangle between the hole, the ray's hit and m might block the view of m;
+   # the one closest to the ray in angle is then the visible one
+   mx, my = polygon[m]
+   tanMin = float("inf")
+   start = m
+   for step in range(count):
+      i = (start + step) % count
+      px, py = polygon[i]
+      if hx >= px and px >= mx and hx != px and pointInTriangle(hx if hy < my else qx, hy, mx, my,
+                                                                qx if hy < my else hx, hy, px, py):
+         tan = abs(hy - py) / (hx - px)
+         if locallyInside(polygon, i, hole) and (tan < tanMin or (tan == tanMin and px > polygon[m][0])):
+            m = i
+            tanMin = tan
+   return m
+
+
+def bridgeHoles(outer, holes):
+   """ Splices each hole into the outer ring with a pair of coincident bridge edges.
+       The outer ring must run counterclockwise (positive signedArea) and the holes clockwise.
+       Returns the single resulting ring. """
+   polygon = list(outer)
+   # Left to right, so a later bridge never has to cross an earlier hole
+   for hole in sorted(holes, key=min):
+      left = hole.index(min(hole))
+      i = findHoleBridge(polygon, hole[left])
+      if i is None:
+         continue
+      loop = hole[left:] + hole[:left] + [hole[left]]
+      polygon[i + 1:i + 1] = loop + [polygon[i]]
+   return polygon
+
+
+def bridgeRings(rings, evenOdd=False):
+   """ Turns the flattened subpaths of one filled path into polygons without holes: one per outer
+       boundary, with the holes inside it bridged in. Each polygon ends with a copy of its first
+       point, like a closed subpath. Returns None if there is nothing to bridge, in which case the
+       subpaths can be used as they are. """
+   rings = [cleanRing(points) for points in rings]
+   rings = [ring for ring in rings if len(ring) >= 3]
+   if len(rings) < 2:
+      return None
+
+   polygons = []
+   for outer, holes in classifyRings(rings, evenOdd):
+      ring = rings[outer]
+      if signedArea(ring) < 0:
+         ring = ring[::-1]
+      holeRings = []
+      for hole in holes:
+         holeRing = rings[hole]
+         if signedArea(holeRing) > 0:
+            holeRing = holeRing[::-1]
+         holeRings.append(holeRing)
+      polygon = bridgeHoles(ring, holeRings)
+      polygons.append(polygon + [polygon[0]])
+   return polygons
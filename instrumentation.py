@@ -0,0 +1,480 @@
+# Opt-in instrumentation of a conversion: wall time and CPU time for each stage, plus
+# counters of the work done (paths visited, cubics subdivided, flatness tests, vertices
+# written) and the maximum resident set size of the process.
+# SvgParser and svg2kicadmod report what they are doing through a recorder: stage(name)
+# around each piece of work, count(name, amount) where something is counted, and a few
+# more hooks, see Recorder. The parser's default recorder does nothing, so a normal run
+# pays no more than a few empty calls for it. Stages nest, and the time spent in an inner
+# stage is only counted there, not in the stage around it.
+# ElementCosts is a recorder too, which charges the work to the SVG elements it was done
+# for instead of to stages, to find the few elements that cost the most.
+# TODO comments, license
+
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+try:
+   import resource
+except ImportError:
+   resource = None
+
+from rawobjects import CIRCLE
+
+
+def cpuTime():
+   if resource is None:
+      return time.clock()
+   usage = resource.getrusage(resource.RUSAGE_SELF)
+   return usage.ru_utime + usage.ru_stime
+
+
+def processMaxRss():
+   """ The largest resident set size the process has had so far in bytes, from getrusage,
+       or None if it can't be found. It covers everything the process did before the
+       conversion too, and never goes down, so it is only meaningful for the whole run. """
+   if resource is None:
+      return None
+   peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+   # Linux reports kilobytes, macOS bytes
+   return peak if sys.platform == "darwin" else peak * 1024
+
+
+class NullContext:
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *exc):
+      return False
+
+
+NULL_CONTEXT = NullContext()
+
+
+class Recorder:
+   """ The hooks a conversion calls to report its work. This one ignores them all, and is
+       what a SvgParser uses unless it is given another; ConversionProfile and ElementCosts
+       override the ones they need. """
+
+   def attach(self, parser):
+      """ Called by each SvgParser that is given this recorder, once it is set up. """
+      pass
+
+   def traversal(self, parser):
+      """ Called when parser starts a pass over its whole document. """
+      pass
+
+   def stage(self, name):
+      """ A context manager around a piece of work of the stage name. """
+      return NULL_CONTEXT
+
+   def iterStage(self, name, iterable):
+      """ Returns iterable, with the time spent producing each of its items counted as the
+          stage name, whoever asks for them. """
+      return iterable
+
+   def count(self, name, amount=1):
+      """ Adds amount to the counter name. """
+      pass
+
+   def flattened(self, subpaths, flat):
+      """ Called with the subpaths of each path flattened at the smoothness flat. """
+      pass
+
+   def written(self, objects):
+      """ Returns the raw objects objects, counting them as they are written. """
+      return objects
+
+   def element(self, node):
+      """ A context manager around the work done for the SVG element node. """
+      return NULL_CONTEXT
+
+   def shared(self, nodes, weights):
+      """ A context manager around work done for the elements nodes all at once, to be shared
+          out between them in proportion to weights. """
+      return NULL_CONTEXT
+
+   def emitted(self, objects):
+      """ Called with the raw objects the current element adds to the drawing. """
+      pass
+
+
+@contextmanager
+def nested(contexts):
+   """ Enters each of the context managers contexts in turn, and leaves them in reverse order. """
+   if not contexts:
+      yield
+      return
+   with contexts[0]:
+      with nested(contexts[1:]):
+         yield
+
+
+class Recorders(Recorder):
+   """ Passes every hook on to each of a list of recorders. """
+
+   def __init__(self, recorders):
+      self.recorders = list(recorders)
+
+   def attach(self, parser):
+      for recorder in self.recorders:
+         recorder.attach(parser)
+
+   def traversal(self, parser):
+      for recorder in self.recorders:
+         recorder.traversal(parser)
+
+   def stage(self, name):
+      return nested([recorder.stage(name) for recorder in self.recorders])
+
+   def iterStage(self, name, iterable):
+      for recorder in self.recorders:
+         iterable = recorder.iterStage(name, iterable)
+      return iterable
+
+   def count(self, name, amount=1):
+      for recorder in self.recorders:
+         recorder.count(name, amount)
+
+   def flattened(self, subpaths, flat):
+      for recorder in self.recorders:
+         recorder.flattened(subpaths, flat)
+
+   def written(self, objects):
+      for recorder in self.recorders:
+         objects = recorder.written(objects)
+      return objects
+
+   def element(self, node):
+      return nested([recorder.element(node) for recorder in self.recorders])
+
+   def shared(self, nodes, weights):
+      return nested([recorder.shared(nodes, weights) for recorder in self.recorders])
+
+   def emitted(self, objects):
+      for recorder in self.recorders:
+         recorder.emitted(objects)
+
+
+def combineRecorders(recorders):
+   """ A recorder for every one of recorders that isn't None, or None if they all are. """
+   recorders = [recorder for recorder in recorders if recorder is not None]
+   if not recorders:
+      return None
+   return recorders[0] if len(recorders) == 1 else Recorders(recorders)
+
+
+class StageClock:
+   """ Adds up the wall time, CPU time and calls of each stage. stages gives the order they are
+       reported in. """
+
+   def __init__(self, stages):
+      self.stages = list(stages)
+      self.wall = dict((stage, 0.0) for stage in stages)
+      self.cpu = dict((stage, 0.0) for stage in stages)
+      self.calls = dict((stage, 0) for stage in stages)
+      self.stack = [] # [stage, wall, cpu] when it was entered or last resumed
+
+   def charge(self, entry, wall, cpu):
+      stage = entry[0]
+      self.wall[stage] += wall - entry[1]
+      self.cpu[stage] += cpu - entry[2]
+
+   def enter(self, stage):
+      wall, cpu = time.time(), cpuTime()
+      if self.stack:
+         self.charge(self.stack[-1], wall, cpu)
+      self.calls[stage] += 1
+      self.stack.append( [stage, wall, cpu] )
+
+   def leave(self):
+      wall, cpu = time.time(), cpuTime()
+      self.charge(self.stack.pop(), wall, cpu)
+      if self.stack:
+         self.stack[-1][1:] = [wall, cpu]
+
+   @contextmanager
+   def timing(self, stage):
+      self.enter(stage)
+      try:
+         yield
+      finally:
+         self.leave()
+
+   def timeItems(self, iterable, stage):
+      """ Yields the items of iterable, counting the time spent producing each one as stage. """
+      iterator = iter(iterable)
+      while True:
+         self.enter(stage)
+         try:
+            item = next(iterator)
+         except StopIteration:
+            return
+         finally:
+            self.leave()
+         yield item
+
+
+class ConversionProfile(Recorder):
+   """ Records the stages and counters of every conversion it is given to, see svg2kicadmod.convert. """
+
+   STAGES = ["load", "estimate", "traverse", "path parse", "transform", "subdivide", "align/scale", "merge", "simplify", "write"]
+
+   def __init__(self):
+      self.clock = StageClock(self.STAGES)
+      self.counters = {"paths visited": 0, "shapes visited": 0, "cubics subdivided": 0, "flatness tests": 0,
+                       "objects written": 0, "vertices written": 0}
+      self.parsers = []
+
+   def attach(self, parser):
+      self.parsers.append(parser)
+
+   def stage(self, name):
+      return self.clock.timing(name)
+
+   def iterStage(self, name, iterable):
+      return self.clock.timeItems(iterable, name)
+
+   def count(self, name, amount=1):
+      self.counters[name] += amount
+
+   def flattened(self, subpaths, flat):
+      self.counters["cubics subdivided"] += sum(max(len(sp) - 1, 0) for sp in subpaths)
+
+   def written(self, objects):
+      for fill, points in objects:
+         self.counters["objects written"] += 1
+         self.counters["vertices written"] += 1 if fill == CIRCLE else len(points)
+         yield fill, points
+
+   def collectCounters(self):
+      counters = dict(self.counters)
+      counters["paths visited"] = sum(parser.pathsVisited for parser in self.parsers)
+      counters["shapes visited"] = sum(parser.shapesVisited for parser in self.parsers)
+      return counters
+
+   def results(self):
+      """ The measurements as a dict, ready to be dumped as JSON. Times are in seconds and
+          memory in bytes. """
+      clock = self.clock
+      stages = []
+      for stage in clock.stages:
+         stages.append({"stage": stage, "wall": clock.wall[stage], "cpu": clock.cpu[stage], "calls": clock.calls[stage]})
+      total = {"wall": sum(clock.wall.values()), "cpu": sum(clock.cpu.values()), "processMaxRss": processMaxRss()}
+      return {"stages": stages, "total": total, "counters": self.collectCounters()}
+
+   def formatTable(self):
+      results = self.results()
+      lines = ["%-12s %10s %10s %8s" % ("stage", "wall s", "cpu s", "calls")]
+      for row in results["stages"]:
+         lines.append("%-12s %10.4f %10.4f %8d" % (row["stage"], row["wall"], row["cpu"], row["calls"]))
+      total = results["total"]
+      lines.append("%-12s %10.4f %10.4f" % ("total", total["wall"], total["cpu"]))
+      if total["processMaxRss"] is not None:
+         lines.append("%-20s %12.1f" % ("process max RSS MB", total["processMaxRss"] / 1e6))
+      for name in sorted(results["counters"]):
+         lines.append("%-20s %12d" % (name, results["counters"][name]))
+      return "\n".join(lines)
+
+   def report(self, format="table", output=None):
+      """ Writes the measurements as a table or as JSON, to the file output or to stdout. """
+      if format == "json":
+         text = json.dumps(self.results(), indent=1, sort_keys=True)
+      else:
+         text = self.formatTable()
+      if output is None:
+         print text
+      else:
+         with open(output, "w") as fid:
+            fid.write(text + "\n")
+
+
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+INKSCAPE_LABEL = "{http://www.inkscape.org/namespaces/inkscape}label"
+
+
+def elementPath(node, positions=True):
+   """ An XPath expression for node, with the SVG namespace as the prefix svg, like
+       /svg:svg/svg:g[2]/svg:path[3]. Without positions the [n] are left out, for trees
+       whose earlier elements have already been thrown away. """
+   steps = []
+   while node is not None:
+      namespace, tag = node.tag[1:].split("}") if node.tag.startswith("{") else (None, node.tag)
+      if namespace == SVG_NAMESPACE:
+         step = "svg:" + tag
+      elif namespace is None:
+         step = tag
+      else:
+         step = "*[local-name()='%s']" % tag
+      parent = node.getparent()
+      if positions and parent is not None:
+         same = [sibling for sibling in parent if sibling.tag == node.tag]
+         if len(same) > 1:
+            step += "[%d]" % (same.index(node) + 1)
+      steps.append(step)
+      node = parent
+   return "/" + "/".join(reversed(steps))
+
+
+def subdivisionDepth(sp, flat):
+   """ How many times cspsubdiv halves the most bent cubic of the subpath sp before every
+       piece is within flat of its chord. 0 if every cubic is flat enough already. """
+   from fastgeom import bezierMaxDistanceSquared, bezierSplitHalf
+   from batchsubdiv import MAX_DEPTH
+   flat2 = flat * flat
+   deepest = 0
+   for j in range(1, len(sp)):
+      p0, p1 = sp[j - 1][1], sp[j - 1][2]
+      p2, p3 = sp[j][0], sp[j][1]
+      stack = [((p0[0], p0[1], p1[0], p1[1], p2[0], p2[1], p3[0], p3[1]), 0)]
+      while stack:
+         b, depth = stack.pop()
+         if depth >= MAX_DEPTH or bezierMaxDistanceSquared(*b) <= flat2:
+            deepest = max(deepest, depth)
+         else:
+            one, two = bezierSplitHalf(*b)
+            stack.append( (two, depth + 1) )
+            stack.append( (one, depth + 1) )
+   return deepest
+
+
+def objectVertices(fill, count):
+   # A circle is written as a single fp_circle
+   return 1 if fill == CIRCLE else count
+
+
+class ElementCosts(Recorder):
+   """ Ties the cost of a conversion back to the SVG elements it came from: the time spent
+       on each path, shape and <use>, the deepest subdivision of its curves and the vertices
+       it emits, to find the few elements of a drawing that cost the most.
+       Time is exclusive like StageClock's, so a <use> doesn't include the paths of the
+       symbol it draws, which are elements of their own. The batch flattener flattens every
+       path at once, so its time is shared out by the number of cubics each path has.
+       Elements are identified by their source line and XPath. A streaming conversion reads
+       the file twice; the time of both passes is added up, the rest is counted once. """
+
+   def __init__(self):
+      self.records = {} # (line, XPath) -> record
+      self.nodeKeys = {} # element -> (line, XPath)
+      self.stack = [] # [record, [(record, share), ...] or None for time charged to no one, time it was entered or last resumed]
+      self.positions = True # False for a streaming parser, which has discarded the elements before the current one
+      self.counting = True # False during the second pass of a streaming conversion
+      self.passes = {} # parser -> number of passes over its document started
+
+   def attach(self, parser):
+      self.positions = not parser.stream
+
+   def traversal(self, parser):
+      passes = self.passes.get(parser, 0) + 1
+      self.passes[parser] = passes
+      self.counting = passes == 1
+
+   def recordFor(self, node):
+      key = self.nodeKeys.get(node)
+      if key is None:
+         key = (node.sourceline, elementPath(node, self.positions))
+         self.nodeKeys[node] = key
+      record = self.records.get(key)
+      if record is None:
+         tag = node.tag.rpartition("}")[2]
+         record = {"tag": tag, "id": node.get("id"), "label": node.get(INKSCAPE_LABEL), "line": node.sourceline,
+                   "xpath": key[1], "seconds": 0.0, "depth": 0, "cubics": 0, "vertices": 0, "objects": 0}
+         self.records[key] = record
+      return record
+
+   def current(self):
+      """ The record of the element being converted, or None. """
+      if self.stack and isinstance(self.stack[-1][0], dict):
+         return self.stack[-1][0]
+      return None
+
+   def enter(self, target):
+      now = time.time()
+      if self.stack:
+         self.charge(self.stack[-1], now)
+      self.stack.append( [target, now] )
+
+   def leave(self):
+      now = time.time()
+      self.charge(self.stack.pop(), now)
+      if self.stack:
+         self.stack[-1][1] = now
+
+   def charge(self, entry, now):
+      target, start = entry
+      if isinstance(target, dict):
+         target["seconds"] += now - start
+      elif target is not None:
+         for record, share in target:
+            record["seconds"] += (now - start) * share
+
+   @contextmanager
+   def timing(self, target):
+      self.enter(target)
+      try:
+         yield
+      finally:
+         self.leave()
+
+   def element(self, node):
+      return self.timing(self.recordFor(node))
+
+   def shared(self, nodes, weights):
+      total = float(sum(weights))
+      shares = {} # id of record -> [record, share]
+      for node, weight in zip(nodes, weights):
+         record = self.recordFor(node)
+         share = weight / total if total > 0 else 1.0 / len(nodes)
+         shares.setdefault(id(record), [record, 0.0])[1] += share
+      return self.timing([tuple(pair) for pair in shares.values()])
+
+   def flattened(self, subpaths, flat):
+      record = self.current()
+      if record is None or not self.counting:
+         return
+      # Working out the depth is the recorder's own time, not the element's
+      with self.timing(None):
+         for sp in subpaths:
+            record["cubics"] += max(len(sp) - 1, 0)
+            record["depth"] = max(record["depth"], subdivisionDepth(sp, flat))
+
+   def emitted(self, objects):
+      record = self.current()
+      if record is None or not self.counting:
+         return
+      for fill, points in objects:
+         record["objects"] += 1
+         record["vertices"] += objectVertices(fill, len(points))
+
+   def ranked(self, field, count=None):
+      """ The records with the highest field first. """
+      records = sorted(self.records.values(), key=lambda record: (-record[field], record["line"]))
+      return records if count is None else records[:count]
+
+   def describe(self, record):
+      name = record["tag"]
+      if record["id"]:
+         name += "#" + record["id"]
+      if record["label"]:
+         name += ' "%s"' % record["label"]
+      return "%s line %s %s" % (name, record["line"], record["xpath"])
+
+   def formatTable(self, count):
+      lines = []
+      for field, title in [("seconds", "flattening time"), ("depth", "subdivision depth"), ("vertices", "vertices emitted")]:
+         lines.append("Top %d elements by %s:" % (count, title))
+         lines.append("%10s %6s %8s %9s  %s" % ("seconds", "depth", "cubics", "vertices", "element"))
+         for record in self.ranked(field, count):
+            lines.append("%10.4f %6d %8d %9d  %s" % (record["seconds"], record["depth"], record["cubics"], record["vertices"],
+                                                    self.describe(record)))
+      return "\n".join(lines)
+
+   def report(self, count, output=None):
+      """ Prints the top count elements by time, depth and vertices, and writes every element
+          to the file output as JSON, most expensive first, if it is given. """
+      print self.formatTable(count)
+      if output is not None:
+         with open(output, "w") as fid:
+            json.dump(self.ranked("seconds"), fid, indent=1, sort_keys=True)
+            fid.write("\n")
@@ -0,0 +1,68 @@
+# A small bounded least recently used cache, with hit and miss counters.
+# Each entry has a cost (1 by default) and the least recently used entries are
+# evicted once the total cost goes over maxCost.
+# TODO comments, license
+
+from collections import OrderedDict
+
+
+class LRUCache:
+
+   def __init__(self, maxCost):
+      self.maxCost = maxCost
+      self.entries = OrderedDict() # key -> (value, cost), least recently used first
+      self.cost = 0
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+
+   def get(self, key, default=None):
+      """ Returns the value stored for key, marking it as most recently used, or default on a miss. """
+      entry = self.entries.pop(key, None)
+      if entry is None:
+         self.misses += 1
+         return default
+      self.entries[key] = entry
+      self.hits += 1
+      return entry[0]
+
+   def put(self, key, value, cost=1):
+      """ Stores value under key, evicting least recently used entries to stay within maxCost.
+          A value that costs more than maxCost on its own is not stored at all. """
+      old = self.entries.pop(key, None)
+      if old is not None:
+         self.cost -= old[1]
+      if cost > self.maxCost:
+         return
+      self.entries[key] = (value, cost)
+      self.cost += cost
+      while self.cost > self.maxCost:
+         evictedKey, (evictedValue, evictedCost) = self.entries.popitem(last=False)
+         self.cost -= evictedCost
+         self.evictions += 1
+
+   def countAsHit(self):
+      """ Recounts the last miss as a hit, for a caller that found the value elsewhere after all. """
+      self.misses -= 1
+      self.hits += 1
+
+   def clear(self):
+      self.entries.clear()
+      self.cost = 0
+
+   def __len__(self):
+      return len(self.entries)
+
+   def __contains__(self, key):
+      return key in self.entries
+
+   def hitRate(self):
+      lookups = self.hits + self.misses
+      if lookups == 0:
+         return 0.0
+      return float(self.hits) / lookups
+
+   def stats(self):
+      return {"entries": len(self.entries), "cost": self.cost, "maxCost": self.maxCost,
+              "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+              "hitRate": self.hitRate()}
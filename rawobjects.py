@@ -0,0 +1,209 @@
+# Compact storage for raw objects: (fill=True/False, [(x0, y0), (x1, y1), ...]).
+# A raw object whose fill is CIRCLE is a filled circle instead of a polygon, and its
+# points are the center followed by the four extreme points (see arcs.circlePoints).
+# All the coordinates live in one contiguous float64 buffer, with a list of
+# per-polygon offsets and fill flags next to it, instead of a Python tuple per point.
+# Translating and scaling are deferred: they are composed into one pending affine
+# transform that is applied exactly once to each point as it is read back out.
+# The bounding box is kept up to date as polygons are added and as transforms
+# are composed, so asking for it never rescans the points.
+# TODO comments, license
+
+import array
+from itertools import chain
+
+import simpletransform
+
+try:
+   import numpy
+except ImportError:
+   numpy = None
+
+
+# The fill of a raw object that is a filled circle
+CIRCLE = 2
+
+
+class BoundingBox:
+   """ Running (xmin, ymin, xmax, ymax) of a set of points, which can be moved and
+       scaled along with the points instead of being recomputed. Empty until the first point. """
+
+   def __init__(self):
+      self.xmin = self.ymin = self.xmax = self.ymax = None
+
+   def isEmpty(self):
+      return self.xmin is None
+
+   def addBox(self, xmin, ymin, xmax, ymax):
+      if self.xmin is None:
+         self.xmin, self.ymin, self.xmax, self.ymax = xmin, ymin, xmax, ymax
+         return
+      if xmin < self.xmin:
+         self.xmin = xmin
+      if ymin < self.ymin:
+         self.ymin = ymin
+      if xmax > self.xmax:
+         self.xmax = xmax
+      if ymax > self.ymax:
+         self.ymax = ymax
+
+   def addPoints(self, points):
+      """ Grows the box to cover a list of (x, y) points. """
+      if not points:
+         return
+      xs = [p[0] for p in points]
+      ys = [p[1] for p in points]
+      self.addBox(min(xs), min(ys), max(xs), max(ys))
+
+   def transform(self, mat):
+      """ Maps the box through an axis aligned transformation matrix (no rotation or skew),
+          which keeps it exact. """
+      if not isAxisAligned(mat):
+         raise ValueError("Only axis aligned transforms keep a bounding box exact")
+      if self.xmin is None:
+         return
+      x0 = mat[0][0] * self.xmin + mat[0][2]
+      x1 = mat[0][0] * self.xmax + mat[0][2]
+      y0 = mat[1][1] * self.ymin + mat[1][2]
+      y1 = mat[1][1] * self.ymax + mat[1][2]
+      self.xmin, self.xmax = min(x0, x1), max(x0, x1)
+      self.ymin, self.ymax = min(y0, y1), max(y0, y1)
+
+   def translate(self, dx, dy):
+      self.transform([[1.0, 0.0, dx], [0.0, 1.0, dy]])
+
+   def scale(self, scale):
+      self.transform([[scale, 0.0, 0.0], [0.0, scale, 0.0]])
+
+   def minCenterMax(self):
+      """ Returns (xmin, ymin, xcenter, ycenter, xmax, ymax), like SvgParser.findMinCenterMaxOfObjects. """
+      return (self.xmin, self.ymin, (self.xmin + self.xmax) / 2, (self.ymin + self.ymax) / 2,
+              self.xmax, self.ymax)
+
+
+def isAxisAligned(mat):
+   return mat[0][1] == 0 and mat[1][0] == 0
+
+
+def transformPoints(mat, xs, ys):
+   """ Applies the matrix mat to the points given as separate x and y sequences.
+       Returns a list of (x, y) tuples. """
+   a, c, e = mat[0]
+   b, d, f = mat[1]
+   if c == 0 and b == 0:
+      return [(a * x + e, d * y + f) for x, y in zip(xs, ys)]
+   return [(a * x + c * y + e, b * x + d * y + f) for x, y in zip(xs, ys)]
+
+
+class RawObjectStore:
+   """ A list-like container of raw objects. Iterating it yields (fill, points)
+       tuples just like the plain list SvgParser used to keep in rawObjects. """
+
+   def __init__(self, objects=None):
+      self.coords = array.array("d") # x0, y0, x1, y1, ... of every polygon back to back
+      self.offsets = array.array("l", [0]) # polygon i is points offsets[i] to offsets[i+1]
+      self.fills = array.array("B")
+      self.boundingBox = BoundingBox()
+      self.transform = None # pending affine transform, None for identity
+      if objects is not None:
+         self.extend(objects)
+
+   def append(self, obj):
+      """ Adds a raw object (fill, points) to the end of the store. """
+      fill, points = obj
+      if self.transform is not None:
+         # points arrive untransformed, so the pending transform can't stay pending
+         self.commitTransform()
+      start = len(self.coords)
+      self.coords.extend(chain.from_iterable(points))
+      if len(self.coords) > start:
+         xs = self.coords[start::2]
+         ys = self.coords[start + 1::2]
+         self.boundingBox.addBox(min(xs), min(ys), max(xs), max(ys))
+      self.offsets.append(len(self.coords) // 2)
+      self.fills.append(CIRCLE if fill == CIRCLE else 1 if fill else 0)
+
+   def extend(self, objects):
+      for obj in objects:
+         self.append(obj)
+
+   def __len__(self):
+      return len(self.fills)
+
+   def __getitem__(self, index):
+      if index < 0:
+         index += len(self)
+      if index < 0 or index >= len(self):
+         raise IndexError("raw object index out of range")
+      start = 2 * self.offsets[index]
+      end = 2 * self.offsets[index + 1]
+      xs = self.coords[start:end:2]
+      ys = self.coords[start + 1:end:2]
+      fill = self.fills[index]
+      if fill != CIRCLE:
+         fill = bool(fill)
+      if self.transform is None:
+         return fill, zip(xs, ys)
+      return fill, transformPoints(self.transform, xs, ys)
+
+   def __iter__(self):
+      for index in range(len(self)):
+         yield self[index]
+
+   def pointCount(self):
+      return len(self.coords) // 2
+
+   def transformBy(self, mat):
+      """ Composes the transformation matrix mat after any pending transform. Nothing is
+          recomputed until the points are read, unless mat rotates or skews, in which
+          case it is applied right away so the bounding box can be rescanned. """
+      if self.transform is None:
+         self.transform = mat
+      else:
+         self.transform = simpletransform.composeTransform(mat, self.transform)
+      if isAxisAligned(mat):
+         self.boundingBox.transform(mat)
+      else:
+         self.commitTransform()
+         self.boundingBox = BoundingBox()
+         if self.coords:
+            xs = self.coords[0::2]
+            ys = self.coords[1::2]
+            self.boundingBox.addBox(min(xs), min(ys), max(xs), max(ys))
+
+   def translate(self, dx, dy):
+      """ Adds (dx, dy) to every point. """
+      self.transformBy([[1.0, 0.0, dx], [0.0, 1.0, dy]])
+
+   def scale(self, scale):
+      """ Multiplies every coordinate by scale. """
+      self.transformBy([[scale, 0.0, 0.0], [0.0, scale, 0.0]])
+
+   def commitTransform(self):
+      """ Applies the pending transform to the coordinate buffer in place. """
+      mat = self.transform
+      if mat is None:
+         return
+      self.transform = None
+      a, c, e = mat[0]
+      b, d, f = mat[1]
+      if numpy is not None:
+         view = numpy.frombuffer(self.coords, dtype=numpy.float64)
+         xs = view[0::2].copy()
+         ys = view[1::2]
+         view[0::2] = a * xs + c * ys + e
+         view[1::2] = b * xs + d * ys + f
+         return
+      coords = self.coords
+      for i in range(0, len(coords), 2):
+         x = coords[i]
+         y = coords[i + 1]
+         coords[i] = a * x + c * y + e
+         coords[i + 1] = b * x + d * y + f
+
+   def bounds(self):
+      """ Returns (xmin, ymin, xmax, ymax) of all the points, or None if there are none. """
+      box = self.boundingBox
+      if box.isEmpty():
+         return None
+      return box.xmin, box.ymin, box.xmax, box.ymax
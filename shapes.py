@@ -0,0 +1,120 @@
+# The basic SVG shapes: rect, circle, ellipse, line, polyline and polygon.
+# Each one is turned into the equivalent absolute path commands (M, L, A and Z only,
+# like simplepath.parsePath returns), so straight edges never go near the curve
+# flattening code and rounded ones only need the exact arc sampling in arcs.py.
+# TODO comments, license
+
+import re
+
+
+SHAPE_TAGS = ["rect", "circle", "ellipse", "line", "polyline", "polygon"]
+
+numberPattern = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def parseLength(value, default=0.0):
+   """ Parses a length attribute, ignoring any unit like SvgParser.parseLengthAndUnits does.
+       Returns default if the attribute is missing, None if it isn't a number. """
+   if value is None:
+      return default
+   match = numberPattern.match(value.strip())
+   if match is None:
+      return None
+   return float(match.group())
+
+
+def parsePoints(value):
+   """ Parses the points attribute of a polyline or polygon into a list of [x, y],
+       dropping an unpaired last number like the SVG spec says renderers should. """
+   numbers = [float(n) for n in numberPattern.findall(value or "")]
+   return [numbers[i:i + 2] for i in range(0, len(numbers) - 1, 2)]
+
+
+def ellipsePath(cx, cy, rx, ry):
+   """ A full ellipse as four quarter arcs, clockwise from the rightmost point. """
+   return [["M", [cx + rx, cy]],
+           ["A", [rx, ry, 0.0, 0, 1, cx, cy + ry]],
+           ["A", [rx, ry, 0.0, 0, 1, cx - rx, cy]],
+           ["A", [rx, ry, 0.0, 0, 1, cx, cy - ry]],
+           ["A", [rx, ry, 0.0, 0, 1, cx + rx, cy]],
+           ["Z", []]]
+
+
+def rectPath(x, y, width, height, rx, ry):
+   if rx == 0 or ry == 0:
+      return [["M", [x, y]], ["L", [x + width, y]], ["L", [x + width, y + height]], ["L", [x, y + height]], ["Z", []]]
+   return [["M", [x + rx, y]],
+           ["L", [x + width - rx, y]],
+           ["A", [rx, ry, 0.0, 0, 1, x + width, y + ry]],
+           ["L", [x + width, y + height - ry]],
+           ["A", [rx, ry, 0.0, 0, 1, x + width - rx, y + height]],
+           ["L", [x + rx, y + height]],
+           ["A", [rx, ry, 0.0, 0, 1, x, y + height - ry]],
+           ["L", [x, y + ry]],
+           ["A", [rx, ry, 0.0, 0, 1, x + rx, y]],
+           ["Z", []]]
+
+
+def shapePath(name, node):
+   """ Returns the path commands for the shape element node, whose local tag name is name,
+       or None if it is disabled (a zero size, for instance) or its attributes can't be parsed. """
+   get = node.get
+   if name == "rect":
+      x, y, width, height = [parseLength(get(a)) for a in ("x", "y", "width", "height")]
+      rx = parseLength(get("rx"), None)
+      ry = parseLength(get("ry"), None)
+      if None in (x, y, width, height) or width <= 0 or height <= 0:
+         return None
+      # A missing radius takes the other one's value, and neither can be more than half the side
+      if rx is None:
+         rx = ry
+      if ry is None:
+         ry = rx
+      rx = min(abs(rx or 0.0), width / 2.0)
+      ry = min(abs(ry or 0.0), height / 2.0)
+      return rectPath(x, y, width, height, rx, ry)
+
+   if name == "circle":
+      cx, cy, r = [parseLength(get(a)) for a in ("cx", "cy", "r")]
+      if None in (cx, cy, r) or r <= 0:
+         return None
+      return ellipsePath(cx, cy, r, r)
+
+   if name == "ellipse":
+      cx, cy, rx, ry = [parseLength(get(a)) for a in ("cx", "cy", "rx", "ry")]
+      if None in (cx, cy, rx, ry) or rx <= 0 or ry <= 0:
+         return None
+      return ellipsePath(cx, cy, rx, ry)
+
+   if name == "line":
+      x1, y1, x2, y2 = [parseLength(get(a)) for a in ("x1", "y1", "x2", "y2")]
+      if None in (x1, y1, x2, y2):
+         return None
+      return [["M", [x1, y1]], ["L", [x2, y2]]]
+
+   if name in ("polyline", "polygon"):
+      points = parsePoints(get("points"))
+      if len(points) < 2:
+         return None
+      path = [["M", points[0]]] + [["L", p] for p in points[1:]]
+      if name == "polygon":
+         path.append( ["Z", []] )
+      return path
+
+   return None
+
+
+def linePoints(path):
+   """ The points of a path made only of M, L and Z commands, the same ones flattening the
+       equivalent path element would give (Z repeats the first point of its subpath). """
+   points = []
+   start = None
+   for command, params in path:
+      if command == "Z":
+         if start is not None:
+            points.append( tuple(start) )
+         continue
+      if command == "M":
+         start = params
+      points.append( (params[0], params[1]) )
+   return points
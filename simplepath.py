@@ -22,34 +22,25 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 import re, math
 
+# One pattern for every token: the delimiters before it, then a command letter, a number,
+# or (as the third group) any other character, which makes the path data invalid.
+# Trailing delimiters match nothing and are skipped by findall
+tokenPattern = re.compile(r'[ \t\r\n,]*(?:([MLHVCSQTAZmlhvcsqtaz])|'
+                          r'([-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][-+]?[0-9]+)?)|([^ \t\r\n,]))')
+
 def lexPath(d):
     """
     returns and iterator that breaks path data 
     identifies command and parameter tokens
     """
-    offset = 0
-    length = len(d)
-    delim = re.compile(r'[ \t\r\n,]+')
-    command = re.compile(r'[MLHVCSQTAZmlhvcsqtaz]')
-    parameter = re.compile(r'(([-+]?[0-9]+(\.[0-9]*)?|[-+]?\.[0-9]+)([eE][-+]?[0-9]+)?)')
-    while 1:
-        m = delim.match(d, offset)
-        if m:
-            offset = m.end()
-        if offset >= length:
-            break
-        m = command.match(d, offset)
-        if m:
-            yield [d[offset:m.end()], True]
-            offset = m.end()
-            continue
-        m = parameter.match(d, offset)
-        if m:
-            yield [d[offset:m.end()], False]
-            offset = m.end()
-            continue
-        #TODO: create new exception
-        raise Exception, 'Invalid path data!'
+    for command, parameter, invalid in tokenPattern.findall(d):
+        if invalid:
+            #TODO: create new exception
+            raise Exception, 'Invalid path data!'
+        if command:
+            yield [command, True]
+        else:
+            yield [parameter, False]
 '''
 pathdefs = {commandfamily:
     [
@@ -71,6 +62,24 @@ pathdefs = {
     'A':['A', 7, [float, float, float, int, int, float, float], ['r','r','a',0,'s','x','y']], 
     'Z':['L', 0, [], []]
     }
+
+def commandTable():
+    """
+    pathdefs looked up once for both cases of every command letter:
+    {letter: (absolute letter, implicit next letter, number of params,
+              casts or None if they are all float, [(param index, 0 for x or 1 for y)] if relative)}
+    """
+    table = {}
+    for upper, (implicit, count, casts, kinds) in pathdefs.items():
+        if all(cast is float for cast in casts):
+            casts = None
+        offsets = [(i, 0 if kind == 'x' else 1) for i, kind in enumerate(kinds) if kind in ('x', 'y')]
+        table[upper] = (upper, implicit, count, casts, [])
+        table[upper.lower()] = (upper, implicit.lower(), count, casts, offsets)
+    return table
+
+commands = commandTable()
+
 def parsePath(d):
     """
     Parse SVG path and return an array of segments.
@@ -78,57 +87,49 @@ def parsePath(d):
     Converts coordinates to absolute.
     """
     retval = []
-    lexer = lexPath(d)
+    tokens = tokenPattern.findall(d)
+    count = len(tokens)
+    i = 0
 
     pen = (0.0,0.0)
     subPathStart = pen
     lastControl = pen
     lastCommand = ''
     
-    while 1:
-        try:
-            token, isCommand = lexer.next()
-        except StopIteration:
-            break
-        params = []
-        needParam = True
-        if isCommand:
-            if not lastCommand and token.upper() != 'M':
+    while i < count:
+        letter, parameter, invalid = tokens[i]
+        if letter:
+            if not lastCommand and letter.upper() != 'M':
                 raise Exception, 'Invalid path, must begin with moveto.'    
-            else:                
-                command = token
-        else:
+            command = letter
+            i += 1
+        elif invalid:
+            raise Exception, 'Invalid path data!'
+        elif lastCommand:
             #command was omited
             #use last command's implicit next command
-            needParam = False
-            if lastCommand:
-                if lastCommand.isupper():
-                    command = pathdefs[lastCommand][0]
-                else:
-                    command = pathdefs[lastCommand.upper()][0].lower()
-            else:
-                raise Exception, 'Invalid path, no initial command.'    
-        numParams = pathdefs[command.upper()][1]
-        while numParams > 0:
-            if needParam:
-                try: 
-                    token, isCommand = lexer.next()
-                    if isCommand:
-                        raise Exception, 'Invalid number of parameters'
-                except StopIteration:
-                    raise Exception, 'Unexpected end of path'
-            cast = pathdefs[command.upper()][2][-numParams]
-            param = cast(token)
-            if command.islower():
-                if pathdefs[command.upper()][3][-numParams]=='x':
-                    param += pen[0]
-                elif pathdefs[command.upper()][3][-numParams]=='y':
-                    param += pen[1]
-            params.append(param)
-            needParam = True
-            numParams -= 1
-        #segment is now absolute so
-        outputCommand = command.upper()
+            command = commands[lastCommand][1]
+        else:
+            raise Exception, 'Invalid path, no initial command.'    
+        outputCommand, implicit, numParams, casts, offsets = commands[command]
+
+        group = tokens[i:i + numParams]
+        params = [token[1] for token in group]
+        if '' in params:
+            letter, parameter, invalid = group[params.index('')]
+            if invalid:
+                raise Exception, 'Invalid path data!'
+            raise Exception, 'Invalid number of parameters'
+        if len(params) < numParams:
+            raise Exception, 'Unexpected end of path'
+        i += numParams
+        if casts is None:
+            params = map(float, params)
+        else:
+            params = [cast(param) for cast, param in zip(casts, params)]
+        for index, axis in offsets:
+            params[index] += pen[axis]
+        #segment is now absolute
     
         #Flesh out shortcut notation    
         if outputCommand in ('H','V'):
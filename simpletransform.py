@@ -22,15 +22,24 @@ This code defines several functions to make handling of transform
 attribute easier.
 '''
 import math, re
+from lrucache import LRUCache
 
-def parseTransform(transf,mat=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]):
-    if transf=="" or transf==None:
-        return(mat)
-    stransf = transf.strip()
-    result=re.match("(translate|scale|rotate|skewX|skewY|matrix)\s*\(([^)]*)\)\s*,?",stransf)
+identity = ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+
+transformPattern = re.compile(r"(translate|scale|rotate|skewX|skewY|matrix)\s*\(([^)]*)\)\s*,?")
+
+# Parsed transform attributes, as immutable matrices. Drawings tend to repeat a small
+# number of distinct transform strings, so this rarely needs to be big.
+TRANSFORM_CACHE_SIZE = 4096
+transformCache = LRUCache(TRANSFORM_CACHE_SIZE)
+
+def parseTransformFunction(name, args):
+    """
+    The matrix of one transform function, like "rotate" with args "30 10 10".
+    """
 #-- translate --
-    if result.group(1)=="translate":
-        args=result.group(2).replace(',',' ').split()
+    if name=="translate":
+        args=args.replace(',',' ').split()
         dx=float(args[0])
         if len(args)==1:
             dy=0.0
@@ -38,8 +47,8 @@ def parseTransform(transf,mat=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]):
             dy=float(args[1])
         matrix=[[1,0,dx],[0,1,dy]]
 #-- scale --
-    if result.group(1)=="scale":
-        args=result.group(2).replace(',',' ').split()
+    if name=="scale":
+        args=args.replace(',',' ').split()
         sx=float(args[0])
         if len(args)==1:
             sy=sx
@@ -47,8 +56,8 @@ def parseTransform(transf,mat=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]):
             sy=float(args[1])
         matrix=[[sx,0,0],[0,sy,0]]
 #-- rotate --
-    if result.group(1)=="rotate":
-        args=result.group(2).replace(',',' ').split()
+    if name=="rotate":
+        args=args.replace(',',' ').split()
         a=float(args[0])*math.pi/180
         if len(args)==1:
             cx,cy=(0.0,0.0)
@@ -57,23 +66,66 @@ def parseTransform(transf,mat=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]):
         matrix=[[math.cos(a),-math.sin(a),cx],[math.sin(a),math.cos(a),cy]]
         matrix=composeTransform(matrix,[[1,0,-cx],[0,1,-cy]])
 #-- skewX --
-    if result.group(1)=="skewX":
-        a=float(result.group(2))*math.pi/180
+    if name=="skewX":
+        a=float(args)*math.pi/180
         matrix=[[1,math.tan(a),0],[0,1,0]]
 #-- skewY --
-    if result.group(1)=="skewY":
-        a=float(result.group(2))*math.pi/180
+    if name=="skewY":
+        a=float(args)*math.pi/180
         matrix=[[1,0,0],[math.tan(a),1,0]]
 #-- matrix --
-    if result.group(1)=="matrix":
-        a11,a21,a12,a22,v1,v2=result.group(2).replace(',',' ').split()
+    if name=="matrix":
+        a11,a21,a12,a22,v1,v2=args.replace(',',' ').split()
         matrix=[[float(a11),float(a12),float(v1)], [float(a21),float(a22),float(v2)]]
+    return matrix
+
+def parseTransformUncached(transf,mat):
+    """
+    Composes mat with each transform function of transf in turn.
+    """
+    stransf = transf.strip()
+    while 1:
+        result=transformPattern.match(stransf)
+        mat=composeTransform(mat,parseTransformFunction(result.group(1),result.group(2)))
+        stransf=stransf[result.end():].strip()
+        if not stransf:
+            return mat
+
+def isIdentity(mat):
+    return (mat[0][0]==1 and mat[0][1]==0 and mat[0][2]==0 and
+            mat[1][0]==0 and mat[1][1]==1 and mat[1][2]==0)
+
+def parseTransform(transf,mat=identity):
+    """
+    Parses a transform attribute, composed onto mat.
+    Without mat the result is an immutable matrix remembered for the next time
+    the same attribute is seen, and any identity transform is returned as identity.
+    """
+    if transf=="" or transf==None:
+        return(mat)
+    if mat is not identity:
+        return parseTransformUncached(transf,mat)
+    matrix=transformCache.get(transf)
+    if matrix is None:
+        matrix=parseTransformUncached(transf,mat)
+        if isIdentity(matrix):
+            matrix=identity
+        else:
+            matrix=(tuple(matrix[0]),tuple(matrix[1]))
+        transformCache.put(transf,matrix)
+    return matrix
 
-    matrix=composeTransform(mat,matrix)
-    if result.end() < len(stransf):
-        return(parseTransform(stransf[result.end():], matrix))
-    else:
-        return matrix
+def composeTransformAttribute(mat,transf):
+    """
+    Same as composeTransform(mat,parseTransform(transf)), but returns mat itself
+    when transf is missing or amounts to the identity.
+    """
+    if not transf:
+        return mat
+    matrix=parseTransform(transf)
+    if matrix is identity:
+        return mat
+    return composeTransform(mat,matrix)
 
 def formatTransform(mat):
     return ("matrix(%f,%f,%f,%f,%f,%f)" % (mat[0][0], mat[1][0], mat[0][1], mat[1][1], mat[0][2], mat[1][2]))
@@ -0,0 +1,108 @@
+# Polyline simplification with the Ramer-Douglas-Peucker algorithm.
+# Drops the vertices of flattened outlines that lie within a tolerance of the
+# simplified outline, so polygons carry no more detail than the output can show.
+# Runs on the final, scaled points, so the tolerance is in output millimetres.
+# TODO comments, license
+
+import fastgeom
+from rawobjects import CIRCLE
+
+try:
+   import numpy
+except ImportError:
+   numpy = None
+
+
+# Spans with at least this many points are measured with NumPy, shorter ones in plain Python
+VECTORIZE_MIN = 64
+
+
+def farthestPoint(xs, ys, first, last):
+   """ Returns (index, squared distance) of the point strictly between first and last
+       that is farthest from the segment joining them. """
+   x0, y0, x1, y1 = xs[first], ys[first], xs[last], ys[last]
+   best = first
+   bestDistance = -1.0
+   for i in range(first + 1, last):
+      d = fastgeom.segmentDistanceSquared(xs[i], ys[i], x0, y0, x1, y1)
+      if d > bestDistance:
+         best = i
+         bestDistance = d
+   return best, bestDistance
+
+
+def farthestPointVectorized(xs, ys, first, last):
+   """ Same as farthestPoint, but xs and ys are NumPy arrays and the distances are computed all at once. """
+   x0, y0, x1, y1 = xs[first], ys[first], xs[last], ys[last]
+   px = xs[first + 1:last]
+   py = ys[first + 1:last]
+   dx = x1 - x0
+   dy = y1 - y0
+   c1 = (px - x0) * dx + (py - y0) * dy
+   c2 = dx * dx + dy * dy
+   d0 = (x0 - px) * (x0 - px) + (y0 - py) * (y0 - py)
+   d1 = (x1 - px) * (x1 - px) + (y1 - py) * (y1 - py)
+   with numpy.errstate(divide="ignore", invalid="ignore"):
+      cross = dx * (y0 - py) - (x0 - px) * dy
+      perp = cross * cross / c2
+   d = numpy.where(c1 <= 0, d0, numpy.where(c2 <= c1, d1, perp))
+   i = int(numpy.argmax(d))
+   return first + 1 + i, float(d[i])
+
+
+def simplifyPoints(points, tolerance):
+   """ Simplifies a list of (x, y) points, keeping the first and last one and every point
+       needed to stay within tolerance of the original. Uses an explicit stack instead of
+       recursion, so even a million point outline can't overflow anything.
+       Outlines that would collapse to fewer than 3 points are returned unchanged. """
+   count = len(points)
+   if count < 3 or tolerance <= 0:
+      return list(points)
+
+   xs = [p[0] for p in points]
+   ys = [p[1] for p in points]
+   if numpy is not None and count >= VECTORIZE_MIN:
+      xsArray = numpy.array(xs)
+      ysArray = numpy.array(ys)
+
+   tolerance2 = tolerance * tolerance
+   keep = bytearray(count)
+   keep[0] = keep[count - 1] = 1
+   stack = [(0, count - 1)]
+   while stack:
+      first, last = stack.pop()
+      if last - first < 2:
+         continue
+      if numpy is not None and last - first >= VECTORIZE_MIN:
+         index, distance = farthestPointVectorized(xsArray, ysArray, first, last)
+      else:
+         index, distance = farthestPoint(xs, ys, first, last)
+      if distance > tolerance2:
+         keep[index] = 1
+         stack.append( (index, last) )
+         stack.append( (first, index) )
+
+   result = [p for p, k in zip(points, keep) if k]
+   if len(result) < 3:
+      return list(points)
+   return result
+
+
+class Simplifier:
+   """ Simplifies raw objects as they go past, counting the vertices before and after. """
+
+   def __init__(self, tolerance):
+      self.tolerance = tolerance
+      self.pointsBefore = 0
+      self.pointsAfter = 0
+
+   def simplifyObjects(self, objects):
+      """ Yields each raw object (fill, points) of objects with its points simplified. Circles are left alone. """
+      for fill, points in objects:
+         if fill == CIRCLE:
+            yield fill, points
+            continue
+         simplified = simplifyPoints(points, self.tolerance)
+         self.pointsBefore += len(points)
+         self.pointsAfter += len(simplified)
+         yield fill, simplified
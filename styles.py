@@ -0,0 +1,190 @@
+# Style resolution: works out the fill, fill rule, stroke, display and visibility
+# of each element from its presentation attributes, the rules of the document's
+# <style> elements and its style attribute, inheriting from its parent like CSS.
+# Each distinct style string is only parsed once, the <style> rules are indexed by
+# id, class and tag once per document, and the computed style of an element is
+# shared by every element with the same parent style and the same declarations.
+# Only simple selectors (tag, .class, #id, *, and combinations like path.logo) are
+# understood; rules with any other selector are ignored.
+# TODO comments, license
+
+import re
+from collections import namedtuple
+
+
+ComputedStyle = namedtuple("ComputedStyle", "fill, fillRule, stroke, display, visibility")
+
+# (property, ComputedStyle field, inherited?)
+PROPERTIES = [("fill", "fill", True),
+              ("fill-rule", "fillRule", True),
+              ("stroke", "stroke", True),
+              ("display", "display", False),
+              ("visibility", "visibility", True)]
+
+# The style around the document. This converter has always treated a path without any
+# fill as unfilled, so the fill starts out as none rather than SVG's black.
+INITIAL_STYLE = ComputedStyle(fill="none", fillRule="nonzero", stroke="none", display="inline", visibility="visible")
+
+commentPattern = re.compile(r"/\*.*?\*/", re.S)
+rulePattern = re.compile(r"([^{}]*)\{([^{}]*)\}")
+selectorPattern = re.compile(r"^(\*|[A-Za-z][\w-]*)?((?:[.#][\w-]+)*)$")
+selectorPartPattern = re.compile(r"([.#])([\w-]+)")
+
+
+def parseDeclarations(text):
+   """ Parses CSS declarations like a style attribute into a dict, lowercasing the property
+       names and dropping !important. Malformed declarations are skipped. """
+   declarations = {}
+   for declaration in text.split(";"):
+      name, colon, value = declaration.partition(":")
+      if not colon:
+         continue
+      value = value.strip()
+      if value.endswith("!important"):
+         value = value[:-len("!important")].strip()
+      declarations[name.strip().lower()] = value
+   return declarations
+
+
+def parseSelector(selector):
+   """ Returns (tag or None, [classes], id or None) for a simple selector, or None for anything else. """
+   match = selectorPattern.match(selector.strip())
+   if match is None or not match.group(0):
+      return None
+   tag = match.group(1)
+   classes = []
+   id = None
+   for kind, name in selectorPartPattern.findall(match.group(2)):
+      if kind == ".":
+         classes.append(name)
+      elif id is None or id == name:
+         id = name
+      else:
+         return None # Can never match
+   return (None if tag in (None, "*") else tag), classes, id
+
+
+def localName(tag):
+   return tag.rpartition("}")[2]
+
+
+class StyleResolver:
+   """ Resolves the computed style of elements. Add the text of each <style> element with
+       addStyleSheet, then call resolve for each element with the computed style of its parent. """
+
+   def __init__(self):
+      self.declarationCache = {} # style or rule text -> parsed declarations
+      self.rules = {} # "#id", ".class", tag or "*" -> [(specificity, order, tag, classes, id, declarations)]
+      self.ruleCount = 0
+      self.hasIdRules = False
+      self.matchCache = {} # (tag, class, id) -> declarations of the matching rules, in cascade order
+      self.resolveCache = {} # (parent, tag, class, id, style, presentation attributes) -> ComputedStyle
+
+   def declarations(self, text):
+      """ parseDeclarations, remembered for each distinct text. The result must not be changed. """
+      declarations = self.declarationCache.get(text)
+      if declarations is None:
+         declarations = parseDeclarations(text)
+         self.declarationCache[text] = declarations
+      return declarations
+
+   def addStyleSheet(self, text):
+      """ Indexes the rules of a style sheet, the text of a <style> element. """
+      if not text:
+         return
+      for selectors, body in rulePattern.findall(commentPattern.sub("", text)):
+         declarations = self.declarations(body)
+         for selector in selectors.split(","):
+            parsed = parseSelector(selector)
+            if parsed is None:
+               continue
+            tag, classes, id = parsed
+            specificity = (1 if id else 0, len(classes), 1 if tag else 0)
+            if id:
+               key = "#" + id
+               self.hasIdRules = True
+            elif classes:
+               key = "." + classes[0]
+            else:
+               key = tag or "*"
+            self.rules.setdefault(key, []).append( (specificity, self.ruleCount, tag, classes, id, declarations) )
+            self.ruleCount += 1
+      self.matchCache = {}
+      self.resolveCache = {}
+
+   def matchingDeclarations(self, tag, classAttribute, id):
+      """ The declarations of every rule matching an element, lowest priority first. """
+      key = (tag, classAttribute, id)
+      matched = self.matchCache.get(key)
+      if matched is not None:
+         return matched
+
+      classes = classAttribute.split() if classAttribute else []
+      candidates = list(self.rules.get("*", []))
+      if tag:
+         candidates.extend(self.rules.get(tag, []))
+      for name in set(classes):
+         candidates.extend(self.rules.get("." + name, []))
+      if id:
+         candidates.extend(self.rules.get("#" + id, []))
+
+      matched = []
+      for specificity, order, ruleTag, ruleClasses, ruleId, declarations in sorted(candidates):
+         if ruleTag and ruleTag != tag:
+            continue
+         if ruleId and ruleId != id:
+            continue
+         if any(name not in classes for name in ruleClasses):
+            continue
+         matched.append(declarations)
+      self.matchCache[key] = matched
+      return matched
+
+   def resolve(self, node, parent=INITIAL_STYLE):
+      """ Returns the ComputedStyle of the element node, given the ComputedStyle of its parent. """
+      tag = node.tag
+      tag = localName(tag) if isinstance(tag, basestring) else None
+      classAttribute = node.get("class")
+      # Ids only make a difference if some rule selects by id, and leaving them out otherwise
+      # lets elements with the same style share one cache entry
+      id = node.get("id") if self.hasIdRules else None
+      style = node.get("style")
+      attributes = tuple(node.get(name) for name, field, inherited in PROPERTIES)
+
+      key = (parent, tag, classAttribute, id, style, attributes)
+      computed = self.resolveCache.get(key)
+      if computed is not None:
+         return computed
+
+      # Cascade: presentation attributes, then style sheet rules, then the style attribute
+      specified = {}
+      for (name, field, inherited), value in zip(PROPERTIES, attributes):
+         if value is not None:
+            specified[name] = value.strip()
+      if self.rules:
+         for declarations in self.matchingDeclarations(tag, classAttribute, id):
+            specified.update(declarations)
+      if style:
+         specified.update(self.declarations(style))
+
+      values = {}
+      for name, field, inherited in PROPERTIES:
+         value = specified.get(name)
+         if value is None or value == "inherit":
+            value = getattr(parent if inherited or value == "inherit" else INITIAL_STYLE, field)
+         values[field] = value
+      computed = ComputedStyle(**values)
+      self.resolveCache[key] = computed
+      return computed
+
+   def isFilled(self, style):
+      return style.fill != "none"
+
+   def isEvenOdd(self, style):
+      return style.fillRule == "evenodd"
+
+   def isDisplayed(self, style):
+      return style.display != "none"
+
+   def isVisible(self, style):
+      return style.visibility not in ("hidden", "collapse")
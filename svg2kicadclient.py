@@ -0,0 +1,119 @@
+# Thin client for svg2kicadserver.py: sends a svg2kicadmod.py command line to the daemon
+# and prints what the conversion printed, exiting with its status, so it can stand in
+# for svg2kicadmod.py wherever that is called many times, as in a CI pipeline.
+# It deliberately imports nothing but the standard library modules it needs, so that
+# starting it costs as little as possible.
+# Run as: python svg2kicadclient.py [--socket PATH | --port N [--token-file FILE]] <svg2kicadmod.py arguments>
+#         python svg2kicadclient.py [--socket PATH | --port N [--token-file FILE]] --ping | --shutdown
+# Over a TCP port every request carries the token the daemon wrote to its token file,
+# which only the user running it can read.
+# Relative file names are resolved in the current directory. An input of - (given first)
+# reads the SVG from the standard input, an output of - writes the .kicad_mod to the
+# standard output, and the converter's messages then go to the standard error.
+# TODO comments, license
+
+import os
+import sys
+import json
+import socket
+import tempfile
+
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "svg2kicad-%s.sock" % (os.getuid() if hasattr(os, "getuid") else "user"))
+
+
+def defaultTokenFile(port):
+   """ Where the daemon listening on port keeps its token, next to the conversion cache. """
+   base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+   return os.path.join(base, "svg2kicadmod", "daemon-%d.token" % port)
+
+
+def readToken(tokenFile):
+   with open(tokenFile, "r") as fid:
+      return fid.read().strip()
+
+
+def sendRequest(request, socketPath=DEFAULT_SOCKET, port=None, tokenFile=None):
+   """ Sends one request to the daemon and returns its response. Requests over a TCP port
+       carry the token from tokenFile, by default the daemon's own. """
+   if port is not None:
+      request = dict(request, token=readToken(tokenFile or defaultTokenFile(port)))
+      connection = socket.create_connection(("127.0.0.1", port))
+   else:
+      connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      connection.connect(socketPath)
+   try:
+      connection.sendall(json.dumps(request))
+      connection.shutdown(socket.SHUT_WR)
+      chunks = []
+      while True:
+         chunk = connection.recv(65536)
+         if not chunk:
+            break
+         chunks.append(chunk)
+   finally:
+      connection.close()
+   return json.loads("".join(chunks))
+
+
+def convertRequest(argv, cwd=None, svg=None):
+   """ The request for converting with the svg2kicadmod.py arguments argv. """
+   request = {"argv": argv, "cwd": cwd or os.getcwd()}
+   if svg is not None:
+      request["svg"] = svg
+   return request
+
+
+def splitArguments(argv):
+   """ Separates the client's own options from the arguments for svg2kicadmod.py.
+       Returns (socket path, port, token file or None, command or None, remaining arguments). """
+   socketPath = DEFAULT_SOCKET
+   port = None
+   tokenFile = None
+   command = None
+   rest = []
+   index = 0
+   while index < len(argv):
+      argument = argv[index]
+      if argument in ("--socket", "--port", "--token-file") and index + 1 < len(argv):
+         if argument == "--socket":
+            socketPath = argv[index + 1]
+         elif argument == "--port":
+            port = int(argv[index + 1])
+         else:
+            tokenFile = argv[index + 1]
+         index += 2
+         continue
+      if argument in ("--ping", "--shutdown"):
+         command = argument[2:]
+      else:
+         rest.append(argument)
+      index += 1
+   return socketPath, port, tokenFile, command, rest
+
+
+def writeText(stream, text):
+   if text:
+      stream.write(text.encode("utf-8"))
+
+
+if __name__ == "__main__":
+   socketPath, port, tokenFile, command, argv = splitArguments(sys.argv[1:])
+   if command is not None:
+      request = {"command": command}
+   else:
+      svg = sys.stdin.read().decode("utf-8") if argv[:1] == ["-"] else None
+      request = convertRequest(argv, svg=svg)
+
+   try:
+      response = sendRequest(request, socketPath, port, tokenFile)
+   except (socket.error, IOError) as e:
+      sys.stderr.write("Can't reach svg2kicadserver.py at %s: %s\n" % (port if port is not None else socketPath, e))
+      sys.exit(1)
+
+   output = response.get("output")
+   # With the drawing on the standard output, the messages go to the standard error
+   writeText(sys.stderr if output is not None else sys.stdout, response.get("stdout"))
+   writeText(sys.stderr, response.get("stderr"))
+   writeText(sys.stdout, output)
+   sys.exit(response.get("status", 1))
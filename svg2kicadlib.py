@@ -0,0 +1,180 @@
+# Batch converter: turns many SVG files into a KiCad .pretty footprint library,
+# spreading the conversions over a pool of worker processes so the interpreter
+# and lxml start up once per worker instead of once per file.
+# TODO comments, license
+
+import os
+import sys
+import glob
+import json
+import time
+import fnmatch
+import argparse
+import traceback
+import multiprocessing
+
+from SvgParser import SvgParser
+import svg2kicadmod
+
+
+usageNotes = """Inputs can be SVG files, directories (every *.svg directly inside them) or glob patterns.
+Each footprint is named after its SVG file and written as <library>.pretty/<name>.kicad_mod.
+
+The --options file is a JSON object mapping glob patterns, matched against the SVG file
+name, to option overrides for the files that match, for example:
+   {"*_logo.svg": {"width": 8.0}, "copper_*.svg": {"layer": "F.Cu", "height": 5.0}}
+Recognized options are layer, width, height, name, lineWidth, smoothness, tolerance, flattener, flipY,
+stream, pathMemoSize, simplifyTolerance, bridgeHoles and mergePolygons.
+When several patterns match a file they are applied in file order, later ones winning.
+"""
+
+
+def findSvgFiles(inputs):
+   """ Expands the input directories and glob patterns into a sorted list of SVG files, without duplicates. """
+   found = []
+   for pattern in inputs:
+      if os.path.isdir(pattern):
+         matches = glob.glob(os.path.join(pattern, "*.svg"))
+      else:
+         matches = glob.glob(pattern)
+      for filename in sorted(matches):
+         filename = os.path.normpath(filename)
+         if filename not in found:
+            found.append(filename)
+   return found
+
+
+def loadOptionOverrides(filename):
+   """ Reads the --options file, returning a list of (pattern, options) pairs in file order. """
+   if not filename:
+      return []
+   with open(filename, "r") as fid:
+      return json.load(fid, object_pairs_hook=lambda pairs: pairs)
+
+
+def optionsForFile(filename, defaults, overrides):
+   options = dict(defaults)
+   options["name"] = os.path.splitext(os.path.basename(filename))[0]
+   for pattern, override in overrides:
+      if fnmatch.fnmatch(os.path.basename(filename), pattern):
+         options.update(dict(override))
+   return options
+
+
+def convertJob(job):
+   """ Runs in a worker process. Converts one file, returning (filename, output, seconds, cached, error),
+       where error is None on success. The converter's progress messages are discarded. """
+   filename, output, options, cache = job
+   options = dict(options)
+   start = time.time()
+   stdout = sys.stdout
+   sys.stdout = open(os.devnull, "w")
+   try:
+      cached = svg2kicadmod.convert(filename, output, options.pop("layer"), options.pop("width"), options.pop("height"),
+                           cache=cache, **options)
+      error = None
+   except (Exception, SystemExit):
+      # SystemExit too, which would otherwise stop the batch, or kill the pool worker and hang it
+      cached = False
+      error = traceback.format_exc().strip().splitlines()[-1]
+   finally:
+      sys.stdout.close()
+      sys.stdout = stdout
+   return filename, output, time.time() - start, cached, error
+
+
+def runJobs(jobs, processes):
+   """ Yields the result of convertJob for each job as they complete. """
+   if processes == 1:
+      for job in jobs:
+         yield convertJob(job)
+      return
+   pool = multiprocessing.Pool(processes)
+   try:
+      for result in pool.imap_unordered(convertJob, jobs):
+         yield result
+   finally:
+      pool.close()
+      pool.join()
+
+
+def parseArguments(argv):
+   parser = argparse.ArgumentParser(description="Convert many SVG files into a KiCad .pretty footprint library.",
+                                    epilog=usageNotes, formatter_class=argparse.RawDescriptionHelpFormatter)
+   parser.add_argument("inputs", nargs="+", help="SVG files, directories or glob patterns")
+   parser.add_argument("-o", "--output", required=True, help="Footprint library directory, normally ending in .pretty")
+   parser.add_argument("--layer", default="F.SilkS", help="Layer for every footprint (default: %(default)s)")
+   parser.add_argument("--width", type=float, default=0.0, help="Target width in mm, see svg2kicadmod.py")
+   parser.add_argument("--height", type=float, default=0.0, help="Target height in mm, see svg2kicadmod.py")
+   parser.add_argument("--line-width", type=float, default=0.01, help="Polygon outline width in mm (default: %(default)s)")
+   parser.add_argument("--smoothness", type=float, default=0.1, help="Flattening tolerance in SVG user units (default: %(default)s)")
+   parser.add_argument("--tolerance", type=float, default=0.0, metavar="MM", help="Flattening tolerance in output mm, see svg2kicadmod.py")
+   parser.add_argument("--flattener", choices=SvgParser.flatteners, default=SvgParser.FLATTEN_CSPSUBDIV,
+                       help="Bezier flattening backend (default: %(default)s)")
+   parser.add_argument("--stream", action="store_true", help="Use the streaming converter for every file")
+   parser.add_argument("--path-memo", type=int, default=0, metavar="POINTS", help="Path memo size, see svg2kicadmod.py")
+   parser.add_argument("--simplify", type=float, default=0.0, metavar="MM", help="Simplification tolerance, see svg2kicadmod.py")
+   parser.add_argument("--no-bridge-holes", dest="bridge_holes", action="store_false", help="See svg2kicadmod.py")
+   parser.add_argument("--merge", action="store_true", help="Merge overlapping filled polygons, see svg2kicadmod.py")
+   parser.add_argument("--flip-y", action="store_true", help="Mirror every drawing vertically")
+   parser.add_argument("--options", help="JSON file of per-file option overrides, see below")
+   svg2kicadmod.addCacheArguments(parser)
+   parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(),
+                       help="Number of worker processes (default: one per CPU, %(default)s here)")
+   return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+   args = parseArguments(sys.argv[1:])
+
+   filenames = findSvgFiles(args.inputs)
+   if not filenames:
+      print "No SVG files found."
+      sys.exit(1)
+
+   defaults = {"layer": args.layer, "width": args.width, "height": args.height, "lineWidth": args.line_width,
+               "smoothness": args.smoothness, "tolerance": args.tolerance, "flattener": args.flattener, "flipY": args.flip_y,
+               "stream": args.stream, "pathMemoSize": args.path_memo, "simplifyTolerance": args.simplify,
+               "bridgeHoles": args.bridge_holes, "mergePolygons": args.merge}
+   overrides = loadOptionOverrides(args.options)
+   cache = svg2kicadmod.cacheFromArguments(args)
+
+   if not os.path.isdir(args.output):
+      os.makedirs(args.output)
+
+   jobs = []
+   failures = []
+   outputs = {}
+   for filename in filenames:
+      options = optionsForFile(filename, defaults, overrides)
+      output = os.path.join(args.output, options["name"] + ".kicad_mod")
+      if output in outputs:
+         failures.append( (filename, "Footprint name '%s' is already used by %s" % (options["name"], outputs[output])) )
+         continue
+      outputs[output] = filename
+      jobs.append( (filename, output, options, cache) )
+
+   print "Converting %d files into %s with %d processes..." % (len(jobs), args.output, args.jobs)
+   start = time.time()
+   converted = 0
+   cacheHits = 0
+   inputBytes = 0
+   for filename, output, seconds, cached, error in runJobs(jobs, max(1, args.jobs)):
+      if error is None:
+         converted += 1
+         cacheHits += cached
+         inputBytes += os.path.getsize(filename)
+      else:
+         failures.append( (filename, error) )
+         print "FAILED %s: %s" % (filename, error)
+   elapsed = time.time() - start
+
+   print "Converted %d of %d files in %.2f s (%.1f files/s, %.2f MB/s of SVG)" % (
+      converted, len(filenames), elapsed, converted / max(elapsed, 1e-9), inputBytes / 1e6 / max(elapsed, 1e-9))
+   if cache is not None:
+      print "%d of them were reused from the cache in %s" % (cacheHits, cache.directory)
+   if failures:
+      print "%d failures:" % len(failures)
+      for filename, error in failures:
+         print "   %s: %s" % (filename, error)
+      sys.exit(1)
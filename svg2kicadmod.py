@@ -1,58 +1,173 @@
 # TODO comments, license
 
+__version__ = "0.2"
+
+import os
 import sys
+import glob
 import math
+import hashlib
+import argparse
+
+import simpletransform
 
 from SvgParser import SvgParser
+from rawobjects import BoundingBox
+from simplify import Simplifier
+from union import PolygonMerger
 
 from KicadPcbnewModuleWriter import writeRawObjectsToKicadPcbnewModuleFile
+from conversioncache import ConversionCache, DEFAULT_MAX_BYTES
+from instrumentation import Recorder, ConversionProfile, ElementCosts, combineRecorders
 
 
-def usageAndExit():
-   print """Usage: %s input output layer [width [height]]
-Notes: input and output are filenames
+usageNotes = """Notes: input and output are filenames
        layer is a string like "F.SilkS" or TODO
        width and height are dimensions in mm.
           If you specify a non-zero width, scale the output to match that width.
           If you specify a zero width and non-zero height, scale the output to match that height.
           If both width and height are non-zero, scale the output to be no larger than either.
           If neither are specified or both zero, no scaling is performed, and YMMV.
-          """ % sys.argv[0]
-   sys.exit(1)
+          """
 
-if __name__ == "__main__":
 
-   # TODO make this properly parse the command line options
-   # TODO what about flipping the y coordinate? Isn't inkscape upside down from kicad?
-   # TODO add options for the module name and line width
-   if len(sys.argv) < 4:
-      usageAndExit()
-
-   filename = sys.argv[1]
-   output = sys.argv[2]
-   layer = sys.argv[3]
-
-   width_mm = 0.0
-   height_mm = 0.0
-   try:
-      if len(sys.argv) >= 5:
-         width_mm = float(sys.argv[4])
-      if len(sys.argv) == 6:
-         height_mm = float(sys.argv[5])
-   except:
-      print "Width and height must be specified as floats or ints."
-      usageAndExit()
-
-
-   sd = SvgParser(filename)
-   sd.recursivelyTraverseSvg()
-   print "Stats - min: (%f, %f), center: (%f, %f), max: (%f, %f)" % sd.findMinCenterMaxOfObjects(sd.rawObjects)
-   print "Centering drawing about (0, 0)..."
-   sd.alignObjects(horizAlign=SvgParser.ALIGN_CENTER, vertAlign=SvgParser.ALIGN_CENTER)
-   print "Stats - min: (%f, %f), center: (%f, %f), max: (%f, %f)" % sd.findMinCenterMaxOfObjects(sd.rawObjects)
+def addCacheArguments(parser):
+   parser.add_argument("--cache", action="store_true",
+                       help="Reuse earlier results for unchanged SVG files and options, see conversioncache.py")
+   parser.add_argument("--cache-dir", default=None, help="Conversion cache directory, implies --cache")
+   parser.add_argument("--cache-size", type=float, default=DEFAULT_MAX_BYTES / 1e6,
+                       help="Conversion cache size limit in MB (default: %(default)s)")
 
-   # Now we need to use the provided width and height to scale the drawing
-   xmin, ymin, xcenter, ycenter, xmax, ymax = sd.findMinCenterMaxOfObjects(sd.rawObjects)
+
+def cacheFromArguments(args):
+   """ Returns the ConversionCache asked for on the command line, or None. """
+   if not args.cache and not args.cache_dir:
+      return None
+   return ConversionCache(args.cache_dir, int(args.cache_size * 1e6))
+
+
+def parseArguments(argv, prog=None):
+   parser = argparse.ArgumentParser(prog=prog, epilog=usageNotes, formatter_class=argparse.RawDescriptionHelpFormatter)
+   parser.add_argument("input")
+   parser.add_argument("output")
+   parser.add_argument("layer")
+   parser.add_argument("width", nargs="?", type=float, default=0.0)
+   parser.add_argument("height", nargs="?", type=float, default=0.0)
+   parser.add_argument("--flattener", choices=SvgParser.flatteners, default=SvgParser.FLATTEN_CSPSUBDIV,
+                       help="Bezier flattening backend, 'batch' needs NumPy (default: %(default)s)")
+   parser.add_argument("--stream", action="store_true",
+                       help="Read the SVG in streaming passes instead of loading it all, for very large files")
+   parser.add_argument("--flip-y", action="store_true",
+                       help="Mirror the drawing vertically. KiCad's Y axis points down like SVG's, so this is off by default")
+   parser.add_argument("--name", default="TestModule",
+                       help="Module name written into the output file (default: %(default)s)")
+   parser.add_argument("--line-width", type=float, default=0.01,
+                       help="Outline width of each polygon in mm (default: %(default)s)")
+   parser.add_argument("--smoothness", type=float, default=0.1,
+                       help="Maximum distance of the flattened outline from the curves, in SVG user units (default: %(default)s)")
+   parser.add_argument("--tolerance", type=float, default=0.0, metavar="MM",
+                       help="Maximum distance of the flattened outline from the curves in output mm, "
+                            "instead of --smoothness (default: off)")
+   parser.add_argument("--path-memo", type=int, default=0, metavar="POINTS",
+                       help="Remember up to this many flattened points so repeated copies of a path are only flattened once (default: off)")
+   parser.add_argument("--no-bridge-holes", dest="bridge_holes", action="store_false",
+                       help="Run the subpaths of each path together as before, instead of cutting holes into their outlines")
+   parser.add_argument("--simplify", type=float, default=0.0, metavar="MM",
+                       help="Drop outline vertices that are within this many mm of the simplified outline (default: off)")
+   parser.add_argument("--merge", action="store_true",
+                       help="Merge overlapping filled polygons into the outline of the area they cover; "
+                            "its time grows with the number of edge crossings, so heavily overlapping "
+                            "artwork (hundreds of stacked polygons) can take seconds")
+   parser.add_argument("--verbose", action="store_true",
+                       help="Also print the traversal's debugging messages: the initial matrix, each group and unhandled tags")
+   parser.add_argument("--profile", choices=["table", "json"], default=None,
+                       help="Measure the time, CPU time and memory of each stage and count the work done, "
+                            "and report them in this format, see instrumentation.py; the cache is not used")
+   parser.add_argument("--profile-output", default=None, metavar="FILE",
+                       help="Write the --profile report to this file instead of the standard output")
+   parser.add_argument("--costs", type=int, default=0, metavar="N",
+                       help="List the N paths, shapes and clones that took the longest to flatten, were subdivided "
+                            "the deepest and emitted the most vertices (default: off); the cache is not used")
+   parser.add_argument("--costs-output", default=None, metavar="FILE",
+                       help="With --costs, also write the costs of every element to this file as JSON")
+   addCacheArguments(parser)
+   return parser.parse_args(argv)
+
+
+def printStats(stats):
+   print "Stats - min: (%f, %f), center: (%f, %f), max: (%f, %f)" % stats
+
+
+def printPathMemoStats(sd):
+   if sd.pathMemo is None:
+      return
+   stats = sd.pathMemo.stats()
+   print "Path memo: %d hits, %d misses (%.1f%% hit rate), %d paths holding %d points, %d evicted" % (
+      stats["hits"], stats["misses"], 100.0 * stats["hitRate"], stats["entries"], stats["cost"], stats["evictions"])
+
+
+def printInstanceStats(sd):
+   if sd.useInstances:
+      print "Clones: %d <use> instances drawn from %d flattened subtrees" % (sd.useInstances, len(sd.instanceCache))
+
+
+def simplifyObjects(objects, simplifyTolerance):
+   """ Returns objects, or a Simplifier and a generator of the simplified objects when simplifyTolerance is set. """
+   if simplifyTolerance <= 0:
+      return None, objects
+   simplifier = Simplifier(simplifyTolerance)
+   return simplifier, simplifier.simplifyObjects(objects)
+
+
+def mergeObjects(objects, mergePolygons):
+   """ Returns objects, or a PolygonMerger and a generator of the merged objects when mergePolygons is set. """
+   if not mergePolygons:
+      return None, objects
+   merger = PolygonMerger()
+   return merger, merger.mergeObjects(objects)
+
+
+def printMergeStats(merger):
+   if merger is None:
+      return
+   print "Merged: %d polygons with %d vertices into %d polygons with %d vertices" % (merger.polygonsBefore,
+      merger.pointsBefore, merger.polygonsAfter, merger.pointsAfter)
+
+
+def printSimplifyStats(simplifier):
+   if simplifier is None:
+      return
+   print "Simplified: %d vertices down to %d (%.1f%%)" % (simplifier.pointsBefore, simplifier.pointsAfter,
+      100.0 * simplifier.pointsAfter / max(simplifier.pointsBefore, 1))
+
+
+def applyTolerance(sd, width_mm, height_mm, tolerance):
+   """ Sets the smoothness of the SvgParser sd so the flattening error is at most tolerance mm
+       in the output, working out the final scale from SvgParser.estimateBounds.
+       Does nothing unless tolerance is positive. """
+   if tolerance <= 0:
+      return
+   scale = 1.0
+   if width_mm != 0.0 or height_mm != 0.0:
+      box = sd.estimateBounds()
+      if box.isEmpty():
+         return
+      scale = computeScale(box.minCenterMax(), width_mm, height_mm)
+      # The flattened drawing can be smaller than the curves by up to the smoothness on each
+      # side, which would make the final scale larger. Working the scale out again for a box
+      # that much smaller gives a smoothness that stays within tolerance at that scale too.
+      xmin, ymin, xcenter, ycenter, xmax, ymax = box.minCenterMax()
+      margin = tolerance / scale
+      if xmax - xmin > 2 * margin and ymax - ymin > 2 * margin:
+         scale = computeScale((xmin + margin, ymin + margin, xcenter, ycenter, xmax - margin, ymax - margin), width_mm, height_mm)
+   sd.smoothness = tolerance / scale
+   print "Flattening tolerance: %f mm, smoothness %f user units" % (tolerance, sd.smoothness)
+
+
+def computeScale(stats, width_mm, height_mm):
+   """ Works out the scale factor that fits a drawing with the given
+       findMinCenterMaxOfObjects stats into width_mm x height_mm. """
+   xmin, ymin, xcenter, ycenter, xmax, ymax = stats
    width = xmax - xmin
    height = ymax - ymin
    if width_mm == 0.0 and height_mm == 0.0:
@@ -70,15 +185,174 @@ if __name__ == "__main__":
       scale_height = height_mm / height
       scale_width = width_mm / width
       scale = min(scale_height, scale_width)
+   return scale
+
+
+def convertSvg(filename, output, layer, width_mm=0.0, height_mm=0.0, flattener=SvgParser.FLATTEN_CSPSUBDIV, flipY=False,
+               name="TestModule", lineWidth=0.01, smoothness=0.1, tolerance=0.0, pathMemoSize=0, simplifyTolerance=0.0,
+               bridgeHoles=True, mergePolygons=False, verbose=False, stats=None):
+   """ Converts the SVG file filename into the .kicad_mod file output, holding all the geometry in memory.
+       Centering, scaling and flipping only update the bounds and compose one transform,
+       which is applied to each point as it is written, so their cost shows up in the write stage.
+       stats is the recorder the work is reported to, see instrumentation.py. """
+   stats = stats if stats is not None else Recorder()
+   with stats.stage("load"):
+      sd = SvgParser(filename, smoothness=smoothness, flattener=flattener, pathMemoSize=pathMemoSize, bridgeHoles=bridgeHoles,
+                     verbose=verbose, stats=stats)
+   with stats.stage("estimate"):
+      applyTolerance(sd, width_mm, height_mm, tolerance)
+   with stats.stage("traverse"):
+      sd.recursivelyTraverseSvg()
+   printPathMemoStats(sd)
+   printInstanceStats(sd)
+   printStats(sd.findMinCenterMaxOfObjects(sd.rawObjects))
+   print "Centering drawing about (0, 0)..."
+   with stats.stage("align/scale"):
+      sd.alignObjects(horizAlign=SvgParser.ALIGN_CENTER, vertAlign=SvgParser.ALIGN_CENTER)
+   printStats(sd.findMinCenterMaxOfObjects(sd.rawObjects))
+
+   # Now we need to use the provided width and height to scale the drawing
+   scale = computeScale(sd.findMinCenterMaxOfObjects(sd.rawObjects), width_mm, height_mm)
 
    if scale != 1.0:
       print "Scaling by %f" % scale
-      sd.scaleRawObjects(scale)
-      print "Stats - min: (%f, %f), center: (%f, %f), max: (%f, %f)" % sd.findMinCenterMaxOfObjects(sd.rawObjects)
+      with stats.stage("align/scale"):
+         sd.scaleRawObjects(scale)
+      printStats(sd.findMinCenterMaxOfObjects(sd.rawObjects))
+
+   if flipY:
+      print "Flipping the Y axis..."
+      with stats.stage("align/scale"):
+         sd.flipObjectsVertically()
 
-   writeRawObjectsToKicadPcbnewModuleFile(output, sd.rawObjects, name="TestModule", layer=layer, lineWidth=0.01)
+   merger, objects = mergeObjects(sd.rawObjects, mergePolygons)
+   objects = stats.iterStage("merge", objects) if merger is not None else objects
+   simplifier, objects = simplifyObjects(objects, simplifyTolerance)
+   objects = stats.iterStage("simplify", objects) if simplifier is not None else objects
+   with stats.stage("write"):
+      writeRawObjectsToKicadPcbnewModuleFile(output, stats.written(objects), name=name, layer=layer, lineWidth=lineWidth)
+   printMergeStats(merger)
+   printSimplifyStats(simplifier)
 
    #for fill, points in sd.rawObjects:
       #print "Filled object" if fill else "Unfilled object"
       #print "\n".join(["%f, %f" % (n[0], n[1]) for n in points])
 
+
+def convertSvgStreaming(filename, output, layer, width_mm=0.0, height_mm=0.0, flattener=SvgParser.FLATTEN_CSPSUBDIV, flipY=False,
+                        name="TestModule", lineWidth=0.01, smoothness=0.1, tolerance=0.0, pathMemoSize=0, simplifyTolerance=0.0,
+                        bridgeHoles=True, mergePolygons=False, verbose=False, stats=None):
+   """ Same as convertSvg, but reads the SVG file twice instead of keeping its geometry in memory:
+       the first pass only finds the bounds, the second transforms and writes each polygon as it comes. """
+   stats = stats if stats is not None else Recorder()
+   with stats.stage("load"):
+      sd = SvgParser(filename, smoothness=smoothness, flattener=flattener, stream=True, pathMemoSize=pathMemoSize,
+                     bridgeHoles=bridgeHoles, verbose=verbose, stats=stats)
+   with stats.stage("estimate"):
+      applyTolerance(sd, width_mm, height_mm, tolerance)
+   box = BoundingBox()
+   for fill, points in stats.iterStage("traverse", sd.iterRawObjects()):
+      box.addPoints(points)
+   printStats(box.minCenterMax())
+   print "Centering drawing about (0, 0)..."
+   xsub, ysub = sd.alignmentOffsets(box.minCenterMax(), horizAlign=SvgParser.ALIGN_CENTER, vertAlign=SvgParser.ALIGN_CENTER)
+   mat = [[1.0, 0.0, -xsub], [0.0, 1.0, -ysub]]
+   box.transform(mat)
+   printStats(box.minCenterMax())
+
+   scale = computeScale(box.minCenterMax(), width_mm, height_mm)
+   if scale != 1.0:
+      print "Scaling by %f" % scale
+      matScale = [[scale, 0.0, 0.0], [0.0, scale, 0.0]]
+      mat = simpletransform.composeTransform(matScale, mat)
+      box.transform(matScale)
+      printStats(box.minCenterMax())
+
+   if flipY:
+      print "Flipping the Y axis..."
+      mat = simpletransform.composeTransform([[1.0, 0.0, 0.0], [0.0, -1.0, 0.0]], mat)
+
+   objects = stats.iterStage("align/scale", sd.iterTransformedObjects(stats.iterStage("traverse", sd.iterRawObjects()), mat))
+   # Merging has to see every object before it can write any of them
+   merger, objects = mergeObjects(objects, mergePolygons)
+   objects = stats.iterStage("merge", objects) if merger is not None else objects
+   simplifier, objects = simplifyObjects(objects, simplifyTolerance)
+   objects = stats.iterStage("simplify", objects) if simplifier is not None else objects
+   with stats.stage("write"):
+      writeRawObjectsToKicadPcbnewModuleFile(output, stats.written(objects), name=name, layer=layer, lineWidth=lineWidth)
+   printMergeStats(merger)
+   printSimplifyStats(simplifier)
+   printPathMemoStats(sd)
+   printInstanceStats(sd)
+
+
+# Options that only change how the work is done, not the file that comes out. Streaming
+# reads the same <style> rules and <use> targets as loading the whole document does
+outputNeutralOptions = ["flattener", "stream", "verbose", "pathMemoSize"]
+
+
+sourceDigests = [] # the digest of codeVersion, worked out once
+
+
+def codeVersion():
+   """ __version__ together with a hash of the converter's source files, which goes into the
+       cache keys, so that cached results are dropped whenever the code changes and not only
+       when the version number is bumped. """
+   if not sourceDigests:
+      digest = hashlib.sha256()
+      for filename in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+         digest.update(os.path.basename(filename) + "\0")
+         with open(filename, "rb") as fid:
+            digest.update(fid.read())
+      sourceDigests.append(digest.hexdigest()[:16])
+   return "%s+%s" % (__version__, sourceDigests[0])
+
+
+def convert(filename, output, layer, width_mm=0.0, height_mm=0.0, stream=False, cache=None, stats=None, **options):
+   """ Converts filename into output with convertSvgStreaming if stream is set, convertSvg otherwise.
+       The remaining keyword options are passed through to them, and so is stats, the recorder
+       of a profile (see instrumentation.py), which should only be given without a cache.
+       If cache is a ConversionCache, a previous result for the same SVG contents and
+       options is copied to output instead, without parsing the SVG at all.
+       Returns True if the result came from the cache. """
+   if cache is not None:
+      with open(filename, "rb") as fid:
+         svgBytes = fid.read()
+      keyOptions = dict(options, layer=layer, width=width_mm, height=height_mm, stream=stream)
+      for option in outputNeutralOptions:
+         keyOptions.pop(option, None)
+      key = cache.makeKey(svgBytes, keyOptions, codeVersion())
+      if cache.fetch(key, output):
+         print "Reused cached conversion %s" % key
+         return True
+
+   if stream:
+      convertSvgStreaming(filename, output, layer, width_mm, height_mm, stats=stats, **options)
+   else:
+      convertSvg(filename, output, layer, width_mm, height_mm, stats=stats, **options)
+
+   if cache is not None:
+      cache.store(key, output)
+   return False
+
+
+def run(args):
+   """ Does what the command line asked for, given the arguments from parseArguments. """
+   profile = ConversionProfile() if args.profile else None
+   costs = ElementCosts() if args.costs > 0 else None
+   stats = combineRecorders([profile, costs])
+   # A profile or costs of a result copied from the cache would measure nothing
+   cache = cacheFromArguments(args) if stats is None else None
+   convert(args.input, args.output, args.layer, args.width, args.height, stream=args.stream, cache=cache, stats=stats,
+           flattener=args.flattener, flipY=args.flip_y, name=args.name, lineWidth=args.line_width, smoothness=args.smoothness,
+           tolerance=args.tolerance, pathMemoSize=args.path_memo, simplifyTolerance=args.simplify,
+           bridgeHoles=args.bridge_holes, mergePolygons=args.merge, verbose=args.verbose)
+   if profile is not None:
+      profile.report(args.profile, args.profile_output)
+   if costs is not None:
+      costs.report(args.costs, args.costs_output)
+
+
+if __name__ == "__main__":
+
+   run(parseArguments(sys.argv[1:]))
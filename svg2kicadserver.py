@@ -0,0 +1,235 @@
+# Conversion daemon: keeps a pool of worker processes with the converter already
+# imported, and runs svg2kicadmod.py command lines sent to it over a Unix socket (or a
+# localhost TCP port), so each conversion costs the conversion alone instead of an
+# interpreter start and the lxml and NumPy imports as well. svg2kicadclient.py is the
+# command that talks to it, taking the same arguments as svg2kicadmod.py.
+# A conversion writes files wherever its command line says, as the user running the
+# daemon, so only that user may send requests: the Unix socket is created readable
+# and writable by its owner alone, and on a TCP port, which any local user can connect
+# to, every request must carry a random token the daemon writes to a file only its
+# owner can read when it starts.
+# Protocol: the client connects, sends one JSON request and closes its side, the server
+# answers with one JSON response and closes the connection.
+#    request   {"argv": [svg2kicadmod.py arguments], "cwd": directory to run them in,
+#               "svg": SVG text when the input is "-", "token": the token, over TCP}
+#          or  {"command": "ping"} / {"command": "shutdown"}, with the token over TCP
+#    response  {"status": exit status, "stdout": text, "stderr": text,
+#               "output": the .kicad_mod text when the output is "-", "seconds": time spent}
+# TODO comments, license
+
+import os
+import sys
+import hmac
+import json
+import time
+import errno
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import traceback
+import SocketServer
+import multiprocessing
+from StringIO import StringIO
+
+import svg2kicadmod
+from svg2kicadclient import defaultTokenFile
+
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "svg2kicad-%s.sock" % (os.getuid() if hasattr(os, "getuid") else "user"))
+
+
+def ignoreInterrupts():
+   # Worker processes leave Ctrl-C to the daemon, which stops them in an orderly way
+   signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def runRequest(request):
+   """ Runs in a worker process. Runs one svg2kicadmod.py command line like the script would,
+       capturing what it prints, and returns the response. """
+   start = time.time()
+   stdout, stderr = sys.stdout, sys.stderr
+   sys.stdout, sys.stderr = StringIO(), StringIO()
+   temporary = []
+   output = None
+   status = 0
+   try:
+      # Each worker runs one conversion at a time, so it can change directory for it
+      os.chdir(request.get("cwd") or "/")
+      args = svg2kicadmod.parseArguments(request["argv"], prog="svg2kicadmod.py")
+      if args.input == "-":
+         fid, args.input = tempfile.mkstemp(suffix=".svg")
+         temporary.append(args.input)
+         with os.fdopen(fid, "w") as svgFile:
+            svgFile.write((request.get("svg") or u"").encode("utf-8"))
+      returnOutput = args.output == "-"
+      if returnOutput:
+         fid, args.output = tempfile.mkstemp(suffix=".kicad_mod")
+         os.close(fid)
+         temporary.append(args.output)
+      svg2kicadmod.run(args)
+      if returnOutput:
+         with open(args.output, "r") as fid:
+            output = fid.read().decode("utf-8")
+   except SystemExit as e:
+      # From argparse, for --help and bad arguments
+      status = e.code if isinstance(e.code, int) else 1
+   except Exception:
+      traceback.print_exc()
+      status = 1
+   finally:
+      captured = sys.stdout.getvalue(), sys.stderr.getvalue()
+      sys.stdout, sys.stderr = stdout, stderr
+      for filename in temporary:
+         os.remove(filename)
+   return {"status": status, "stdout": captured[0], "stderr": captured[1], "output": output,
+           "seconds": time.time() - start}
+
+
+class ConversionHandler(SocketServer.StreamRequestHandler):
+
+   def handle(self):
+      data = self.rfile.read()
+      if not data:
+         # Nothing asked, like the probe of removeStaleSocket
+         return
+      try:
+         request = json.loads(data)
+      except ValueError:
+         response = {"status": 1, "stdout": "", "stderr": "Malformed request\n", "output": None}
+      else:
+         response = self.server.respond(request)
+      self.wfile.write(json.dumps(response))
+
+
+class ConversionServer(SocketServer.ThreadingMixIn):
+   """ One thread per connection, each waiting for a worker of the shared pool. """
+
+   daemon_threads = True
+
+   token = None # when set, the token every request must carry
+
+   def startPool(self, processes):
+      self.processes = processes
+      self.pool = multiprocessing.Pool(processes, initializer=ignoreInterrupts)
+      self.started = time.time()
+      self.served = 0
+      self.lock = threading.Lock()
+
+   def respond(self, request):
+      if self.token is not None:
+         token = request.get("token")
+         if not isinstance(token, basestring) or not hmac.compare_digest(token.encode("utf-8"), self.token):
+            return {"status": 1, "stdout": "", "stderr": "Missing or wrong token\n", "output": None}
+      command = request.get("command")
+      if command == "ping":
+         return {"status": 0, "stdout": "svg2kicadserver %s, %d workers, %d conversions in %.0f s\n" % (
+            svg2kicadmod.__version__, self.processes, self.served, time.time() - self.started), "stderr": "", "output": None}
+      if command == "shutdown":
+         # shutdown waits for serve_forever to return, which it can't while this request is handled
+         threading.Thread(target=self.shutdown).start()
+         return {"status": 0, "stdout": "", "stderr": "", "output": None}
+      if command is not None:
+         return {"status": 1, "stdout": "", "stderr": "Unknown command '%s'\n" % command, "output": None}
+      with self.lock:
+         self.served += 1
+      return self.pool.apply(runRequest, (request,))
+
+   def stopPool(self):
+      self.pool.close()
+      self.pool.join()
+
+
+class UnixConversionServer(ConversionServer, SocketServer.UnixStreamServer):
+   pass
+
+
+class TcpConversionServer(ConversionServer, SocketServer.TCPServer):
+   allow_reuse_address = True
+
+
+def removeStaleSocket(path):
+   """ Removes the socket file left behind by a daemon that is gone. Raises an error if one
+       is still listening on it. """
+   if not os.path.exists(path):
+      return
+   probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+   try:
+      probe.connect(path)
+   except socket.error as e:
+      if e.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+         raise
+      os.remove(path)
+   else:
+      raise RuntimeError("A daemon is already listening on %s" % path)
+   finally:
+      probe.close()
+
+
+def writeToken(path):
+   """ Writes a new random token to path, readable by this user alone, and returns it. """
+   directory = os.path.dirname(path)
+   if not os.path.isdir(directory):
+      os.makedirs(directory, 0700)
+   if os.path.exists(path):
+      os.remove(path)
+   token = os.urandom(32).encode("hex")
+   # O_EXCL, so the file is never one that someone else put there in the meantime
+   with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600), "w") as fid:
+      fid.write(token + "\n")
+   return token
+
+
+def parseArguments(argv):
+   parser = argparse.ArgumentParser(description="Serve svg2kicadmod.py conversions from a pool of warm worker processes.",
+                                    epilog="Send it conversions with svg2kicadclient.py.")
+   parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket to listen on (default: %(default)s)")
+   parser.add_argument("--port", type=int, default=None,
+                       help="Listen on this localhost TCP port instead of a Unix socket, accepting only requests "
+                            "with the token from the token file")
+   parser.add_argument("--token-file", default=None,
+                       help="Where to write the token for --port (default: daemon-PORT.token in the conversion cache directory)")
+   parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(),
+                       help="Number of worker processes (default: one per CPU, %(default)s here)")
+   return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+   args = parseArguments(sys.argv[1:])
+
+   if args.port is not None:
+      tokenFile = args.token_file or defaultTokenFile(args.port)
+      server = TcpConversionServer(("127.0.0.1", args.port), ConversionHandler)
+      server.token = writeToken(tokenFile)
+      address = "127.0.0.1:%d (token in %s)" % (args.port, tokenFile)
+   else:
+      try:
+         removeStaleSocket(args.socket)
+      except RuntimeError as e:
+         print e
+         sys.exit(1)
+      # The socket is created with no permissions for anyone else, not changed afterwards
+      umask = os.umask(0077)
+      try:
+         server = UnixConversionServer(args.socket, ConversionHandler)
+      finally:
+         os.umask(umask)
+      address = args.socket
+   # The workers are forked from here, with the converter already imported
+   server.startPool(max(1, args.jobs))
+   signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+   print "Serving conversions on %s with %d processes" % (address, server.processes)
+   sys.stdout.flush()
+   try:
+      server.serve_forever()
+   except (KeyboardInterrupt, SystemExit):
+      pass
+   finally:
+      server.server_close()
+      server.stopPool()
+      if args.port is None and os.path.exists(args.socket):
+         os.remove(args.socket)
+      if args.port is not None and os.path.exists(tokenFile):
+         os.remove(tokenFile)
+   print "Stopped after %d conversions" % server.served
@@ -0,0 +1,97 @@
+# Tests for the on-disk conversion cache: its keys, its LRU eviction, and which
+# conversion options invalidate a cached result.
+# Run as: python -m unittest discover tests
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from conversioncache import ConversionCache
+import svg2kicadmod
+
+
+testDrawing = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test.svg")
+
+
+class ConversionCacheTest(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.cache = ConversionCache(os.path.join(self.directory, "cache"))
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def writeFile(self, name, text):
+      path = os.path.join(self.directory, name)
+      with open(path, "w") as fid:
+         fid.write(text)
+      return path
+
+   def testKeyChangesWithContentsOptionsAndVersion(self):
+      options = {"layer": "F.SilkS", "width": 20.0}
+      key = self.cache.makeKey("<svg/>", options, "1")
+      self.assertEqual(key, self.cache.makeKey("<svg/>", dict(options), "1"))
+      self.assertNotEqual(key, self.cache.makeKey("<svg />", options, "1"))
+      self.assertNotEqual(key, self.cache.makeKey("<svg/>", dict(options, width=20.5), "1"))
+      self.assertNotEqual(key, self.cache.makeKey("<svg/>", dict(options, flipY=True), "1"))
+      self.assertNotEqual(key, self.cache.makeKey("<svg/>", options, "2"))
+
+   def testFetchAfterStore(self):
+      output = os.path.join(self.directory, "out.kicad_mod")
+      self.assertFalse(self.cache.fetch("a", output))
+      self.cache.store("a", self.writeFile("a.kicad_mod", "module a"))
+      self.assertTrue(self.cache.fetch("a", output))
+      with open(output) as fid:
+         self.assertEqual(fid.read(), "module a")
+      self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+   def testEvictsLeastRecentlyUsed(self):
+      self.cache.maxBytes = 20
+      for key in "abc":
+         self.cache.store(key, self.writeFile(key, key * 8))
+         # Modification times are the access times, so keep them apart
+         os.utime(self.cache.entryPath(key), (time.time() - 100 + ord(key), time.time() - 100 + ord(key)))
+      # Only two 8 byte entries fit, and storing c pushed out the oldest, a
+      self.assertFalse(os.path.exists(self.cache.entryPath("a")))
+      self.assertTrue(self.cache.fetch("b", os.path.join(self.directory, "out")))
+      self.cache.store("d", self.writeFile("d", "d" * 8))
+      # The hit on b made c the least recently used
+      self.assertTrue(os.path.exists(self.cache.entryPath("b")))
+      self.assertFalse(os.path.exists(self.cache.entryPath("c")))
+      self.assertEqual(self.cache.stats()["entries"], 2)
+      self.assertEqual(self.cache.purge(), 2)
+      self.assertEqual(self.cache.stats()["bytes"], 0)
+
+   def testConvertReusesOnlyMatchingOptions(self):
+      output = os.path.join(self.directory, "out.kicad_mod")
+      convert = svg2kicadmod.convert
+      self.assertFalse(convert(testDrawing, output, "F.SilkS", 20, cache=self.cache))
+      with open(output) as fid:
+         converted = fid.read()
+      os.remove(output)
+
+      self.assertTrue(convert(testDrawing, output, "F.SilkS", 20, cache=self.cache))
+      with open(output) as fid:
+         self.assertEqual(fid.read(), converted)
+      # Options that can't change the output share the entry
+      self.assertTrue(convert(testDrawing, output, "F.SilkS", 20, stream=True, cache=self.cache))
+      self.assertTrue(convert(testDrawing, output, "F.SilkS", 20, cache=self.cache, flattener="batch",
+                              pathMemoSize=1000))
+      # Options that can don't
+      self.assertFalse(convert(testDrawing, output, "B.SilkS", 20, cache=self.cache))
+      self.assertFalse(convert(testDrawing, output, "F.SilkS", 25, cache=self.cache))
+      self.assertFalse(convert(testDrawing, output, "F.SilkS", 20, cache=self.cache, smoothness=0.05))
+
+      copy = self.writeFile("copy.svg", open(testDrawing).read().replace("#000000", "#000001"))
+      self.assertFalse(convert(copy, output, "F.SilkS", 20, cache=self.cache))
+      self.assertTrue(convert(copy, output, "F.SilkS", 20, cache=self.cache))
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,120 @@
+# Tests for sorting subpaths into outlines and holes and bridging the holes in.
+# Run as: python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from holes import signedArea, cleanRing, classifyRings, bridgeRings
+from SvgParser import SvgParser
+
+
+def square(x, y, size, clockwise=False):
+   ring = [(x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y)]
+   return ring[::-1] if clockwise else ring
+
+
+def area(polygon):
+   return signedArea(polygon) / 2
+
+
+def properlyCross(p, q, r, s):
+   def side(a, b, c):
+      value = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+      return (value > 0) - (value < 0)
+   return side(p, q, r) * side(p, q, s) < 0 and side(r, s, p) * side(r, s, q) < 0
+
+
+class BridgeRingsTest(unittest.TestCase):
+
+   def assertSimplePolygon(self, polygon):
+      self.assertEqual(polygon[0], polygon[-1])
+      edges = zip(polygon, polygon[1:])
+      for i in range(len(edges)):
+         for j in range(i + 1, len(edges)):
+            self.assertFalse(properlyCross(edges[i][0], edges[i][1], edges[j][0], edges[j][1]))
+
+   def testNestedHolesOfOppositeWinding(self):
+      rings = [square(0, 0, 10), square(2, 2, 2, True), square(6, 5, 3, True)]
+      for evenOdd in [False, True]:
+         polygons = bridgeRings(rings, evenOdd)
+         self.assertEqual(len(polygons), 1)
+         self.assertAlmostEqual(area(polygons[0]), 100 - 4 - 9)
+         self.assertSimplePolygon(polygons[0])
+         # Every vertex of every ring is on the outline
+         self.assertEqual(set(polygons[0]), set(point for ring in rings for point in ring))
+
+   def testSameWindingDependsOnFillRule(self):
+      rings = [square(0, 0, 10), square(2, 2, 6)]
+      # nonzero: the inner square is filled twice over, so it is no hole
+      self.assertEqual([area(p) for p in bridgeRings(rings)], [100])
+      # evenodd: it is
+      polygons = bridgeRings(rings, True)
+      self.assertEqual([area(p) for p in polygons], [64])
+      self.assertSimplePolygon(polygons[0])
+
+   def testIslandInsideAHole(self):
+      rings = [square(0, 0, 10), square(2, 2, 6), square(4, 4, 2)]
+      polygons = bridgeRings(rings, True)
+      self.assertEqual(sorted(area(p) for p in polygons), [4, 64])
+      # Whichever way the rings run
+      self.assertEqual(sorted(area(p) for p in bridgeRings([r[::-1] for r in rings], True)), [4, 64])
+      # nonzero with alternating windings gives the same island
+      rings = [square(0, 0, 10), square(2, 2, 6, True), square(4, 4, 2)]
+      self.assertEqual(sorted(area(p) for p in bridgeRings(rings)), [4, 64])
+
+   def testManyHolesInARow(self):
+      rings = [square(0, 0, 100)] + [square(5 + 10 * i, 5 + (i % 3) * 30, 4, True) for i in range(9)]
+      polygon, = bridgeRings(rings)
+      self.assertAlmostEqual(area(polygon), 10000 - 9 * 16)
+      self.assertSimplePolygon(polygon)
+
+   def testNothingToBridge(self):
+      self.assertEqual(bridgeRings([square(0, 0, 1)]), None)
+      # Degenerate subpaths don't count
+      self.assertEqual(bridgeRings([square(0, 0, 1), [(5, 5), (6, 6), (5, 5)]]), None)
+      # Side by side squares are two outlines
+      self.assertEqual([area(p) for p in bridgeRings([square(0, 0, 1), square(3, 0, 2)])], [1, 4])
+
+   def testClassifyRings(self):
+      rings = [cleanRing(ring) for ring in [square(0, 0, 10), square(1, 1, 3, True), square(20, 0, 5)]]
+      self.assertEqual(classifyRings(rings), [(0, [1]), (2, [])])
+      self.assertEqual(cleanRing([(0, 0), (0, 0), (1, 0), (1, 1), (0, 0)]), [(0, 0), (1, 0), (1, 1)])
+
+
+drawing = """<?xml version="1.0"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:svg="http://www.w3.org/2000/svg" width="100" height="100">
+<path d="M 0,0 h 10 v 10 h -10 z M 2,2 h 6 v 6 h -6 z" style="fill:#000000;fill-rule:%s"/>
+</svg>
+"""
+
+
+class ParserHolesTest(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def filledAreas(self, fillRule, **options):
+      filename = os.path.join(self.directory, fillRule + ".svg")
+      with open(filename, "w") as fid:
+         fid.write(drawing % fillRule)
+      parser = SvgParser(filename, quiet=True, **options)
+      parser.recursivelyTraverseSvg()
+      return [abs(area(points)) for fill, points in parser.rawObjects]
+
+   def testFillRuleReachesTheBridging(self):
+      self.assertEqual(self.filledAreas("evenodd"), [64])
+      self.assertEqual(self.filledAreas("nonzero"), [100])
+      # Without bridging the two subpaths are simply run together
+      self.assertEqual(self.filledAreas("evenodd", bridgeHoles=False), [136])
+
+
+if __name__ == "__main__":
+   unittest.main()
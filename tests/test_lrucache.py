@@ -0,0 +1,118 @@
+# Tests for the bounded LRU cache and the path memo built on it.
+# Run as: python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lrucache import LRUCache
+from SvgParser import SvgParser
+
+
+class LRUCacheTest(unittest.TestCase):
+
+   def testEvictsLeastRecentlyUsed(self):
+      cache = LRUCache(3)
+      for key in "abc":
+         cache.put(key, key.upper())
+      self.assertEqual(cache.get("a"), "A")
+      cache.put("d", "D")
+      self.assertFalse("b" in cache)
+      self.assertEqual(sorted(cache.entries), ["a", "c", "d"])
+      self.assertEqual(cache.evictions, 1)
+
+   def testCostsAddUp(self):
+      cache = LRUCache(10)
+      cache.put("a", 1, cost=4)
+      cache.put("b", 2, cost=4)
+      cache.put("c", 3, cost=4)
+      self.assertEqual((len(cache), cache.cost), (2, 8))
+      self.assertFalse("a" in cache)
+      # Replacing an entry gives its cost back first
+      cache.put("b", 20, cost=6)
+      self.assertEqual((len(cache), cache.cost, cache.evictions), (2, 10, 1))
+      # Too expensive to keep at all, and the old value goes too
+      cache.put("c", 30, cost=11)
+      self.assertEqual((len(cache), cache.cost), (1, 6))
+      self.assertEqual(cache.get("c"), None)
+
+   def testCounters(self):
+      cache = LRUCache(2)
+      self.assertEqual(cache.hitRate(), 0.0)
+      self.assertEqual(cache.get("a", "default"), "default")
+      cache.put("a", 1)
+      cache.get("a")
+      cache.get("a")
+      cache.get("b")
+      cache.countAsHit()
+      stats = cache.stats()
+      self.assertEqual((stats["hits"], stats["misses"]), (3, 1))
+      self.assertEqual(stats["hitRate"], 0.75)
+      cache.clear()
+      self.assertEqual((len(cache), cache.cost, cache.hits), (0, 0, 3))
+
+
+drawing = """<?xml version="1.0"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:svg="http://www.w3.org/2000/svg" width="100" height="100">
+<path d="M 0,0 C 10,0 10,10 0,10 z" style="fill:#000000"/>
+<path d="M 0 0 C 10 0 10 10 0 10 z" transform="translate(20,5)" style="fill:#000000"/>
+<path d="M 0,0 C 10,0 10,10 0,10 z" transform="translate(40,0) scale(2)" style="fill:#000000"/>
+<path d="M 0,0 C 10,0 10,10 0,10 z" transform="translate(40,30) scale(2)" style="fill:#000000"/>
+</svg>
+"""
+
+
+class PathMemoTest(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.filename = os.path.join(self.directory, "memo.svg")
+      with open(self.filename, "w") as fid:
+         fid.write(drawing)
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def parse(self, **options):
+      parser = SvgParser(self.filename, smoothness=0.01, quiet=True, **options)
+      parser.recursivelyTraverseSvg()
+      return parser
+
+   def assertSameObjects(self, first, second):
+      self.assertEqual(len(first), len(second))
+      for (fill0, points0), (fill1, points1) in zip(first, second):
+         self.assertEqual(fill0, fill1)
+         self.assertEqual(len(points0), len(points1))
+         for (x0, y0), (x1, y1) in zip(points0, points1):
+            self.assertAlmostEqual(x0, x1, 9)
+            self.assertAlmostEqual(y0, y1, 9)
+
+   def testKeyedOnLinearTransform(self):
+      memo = self.parse(pathMemoSize=10000)
+      # Only a translation apart (and written differently) reuses the path, a scale doesn't
+      self.assertEqual((memo.pathMemo.hits, memo.pathMemo.misses), (2, 2))
+      self.assertEqual(len(memo.pathMemo), 2)
+      self.assertSameObjects(list(memo.rawObjects), list(self.parse().rawObjects))
+
+   def testKeyedOnSmoothness(self):
+      memo = self.parse(pathMemoSize=10000)
+      identity = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+      key, rings, offset = memo.lookupPathMemo(memo.svgRoot[0], identity)
+      self.assertTrue(rings is not None)
+      memo.smoothness = 0.5
+      coarseKey, rings, offset = memo.lookupPathMemo(memo.svgRoot[0], identity)
+      self.assertNotEqual(key, coarseKey)
+      self.assertEqual(rings, None)
+
+   def testSmallMemoStillGivesTheSameOutput(self):
+      memo = self.parse(pathMemoSize=1)
+      self.assertEqual(len(memo.pathMemo), 0)
+      self.assertSameObjects(list(memo.rawObjects), list(self.parse().rawObjects))
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,98 @@
+# Tests for the array backed raw object store and its running bounding box.
+# Run as: python -m unittest discover tests
+
+import os
+import sys
+import math
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rawobjects import RawObjectStore, BoundingBox, CIRCLE
+
+
+def pointBounds(objects):
+   xs = [x for fill, points in objects for x, y in points]
+   ys = [y for fill, points in objects for x, y in points]
+   return min(xs), min(ys), max(xs), max(ys)
+
+
+class RawObjectStoreTest(unittest.TestCase):
+
+   def setUp(self):
+      self.objects = [(True, [(0.0, 0.0), (4.0, 0.0), (4.0, 3.0), (0.0, 0.0)]),
+                      (False, [(-1.5, 2.0), (2.5, 7.0)]),
+                      (CIRCLE, [(10.0, 10.0), (11.0, 10.0), (10.0, 11.0), (9.0, 10.0), (10.0, 9.0)]),
+                      (False, [])]
+      self.store = RawObjectStore(self.objects)
+
+   def assertPointsAlmostEqual(self, first, second):
+      self.assertEqual(len(first), len(second))
+      for (x0, y0), (x1, y1) in zip(first, second):
+         self.assertAlmostEqual(x0, x1)
+         self.assertAlmostEqual(y0, y1)
+
+   def testRoundTrip(self):
+      self.assertEqual(len(self.store), 4)
+      self.assertEqual(self.store.pointCount(), 11)
+      self.assertEqual(list(self.store), self.objects)
+      self.assertEqual(self.store[-1], (False, []))
+      self.assertRaises(IndexError, lambda: self.store[4])
+
+   def testFillsKeepTheirKind(self):
+      fills = [fill for fill, points in self.store]
+      self.assertEqual(fills, [True, False, CIRCLE, False])
+      self.assertTrue(fills[0] is True)
+
+   def testBoundsFollowAppends(self):
+      self.assertEqual(self.store.bounds(), pointBounds(self.objects))
+      self.store.append( (True, [(-3.0, 20.0), (0.0, 21.0)]) )
+      self.assertEqual(self.store.bounds(), (-3.0, 0.0, 11.0, 21.0))
+      self.assertEqual(RawObjectStore().bounds(), None)
+
+   def testDeferredTransformIsAppliedOnRead(self):
+      self.store.translate(1.0, -2.0)
+      self.store.scale(2.0)
+      expected = [(fill, [(2 * (x + 1.0), 2 * (y - 2.0)) for x, y in points]) for fill, points in self.objects]
+      for (fill, points), (expectedFill, expectedPoints) in zip(self.store, expected):
+         self.assertEqual(fill, expectedFill)
+         self.assertPointsAlmostEqual(points, expectedPoints)
+      for value, expectedValue in zip(self.store.bounds(), pointBounds(expected)):
+         self.assertAlmostEqual(value, expectedValue)
+
+   def testAppendAfterTransformIsNotTransformed(self):
+      self.store.translate(5.0, 5.0)
+      self.store.append( (True, [(0.0, 0.0), (1.0, 1.0)]) )
+      self.assertEqual(self.store[-1], (True, [(0.0, 0.0), (1.0, 1.0)]))
+      self.assertPointsAlmostEqual(self.store[0][1], [(x + 5.0, y + 5.0) for x, y in self.objects[0][1]])
+      self.assertEqual(self.store.bounds(), (0.0, 0.0, 16.0, 16.0))
+
+   def testRotationRescansBounds(self):
+      c = math.cos(math.pi / 4)
+      rotation = [[c, -c, 0.0], [c, c, 0.0]]
+      self.store.transformBy(rotation)
+      rotated = [(fill, [(c * x - c * y, c * x + c * y) for x, y in points]) for fill, points in self.objects]
+      for (fill, points), (expectedFill, expectedPoints) in zip(self.store, rotated):
+         self.assertPointsAlmostEqual(points, expectedPoints)
+      for value, expectedValue in zip(self.store.bounds(), pointBounds(rotated)):
+         self.assertAlmostEqual(value, expectedValue)
+
+
+class BoundingBoxTest(unittest.TestCase):
+
+   def testFlippedScaleKeepsMinBelowMax(self):
+      box = BoundingBox()
+      self.assertTrue(box.isEmpty())
+      box.addPoints([(1.0, 2.0), (3.0, -4.0)])
+      box.transform([[-2.0, 0.0, 1.0], [0.0, -1.0, 0.0]])
+      self.assertEqual((box.xmin, box.ymin, box.xmax, box.ymax), (-5.0, -2.0, -1.0, 4.0))
+      self.assertEqual(box.minCenterMax(), (-5.0, -2.0, -3.0, 1.0, -1.0, 4.0))
+
+   def testSkewIsRefused(self):
+      box = BoundingBox()
+      box.addPoints([(0.0, 0.0)])
+      self.assertRaises(ValueError, box.transform, [[1.0, 0.5, 0.0], [0.0, 1.0, 0.0]])
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,84 @@
+# Tests for the Ramer-Douglas-Peucker polyline simplification.
+# Run as: python -m unittest discover tests
+
+import os
+import sys
+import math
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import simplify
+from simplify import simplifyPoints, Simplifier
+from fastgeom import segmentDistanceSquared
+from rawobjects import CIRCLE
+
+
+def distanceToPolyline(point, polyline):
+   x, y = point
+   return math.sqrt(min(segmentDistanceSquared(x, y, x0, y0, x1, y1)
+                        for (x0, y0), (x1, y1) in zip(polyline, polyline[1:])))
+
+
+def wobblyCircle(count):
+   random.seed(3)
+   return [(10 * math.cos(2 * math.pi * i / count) + random.uniform(-0.01, 0.01),
+            10 * math.sin(2 * math.pi * i / count) + random.uniform(-0.01, 0.01)) for i in range(count + 1)]
+
+
+class SimplifyPointsTest(unittest.TestCase):
+
+   def testDropsCollinearPoints(self):
+      square = [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2), (1, 2), (0, 2), (0, 1), (0, 0)]
+      self.assertEqual(simplifyPoints(square, 1e-9), [(0, 0), (2, 0), (2, 2), (0, 2), (0, 0)])
+
+   def testStaysWithinTolerance(self):
+      points = wobblyCircle(500)
+      for tolerance in [0.001, 0.05, 0.5]:
+         simplified = simplifyPoints(points, tolerance)
+         self.assertEqual(simplified[0], points[0])
+         self.assertEqual(simplified[-1], points[-1])
+         self.assertTrue(len(simplified) < len(points))
+         # Kept points are a subsequence of the original ones
+         remaining = iter(points)
+         self.assertTrue(all(point in remaining for point in simplified))
+         for point in points:
+            self.assertTrue(distanceToPolyline(point, simplified) <= tolerance + 1e-12)
+
+   def testVectorizedMatchesPlainPython(self):
+      if simplify.numpy is None:
+         return
+      points = wobblyCircle(2000)
+      vectorized = simplifyPoints(points, 0.02)
+      threshold = simplify.VECTORIZE_MIN
+      simplify.VECTORIZE_MIN = len(points) + 1
+      try:
+         plain = simplifyPoints(points, 0.02)
+      finally:
+         simplify.VECTORIZE_MIN = threshold
+      self.assertEqual(vectorized, plain)
+
+   def testNeverCollapsesAnOutline(self):
+      bend = [(0, 0), (5, 0.001), (10, 0)]
+      self.assertEqual(simplifyPoints(bend, 0.1), bend)
+      self.assertEqual(simplifyPoints(bend + [(15, 0.001), (20, 0)], 0.1), bend + [(15, 0.001), (20, 0)])
+      self.assertEqual(simplifyPoints(bend[:2], 1.0), bend[:2])
+
+
+class SimplifierTest(unittest.TestCase):
+
+   def testCountsAndLeavesCirclesAlone(self):
+      circle = (CIRCLE, [(0, 0), (1, 0), (0, 1), (-1, 0), (0, -1)])
+      line = (False, [(0, 0), (1, 0), (2, 0), (3, 0)])
+      simplifier = Simplifier(0.01)
+      objects = list(simplifier.simplifyObjects([circle, line]))
+      self.assertEqual(objects[0], circle)
+      self.assertEqual(objects[1], line)
+      polygon = (True, [(0, 0), (1, 0), (2, 0), (2, 2), (0, 2), (0, 0)])
+      self.assertEqual(list(simplifier.simplifyObjects([polygon])), [(True, [(0, 0), (2, 0), (2, 2), (0, 2), (0, 0)])])
+      self.assertEqual((simplifier.pointsBefore, simplifier.pointsAfter), (10, 9))
+
+
+if __name__ == "__main__":
+   unittest.main()
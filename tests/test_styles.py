@@ -0,0 +1,136 @@
+# Tests for the style cascade: presentation attributes, <style> rules and style attributes.
+# Run as: python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from styles import StyleResolver, parseDeclarations, parseSelector, INITIAL_STYLE
+from SvgParser import SvgParser
+
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+def element(tag="path", **attributes):
+   node = etree.Element(SVG + tag)
+   for name, value in attributes.items():
+      node.set(name.replace("_", "-"), value)
+   return node
+
+
+class CascadeTest(unittest.TestCase):
+
+   def setUp(self):
+      self.resolver = StyleResolver()
+
+   def testAttributeThenStyleSheetThenStyleAttribute(self):
+      node = element(fill="red", stroke="blue", visibility="hidden")
+      self.assertEqual(self.resolver.resolve(node).fill, "red")
+      self.resolver.addStyleSheet("path { fill: green; stroke: green }")
+      style = self.resolver.resolve(node)
+      self.assertEqual((style.fill, style.stroke, style.visibility), ("green", "green", "hidden"))
+      node.set("style", "fill:#000000")
+      style = self.resolver.resolve(node)
+      self.assertEqual((style.fill, style.stroke, style.visibility), ("#000000", "green", "hidden"))
+
+   def testSpecificityThenOrder(self):
+      self.resolver.addStyleSheet("""
+         #logo { fill: id }
+         path.a { fill: tagclass }
+         .a { fill: class; stroke: class }
+         path { fill: tag; stroke: tag; fill-rule: evenodd }
+         .b { stroke: later }
+         * { display: none }
+      """)
+      style = self.resolver.resolve(element(id="logo", **{"class": "a b"}))
+      self.assertEqual((style.fill, style.stroke, style.fillRule, style.display), ("id", "later", "evenodd", "none"))
+      style = self.resolver.resolve(element(**{"class": "a"}))
+      self.assertEqual((style.fill, style.stroke), ("tagclass", "class"))
+      style = self.resolver.resolve(element("rect", **{"class": "a"}))
+      self.assertEqual((style.fill, style.stroke, style.fillRule), ("class", "class", "nonzero"))
+
+   def testInheritance(self):
+      parent = self.resolver.resolve(element("g", fill="red", display="none", fill_rule="evenodd"))
+      style = self.resolver.resolve(element(), parent)
+      # fill and fill-rule are inherited, display isn't
+      self.assertEqual((style.fill, style.fillRule, style.display), ("red", "evenodd", "inline"))
+      style = self.resolver.resolve(element(style="display:inherit;fill:none"), parent)
+      self.assertEqual((style.fill, style.display), ("none", "none"))
+      self.assertEqual(self.resolver.resolve(element()), INITIAL_STYLE)
+
+   def testResultsFollowNewStyleSheets(self):
+      node = element(**{"class": "logo"})
+      self.assertFalse(self.resolver.isFilled(self.resolver.resolve(node)))
+      self.resolver.addStyleSheet(".logo { fill: black }")
+      self.assertTrue(self.resolver.isFilled(self.resolver.resolve(node)))
+      self.resolver.addStyleSheet(".logo { fill: none }")
+      self.assertFalse(self.resolver.isFilled(self.resolver.resolve(node)))
+
+   def testIdsMatterOnlyOnceSelected(self):
+      first = self.resolver.resolve(element(id="one"))
+      self.assertTrue(first is self.resolver.resolve(element(id="two")))
+      self.resolver.addStyleSheet("#two { fill: blue }")
+      self.assertEqual(self.resolver.resolve(element(id="one")).fill, "none")
+      self.assertEqual(self.resolver.resolve(element(id="two")).fill, "blue")
+
+   def testUnsupportedSelectorsAreIgnored(self):
+      self.resolver.addStyleSheet("/* g path { fill: red } */ g > path, g path { fill: red } path:hover { fill: red }"
+                                  "#a#b { fill: red } path, .x { stroke: black }")
+      style = self.resolver.resolve(element(id="a", **{"class": "x"}))
+      self.assertEqual((style.fill, style.stroke), ("none", "black"))
+
+
+drawing = """<?xml version="1.0"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:svg="http://www.w3.org/2000/svg" width="100" height="100">
+<path class="filled" d="M 0,0 h 1 v 1 z"/>
+<path class="filled" fill="none" style="fill:#000000" d="M 2,0 h 1 v 1 z"/>
+<path fill="#000000" d="M 4,0 h 1 v 1 z"/>
+<g fill="#000000"><path class="hidden" d="M 6,0 h 1 v 1 z"/><path d="M 8,0 h 1 v 1 z"/></g>
+<style>.filled { fill: #000000 } .hidden { fill: none } path { fill: none }</style>
+</svg>
+"""
+
+
+class DocumentStyleTest(unittest.TestCase):
+
+   def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.filename = os.path.join(self.directory, "styles.svg")
+      with open(self.filename, "w") as fid:
+         fid.write(drawing)
+
+   def tearDown(self):
+      shutil.rmtree(self.directory)
+
+   def testStyleElementsApplyToTheWholeDocument(self):
+      # The <style> comes last, and still beats the fill attributes
+      expected = [True, True, False, False, False]
+      parser = SvgParser(self.filename, quiet=True)
+      parser.recursivelyTraverseSvg()
+      self.assertEqual([fill for fill, points in parser.rawObjects], expected)
+      parser = SvgParser(self.filename, stream=True, quiet=True)
+      self.assertEqual([fill for fill, points in parser.iterRawObjects()], expected)
+
+
+class ParsingTest(unittest.TestCase):
+
+   def testParseDeclarations(self):
+      self.assertEqual(parseDeclarations(" Fill : red !important;stroke:;bogus; fill-rule:evenodd "),
+                       {"fill": "red", "stroke": "", "fill-rule": "evenodd"})
+
+   def testParseSelector(self):
+      self.assertEqual(parseSelector(" path.a.b#c "), ("path", ["a", "b"], "c"))
+      self.assertEqual(parseSelector("*"), (None, [], None))
+      self.assertEqual(parseSelector("#a#b"), None)
+      self.assertEqual(parseSelector("g path"), None)
+      self.assertEqual(parseSelector(""), None)
+
+
+if __name__ == "__main__":
+   unittest.main()
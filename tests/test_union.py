@@ -0,0 +1,93 @@
+# Tests for the boolean union of filled polygons.
+# Run as: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from union import unionPolygons, overlapClusters, PolygonMerger
+from holes import signedArea
+from rawobjects import CIRCLE
+
+
+def rectangle(x, y, width, height, clockwise=False):
+   ring = [(x, y), (x + width, y), (x + width, y + height), (x, y + height), (x, y)]
+   return ring[::-1] if clockwise else ring
+
+
+def areas(polygons):
+   return sorted(signedArea(polygon) / 2 for polygon in polygons)
+
+
+class UnionPolygonsTest(unittest.TestCase):
+
+   def assertOutlines(self, rectangles, expectedAreas):
+      """ Checks the areas of the union of rectangles (x, y, width, height[, clockwise]), and that none of its
+          edges runs through the inside of any of them. """
+      merged = unionPolygons([rectangle(*r) for r in rectangles])
+      self.assertEqual(areas(merged), expectedAreas)
+      for polygon in merged:
+         self.assertEqual(polygon[0], polygon[-1])
+         for (x0, y0), (x1, y1) in zip(polygon, polygon[1:]):
+            mx, my = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+            for x, y, width, height in [r[:4] for r in rectangles]:
+               self.assertFalse(x < mx < x + width and y < my < y + height)
+      return merged
+
+   def testOverlappingSquares(self):
+      merged = self.assertOutlines([(0, 0, 2, 2), (1, 1, 2, 2, True)], [7])
+      self.assertEqual(len(merged[0]), 9)
+
+   def testCollinearSquares(self):
+      # Side by side, sharing a whole edge
+      self.assertOutlines([(0, 0, 1, 1), (1, 0, 1, 1)], [2])
+      # Sharing only part of an edge
+      self.assertOutlines([(0, 0, 2, 2), (2, 1, 2, 2)], [8])
+      # Overlapping along collinear edges
+      self.assertOutlines([(0, 0, 3, 1), (1, 0, 3, 1)], [4])
+      # A row of them, each overlapping the next
+      self.assertOutlines([(i, 0, 2, 1) for i in range(6)], [7])
+
+   def testSameSquareTwice(self):
+      self.assertOutlines([(0, 0, 1, 1), (0, 0, 1, 1, True)], [1])
+
+   def testContainedSquare(self):
+      self.assertOutlines([(0, 0, 4, 4), (1, 1, 1, 1)], [16])
+
+   def testFrameGetsAHole(self):
+      # One outline with the 3 x 3 hole bridged in, through a wall of the frame
+      frame = [rectangle(0, 0, 5, 1), rectangle(4, 0, 1, 5), rectangle(0, 4, 5, 1), rectangle(0, 0, 1, 5)]
+      self.assertEqual(areas(unionPolygons(frame)), [25 - 9])
+
+   def testCornersTouching(self):
+      self.assertOutlines([(0, 0, 1, 1), (1, 1, 1, 1)], [1, 1])
+
+   def testOverlapClusters(self):
+      boxes = [(0, 0, 1, 1), (5, 5, 6, 6), (0.5, 0.5, 2, 2), (1.5, 1.5, 3, 3), (10, 0, 11, 1)]
+      self.assertEqual(overlapClusters(boxes), [[0, 2, 3], [1], [4]])
+
+
+class PolygonMergerTest(unittest.TestCase):
+
+   def testKeepsOrderAndPassesOthersThrough(self):
+      circle = (CIRCLE, [(20, 20), (21, 20), (20, 21), (19, 20), (20, 19)])
+      line = (False, [(0, 0), (5, 5)])
+      lonely = (True, rectangle(10, 10, 1, 1))
+      objects = [line, (True, rectangle(0, 0, 2, 2)), circle, lonely, (True, rectangle(1, 1, 2, 2))]
+      merger = PolygonMerger()
+      merged = list(merger.mergeObjects(objects))
+      self.assertEqual(len(merged), 4)
+      self.assertEqual(merged[0], line)
+      # The union takes the place of the first polygon of its group
+      self.assertEqual(merged[1][0], True)
+      self.assertEqual(areas([merged[1][1]]), [7])
+      self.assertEqual(merged[2], circle)
+      self.assertEqual(merged[3], lonely)
+      self.assertEqual((merger.polygonsBefore, merger.polygonsAfter), (3, 2))
+      self.assertEqual((merger.pointsBefore, merger.pointsAfter), (15, 14))
+
+
+if __name__ == "__main__":
+   unittest.main()
@@ -0,0 +1,362 @@
+# Boolean union of filled polygons.
+# Overlapping filled polygons are merged into the outlines of the area they cover,
+# so stacked artwork (an outline drawn over its fill, overlapping letter strokes)
+# comes out as a few polygons instead of many redundant ones.
+# Polygons are first grouped into clusters of overlapping bounding boxes; a polygon
+# that overlaps nothing is passed through untouched. Within a cluster the edges are
+# split where they cross, found with a grid of cells, every piece is kept or dropped
+# depending on the winding number on either side of it, found with a sweep line that
+# keeps the pieces it crosses in order, and the kept pieces are chained back into
+# rings. Holes in the result are bridged into their outlines with holes.py.
+# TODO comments, license
+
+import heapq
+from math import atan2, pi, floor
+
+import holes
+from rawobjects import CIRCLE
+
+
+# Coordinates are snapped to this many decimals, the precision they are written out with
+SNAP_DECIMALS = 6
+
+
+def snap(point):
+   return (round(point[0], SNAP_DECIMALS), round(point[1], SNAP_DECIMALS))
+
+
+def bounds(points):
+   xs = [p[0] for p in points]
+   ys = [p[1] for p in points]
+   return min(xs), min(ys), max(xs), max(ys)
+
+
+def overlapClusters(boxes):
+   """ Groups boxes (xmin, ymin, xmax, ymax) that overlap, directly or through other boxes,
+       sweeping over x. Returns a list of lists of box indices. """
+   parent = range(len(boxes))
+
+   def find(i):
+      while parent[i] != i:
+         parent[i] = parent[parent[i]]
+         i = parent[i]
+      return i
+
+   active = []
+   for i in sorted(range(len(boxes)), key=lambda i: boxes[i][0]):
+      xmin, ymin, xmax, ymax = boxes[i]
+      active = [j for j in active if boxes[j][2] >= xmin]
+      for j in active:
+         if boxes[j][1] <= ymax and boxes[j][3] >= ymin:
+            parent[find(j)] = find(i)
+      active.append(i)
+
+   clusters = {}
+   for i in range(len(boxes)):
+      clusters.setdefault(find(i), []).append(i)
+   return sorted(clusters.values())
+
+
+def cross(ox, oy, ax, ay, bx, by):
+   return (ax - ox) * (by - oy) - (ay - oy) * (bx - ox)
+
+
+def segmentCells(p, q, size):
+   """ The grid cells of the given size that the segment p-q passes through, column by column. """
+   (x0, y0), (x1, y1) = (p, q) if p[0] <= q[0] else (q, p)
+   first = int(floor(x0 / size))
+   last = int(floor(x1 / size))
+   # A little slack, so rounding never leaves out a cell a point on the segment is in
+   slack = size * 1e-9
+   cells = []
+   for column in range(first, last + 1):
+      if first == last:
+         ya, yb = y0, y1
+      else:
+         xa = max(x0, column * size)
+         xb = min(x1, (column + 1) * size)
+         ya = y0 + (xa - x0) * (y1 - y0) / (x1 - x0)
+         yb = y0 + (xb - x0) * (y1 - y0) / (x1 - x0)
+      for row in range(int(floor((min(ya, yb) - slack) / size)), int(floor((max(ya, yb) + slack) / size)) + 1):
+         cells.append( (column, row) )
+   return cells
+
+
+def splitPair(segments, splits, i, j):
+   """ Adds the points where segments i and j cross or overlap to their split points. """
+   (ax, ay), (bx, by) = segments[i]
+   (cx, cy), (dx, dy) = segments[j]
+   d = (bx - ax) * (dy - cy) - (by - ay) * (dx - cx)
+   if d == 0:
+      if cross(ax, ay, bx, by, cx, cy) != 0:
+         return # parallel
+      # Collinear: each segment is split where the other one ends
+      for point, k, (p, q) in (((cx, cy), i, segments[i]), ((dx, dy), i, segments[i]),
+                               ((ax, ay), j, segments[j]), ((bx, by), j, segments[j])):
+         if point != p and point != q and min(p[0], q[0]) <= point[0] <= max(p[0], q[0]) \
+               and min(p[1], q[1]) <= point[1] <= max(p[1], q[1]):
+            splits[k].append(point)
+      return
+   t = ((cx - ax) * (dy - cy) - (cy - ay) * (dx - cx)) / d
+   u = ((cx - ax) * (by - ay) - (cy - ay) * (bx - ax)) / d
+   if 0 <= t <= 1 and 0 <= u <= 1:
+      point = snap((ax + t * (bx - ax), ay + t * (by - ay)))
+      if point != segments[i][0] and point != segments[i][1]:
+         splits[i].append(point)
+      if point != segments[j][0] and point != segments[j][1]:
+         splits[j].append(point)
+
+
+def findSplits(segments):
+   """ Finds where the segments ((x0, y0), (x1, y1)) cross or overlap one another. Each segment is
+       entered into the cells of a uniform grid it passes through, sized after the segments, and
+       only the pairs sharing a cell are tested, so the work grows with the number of segments
+       and crossings rather than with every segment the others overlap in x.
+       Returns a list with the points strictly inside each segment where it must be split. """
+   splits = [[] for s in segments]
+   if not segments:
+      return splits
+   extents = [max(abs(q[0] - p[0]), abs(q[1] - p[1])) for p, q in segments]
+   size = sum(extents) / len(extents) or 1.0
+   # Pairs are tested in order of their left ends, the later one first, whatever cell they meet in
+   order = sorted(range(len(segments)), key=lambda i: min(segments[i][0][0], segments[i][1][0]))
+   rank = [0] * len(segments)
+   for position, i in enumerate(order):
+      rank[i] = position
+
+   grid = {}
+   for i in order:
+      tested = set()
+      for cell in segmentCells(segments[i][0], segments[i][1], size):
+         members = grid.setdefault(cell, [])
+         for j in members:
+            if j not in tested:
+               tested.add(j)
+               splitPair(segments, splits, i, j)
+         members.append(i)
+   return splits
+
+
+def splitSegments(segments, splits):
+   """ Cuts each segment at its split points, keeping the direction it runs in. """
+   pieces = []
+   for (p, q), points in zip(segments, splits):
+      if points:
+         dx = q[0] - p[0]
+         dy = q[1] - p[1]
+         points = sorted(set(points), key=lambda r: (r[0] - p[0]) * dx + (r[1] - p[1]) * dy)
+      previous = p
+      for point in points + [q]:
+         if point != previous:
+            pieces.append( (previous, point) )
+         previous = point
+   return pieces
+
+
+def windingNumbers(edges, queries, axis):
+   """ Winding number just beside the midpoint of each edge edges[i] for i in queries, counting all
+       the other weighted, directed edges (p, q, weight). With axis=0 a ray is cast in -x and edges
+       running downwards count positive, with axis=1 the ray goes in -y and edges running in +x count
+       positive, so the inside of a counterclockwise ring is at +1 either way.
+       The edges are split where they cross, so they can be kept in a sweep line ordered along
+       axis, which a query's own edge is part of: its winding number is the sum over the edges
+       before it, without casting a ray at all. """
+   other = 1 - axis
+   spans = []
+   for index, (p, q, weight) in enumerate(edges):
+      if p[other] == q[other]:
+         continue
+      if axis == 0:
+         contribution = weight if q[1] < p[1] else -weight
+      else:
+         contribution = weight if q[0] > p[0] else -weight
+      low, high = (p, q) if p[other] < q[other] else (q, p)
+      slope = (high[axis] - low[axis]) / (high[other] - low[other])
+      spans.append( (low[other], high[other], low[axis], slope, contribution, index) )
+   spans.sort()
+
+   positions = dict((query, (edges[query][0][other] + edges[query][1][other]) / 2.0) for query in queries)
+   order = sorted(queries, key=positions.get)
+   winding = {}
+   status = [] # indices into spans of the edges crossing the sweep line, in order along axis
+   contributions = [] # their contributions, in the same order
+   total = 0
+   ends = []
+   nextSpan = 0
+   spanOf = {} # edge index -> index into spans
+   for query in order:
+      position = positions[query]
+      # Leaving edges go first, so an edge ending where another starts is never compared with it
+      while True:
+         if ends and ends[0][0] <= position and (nextSpan >= len(spans) or ends[0][0] <= spans[nextSpan][0]):
+            k = status.index(heapq.heappop(ends)[1])
+            total -= contributions[k]
+            del status[k]
+            del contributions[k]
+         elif nextSpan < len(spans) and spans[nextSpan][0] <= position:
+            low, high, start, slope, contribution, index = spans[nextSpan]
+            # Ordered by where they cross the sweep line here, and by which way they lean after that
+            key = (start, slope)
+            lo, hi = 0, len(status)
+            while lo < hi:
+               middle = (lo + hi) // 2
+               other0, other1, start1, slope1 = spans[status[middle]][:4]
+               if (start1 + (low - other0) * slope1, slope1) < key:
+                  lo = middle + 1
+               else:
+                  hi = middle
+            status.insert(lo, nextSpan)
+            contributions.insert(lo, contribution)
+            total += contribution
+            heapq.heappush(ends, (high, nextSpan))
+            spanOf[index] = nextSpan
+            nextSpan += 1
+         else:
+            break
+      # Whichever side of the query has the fewer edges is summed
+      k = status.index(spanOf[query])
+      if k <= len(status) // 2:
+         winding[query] = sum(contributions[:k])
+      else:
+         winding[query] = total - sum(contributions[k:])
+   return [winding[query] for query in queries]
+
+
+def boundaryEdges(pieces):
+   """ Returns the pieces that separate covered (winding number above zero) from uncovered area,
+       each directed so the covered side is on its left. Coincident pieces are combined first,
+       so shared edges between neighbouring polygons, and the two sides of a bridge, cancel out. """
+   weights = {}
+   for p, q in pieces:
+      if p < q:
+         weights[(p, q)] = weights.get((p, q), 0) + 1
+      else:
+         weights[(q, p)] = weights.get((q, p), 0) - 1
+   edges = [(p, q, weight) for (p, q), weight in weights.items() if weight != 0]
+
+   # Each piece is tested just beside its midpoint: to the left and right of it with a horizontal
+   # ray, or, for horizontal pieces, below and above it with a vertical ray
+   horizontal = [p[1] == q[1] for p, q, weight in edges]
+   byX = windingNumbers(edges, [i for i, h in enumerate(horizontal) if not h], 0)
+   byY = windingNumbers(edges, [i for i, h in enumerate(horizontal) if h], 1)
+   byX.reverse()
+   byY.reverse()
+
+   result = []
+   for (p, q, weight), isHorizontal in zip(edges, horizontal):
+      if isHorizontal:
+         # p is left of q, since p < q
+         below = byY.pop()
+         above = below + weight
+         if (below > 0) != (above > 0):
+            result.append( (p, q) if above > 0 else (q, p) )
+      else:
+         # p is below q, since p < q along a vertical run and p is left of q otherwise
+         left = byX.pop()
+         right = left - weight if p[1] < q[1] else left + weight
+         if (left > 0) != (right > 0):
+            upwards = (p, q) if p[1] < q[1] else (q, p)
+            result.append( upwards if left > 0 else (upwards[1], upwards[0]) )
+   return result
+
+
+def chainRings(edges):
+   """ Links directed edges into closed rings. Where several edges leave a vertex, the one turning
+       most sharply clockwise is taken, which keeps rings that only touch at a corner apart. """
+   outgoing = {}
+   for p, q in edges:
+      outgoing.setdefault(p, []).append(q)
+
+   rings = []
+   for start in sorted(outgoing):
+      while outgoing.get(start):
+         ring = [start]
+         previous, current = start, outgoing[start].pop()
+         while current != start:
+            ring.append(current)
+            choices = outgoing.get(current)
+            if not choices:
+               break
+            backwards = atan2(previous[1] - current[1], previous[0] - current[0])
+
+            def clockwiseTurn(q):
+               turn = (backwards - atan2(q[1] - current[1], q[0] - current[0])) % (2 * pi)
+               return turn if turn > 0 else 2 * pi
+
+            choice = min(choices, key=clockwiseTurn)
+            choices.remove(choice)
+            previous, current = current, choice
+         if len(ring) >= 3:
+            rings.append(ring)
+   return rings
+
+
+def unionPolygons(polygons):
+   """ Merges a list of filled polygons, each a list of (x, y) points, into the outlines of the
+       area they cover together (by the nonzero rule, whichever way each one runs).
+       Returns a list of polygons, with any holes bridged in. """
+   rings = []
+   segments = []
+   for points in polygons:
+      ring = holes.cleanRing([snap(p) for p in points])
+      if len(ring) < 3:
+         continue
+      if holes.signedArea(ring) < 0:
+         ring.reverse()
+      rings.append(ring)
+      segments.extend(zip(ring, ring[1:] + ring[:1]))
+   if not rings:
+      return []
+
+   pieces = splitSegments(segments, findSplits(segments))
+   merged = chainRings(boundaryEdges(pieces))
+   bridged = holes.bridgeRings(merged)
+   if bridged is None:
+      return [outline + [outline[0]] for outline in merged]
+   return bridged
+
+
+class PolygonMerger:
+   """ Merges the overlapping filled polygons of a stream of raw objects, counting the
+       polygons and vertices before and after. """
+
+   def __init__(self):
+      self.polygonsBefore = 0
+      self.polygonsAfter = 0
+      self.pointsBefore = 0
+      self.pointsAfter = 0
+
+   def mergeObjects(self, objects):
+      """ Yields the objects in the order they come, but with the filled polygons replaced by
+          their union: the outlines of each group of overlapping polygons take the place of the
+          first polygon of the group. Nothing can be yielded until the objects run out. """
+      output = [] # the objects, with None in place of each filled polygon
+      filled = []
+      positions = [] # index into output of each filled polygon
+      for fill, points in objects:
+         if fill == CIRCLE or not fill:
+            output.append( (fill, points) )
+         elif points:
+            positions.append(len(output))
+            output.append(None)
+            filled.append(points)
+            self.polygonsBefore += 1
+            self.pointsBefore += len(points)
+
+      boxes = [bounds(points) for points in filled]
+      groups = {} # index into output -> the merged polygons that go there
+      for cluster in overlapClusters(boxes):
+         if len(cluster) == 1:
+            merged = [filled[cluster[0]]]
+         else:
+            merged = unionPolygons([filled[i] for i in cluster])
+         groups[positions[min(cluster)]] = merged
+
+      for index, obj in enumerate(output):
+         if obj is not None:
+            yield obj
+            continue
+         for points in groups.get(index, []):
+            self.polygonsAfter += 1
+            self.pointsAfter += len(points)
+            yield True, points